@@ -1,28 +1,25 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from pymongo import MongoClient
 from bson.objectid import ObjectId
-import os
-from dotenv import load_dotenv
 from datetime import datetime, timedelta
-from collections import Counter
 
-from utils.auth_helpers import get_user_role
+from utils import db
+from utils.auth_helpers import get_user_role, invalidate_user_role
+from utils.pagination import PaginationError, page_args, page_info, paginate
+from utils.rollups import ROLLUP_FIELDS, analytics_pipeline, reset_prediction_count
 
-load_dotenv()
+users_collection = db.users()
+prediction_collection = db.predictions()
+daily_rollups_collection = db.daily_rollups()
 
-client = MongoClient(os.getenv("MONGO_URI"))
-db = client["healthsync"]
-users_collection = db["users"]
-prediction_collection = db["predictions"]
+ANALYTICS_MAX_DAYS = 366
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
 
 
 # Helper to check admin role
 def is_admin(user_id):
-    user = users_collection.find_one({"_id": ObjectId(user_id)})
-    return user and user.get("role") == "admin"
+    return get_user_role(user_id) == "admin"
 
 
 @admin_bp.route('/users', methods=['GET'])
@@ -32,10 +29,18 @@ def get_all_users():
     if get_user_role(user_id) != "admin":
         return jsonify({"error": "Unauthorized"}), 403
 
-    users = list(users_collection.find({}, {"password": 0}))
+    try:
+        limit, cursor = page_args()
+        users, next_cursor = paginate(
+            users_collection, {}, [("_id", -1)], projection={"password": 0},
+            limit=limit, cursor=cursor
+        )
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+
     for user in users:
         user["_id"] = str(user["_id"])
-    return jsonify({"users": users}), 200
+    return jsonify({"users": users, "page": page_info(limit, next_cursor)}), 200
 
 
 @admin_bp.route('/user/<user_id>', methods=['GET'])
@@ -61,6 +66,7 @@ def delete_user_history(user_id):
         return jsonify({"error": "Unauthorized"}), 403
 
     prediction_collection.delete_many({"user_id": user_id})
+    reset_prediction_count(user_id)
     return jsonify({"message": "User history deleted"}), 200
 
 
@@ -78,46 +84,50 @@ def promote_user(user_id):
     if result.matched_count == 0:
         return jsonify({"error": "User not found"}), 404
 
+    invalidate_user_role(user_id)
     return jsonify({"message": "User promoted to admin"}), 200
+
+
 @admin_bp.route('/analytics', methods=['GET'])
 @jwt_required()
 def admin_analytics():
+    """
+    Site totals, per-day registrations/predictions/AI messages for the last
+    ?days= days (default 7) and the most active users, from one aggregation
+    over the daily rollups. Cost grows with the number of days, not with
+    users or predictions.
+    """
     requester_id = get_jwt_identity()
     if not is_admin(requester_id):
         return jsonify({"error": "Unauthorized"}), 403
 
-    total_users = users_collection.count_documents({})
-    total_admins = users_collection.count_documents({"role": "admin"})
-    total_regular = users_collection.count_documents({"role": "user"})
-    total_predictions = prediction_collection.count_documents({})
-
-    # Most active users by prediction count
-    pipeline = [
-        {"$group": {"_id": "$user_id", "count": {"$sum": 1}}},
-        {"$sort": {"count": -1}},
-        {"$limit": 5}
-    ]
-    top_users_cursor = list(prediction_collection.aggregate(pipeline))
-    top_users = []
-    for u in top_users_cursor:
-        user = users_collection.find_one({"_id": ObjectId(u["_id"])})
-        if user:
-            top_users.append({
-                "name": user["name"],
-                "email": user["email"],
-                "predictions": u["count"]
-            })
-
-    # Optional: Users registered in the last 7 days (bar chart data)
-    seven_days_ago = datetime.utcnow() - timedelta(days=7)
-    recent_users = users_collection.find({"created_at": {"$gte": seven_days_ago}})
-    daily_counts = Counter(u["created_at"].strftime("%Y-%m-%d") for u in recent_users if "created_at" in u)
+    try:
+        days = min(max(int(request.args.get("days", 7)), 1), ANALYTICS_MAX_DAYS)
+    except ValueError:
+        return jsonify({"error": "days must be an integer"}), 400
+
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    since = today - timedelta(days=days - 1)
+    try:
+        result = next(daily_rollups_collection.aggregate(analytics_pipeline(since)))
+        # Collection metadata, not a scan
+        total_users = users_collection.estimated_document_count()
+    except Exception as e:
+        print(f"Error computing analytics: {e}")
+        return jsonify({"error": "Failed to compute analytics", "details": str(e)}), 500
+
+    totals = result["totals"][0] if result["totals"] else {field: 0 for field in ROLLUP_FIELDS}
+    total_admins = result["admins"][0]["count"] if result["admins"] else 0
 
     return jsonify({
         "total_users": total_users,
         "total_admins": total_admins,
-        "total_regular_users": total_regular,
-        "total_predictions": total_predictions,
-        "top_users": top_users,
-        "registrations_last_7_days": daily_counts  # Optional frontend chart
-    }), 200
\ No newline at end of file
+        "total_regular_users": total_users - total_admins,
+        "total_predictions": totals["predictions"],
+        "total_ai_messages": totals["ai_messages"],
+        "top_users": result["top_users"],
+        "daily": result["daily"],
+        "registrations_last_7_days": {
+            day["date"]: day["registrations"] for day in result["daily"][-7:] if day["registrations"]
+        }  # Optional frontend chart
+    }), 200
@@ -1,30 +1,39 @@
 import datetime
-from flask import Blueprint, request, jsonify
+import json
+import time
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from pymongo import MongoClient
-import os
 from dotenv import load_dotenv
 from bson.objectid import ObjectId
-import requests # For making HTTP requests to Gemini API
+import requests
+from pymongo.errors import BulkWriteError
+from utils import db
+from utils import context_window
+from utils import conversation_store
+from utils.llm_client import LLMError, LLMUnavailableError, extract_text, gemini_client
+from utils.response_cache import response_cache
+from utils.jobs import PermanentJobError, enqueue, job_handler
+from api.jobs import job_accepted
+from utils.pagination import PaginationError, page_args, page_info, paginate
 
 load_dotenv()
 
-client = MongoClient(os.getenv("MONGO_URI"))
-db = client["healthsync"]
-ai_conversations_collection = db["ai_conversations"] # New collection for AI chats
+ai_conversations_collection = db.ai_conversations() # New collection for AI chats
 
 ask_ai_bp = Blueprint('ask_ai', __name__, url_prefix='/api/ai')
 
-# Gemini API configuration (will be provided by Canvas runtime or user's env)
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "") # Fallback to empty string
-GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
+# Gemini configuration (key, endpoint, timeouts, retries) lives in utils/llm_client.py
+
+FALLBACK_REPLY = "Sorry, I couldn't generate a response."
+DEGRADED_REPLY = "The AI assistant is temporarily unavailable. Please try again in a moment."
 
 @ask_ai_bp.route('/conversations', methods=['POST'])
 @jwt_required()
 def create_conversation():
     """
     Creates a new AI conversation for the logged-in user.
-    Optionally takes a 'title' in the request body.
+    Optionally takes a 'title' in the request body, and 'cache_responses'
+    to let replies in this conversation be served from the shared response cache.
     """
     user_id = get_jwt_identity()
     data = request.get_json()
@@ -35,7 +44,8 @@ def create_conversation():
             "user_id": ObjectId(user_id),
             "title": title,
             "created_at": datetime.datetime.utcnow(),
-            "messages": [] # Stores chat messages
+            "message_count": 0, # Messages themselves live in ai_messages
+            "cache_responses": bool(data.get("cache_responses", False))
         }
         result = ai_conversations_collection.insert_one(new_conversation)
         return jsonify({
@@ -52,63 +62,170 @@ def create_conversation():
 @jwt_required()
 def get_all_conversations():
     """
-    Retrieves a list of all conversations for the logged-in user.
+    Retrieves a page of conversations for the logged-in user, most recent first.
     """
     user_id = get_jwt_identity()
 
     try:
-        conversations_cursor = ai_conversations_collection.find(
-            {"user_id": ObjectId(user_id)}
-        ).sort("created_at", -1) # Sort by most recent
+        limit, cursor = page_args()
+        conversations_page, next_cursor = paginate(
+            ai_conversations_collection,
+            {"user_id": ObjectId(user_id)},
+            [("created_at", -1)], # Sort by most recent
+            projection={"title": 1, "created_at": 1},
+            limit=limit,
+            cursor=cursor
+        )
 
         conversations = []
-        for conv in conversations_cursor:
+        for conv in conversations_page:
             conversations.append({
                 "_id": str(conv["_id"]),
                 "title": conv["title"],
                 "created_at": conv["created_at"].isoformat()
             })
-        return jsonify({"conversations": conversations}), 200
+        return jsonify({"conversations": conversations, "page": page_info(limit, next_cursor)}), 200
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print(f"Error fetching conversations: {e}")
         return jsonify({"error": "Failed to fetch conversations", "details": str(e)}), 500
 
+def _serialize_conversation(conversation, messages):
+    """
+    Converts ObjectIds and datetimes for JSON serialization.
+    """
+    for msg in messages:
+        if 'timestamp' in msg and isinstance(msg['timestamp'], datetime.datetime):
+            msg['timestamp'] = msg['timestamp'].isoformat()
+    return {
+        "_id": str(conversation["_id"]),
+        "user_id": str(conversation["user_id"]),
+        "title": conversation["title"],
+        "created_at": conversation["created_at"].isoformat(),
+        "message_count": conversation.get("message_count", len(messages)),
+        "cache_responses": conversation.get("cache_responses", False),
+        "messages": messages
+    }
+
+
+def _find_conversation(conversation_id, user_id):
+    """
+    Loads a conversation's metadata (never its messages), migrating a legacy
+    embedded messages array to ai_messages on first access.
+    """
+    conversation = ai_conversations_collection.find_one(
+        {"_id": ObjectId(conversation_id), "user_id": ObjectId(user_id)},
+        {"messages": 0}
+    )
+    if conversation and "message_count" not in conversation:
+        conversation["message_count"] = conversation_store.migrate_embedded_messages(conversation["_id"])
+    return conversation
+
+
+def _degraded_response(error):
+    """
+    Fast 503 returned while the Gemini circuit breaker is open.
+    """
+    response = jsonify({
+        "error": "AI service is temporarily unavailable",
+        "reply": DEGRADED_REPLY,
+        "degraded": True
+    })
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response, 503
+
+
 @ask_ai_bp.route('/conversations/<conversation_id>', methods=['GET'])
 @jwt_required()
 def get_conversation_by_id(conversation_id):
     """
     Retrieves a specific conversation by its ID for the logged-in user.
+    Messages are paged: the first page holds the newest messages (oldest first
+    within the page), and page.next fetches earlier ones via ?cursor=.
     """
     user_id = get_jwt_identity()
 
     try:
-        conversation = ai_conversations_collection.find_one({
-            "_id": ObjectId(conversation_id),
-            "user_id": ObjectId(user_id)
-        })
+        limit, cursor = page_args()
+        conversation = _find_conversation(conversation_id, user_id)
 
         if conversation:
-            # Convert ObjectId and datetime for JSON serialization
-            conversation['_id'] = str(conversation['_id'])
-            conversation['user_id'] = str(conversation['user_id'])
-            conversation['created_at'] = conversation['created_at'].isoformat()
-            # Ensure messages are also properly formatted if they contain non-string types
-            for msg in conversation['messages']:
-                if 'timestamp' in msg and isinstance(msg['timestamp'], datetime.datetime):
-                    msg['timestamp'] = msg['timestamp'].isoformat()
-            return jsonify({"conversation": conversation}), 200
+            messages, next_cursor = conversation_store.page_messages(conversation["_id"], limit, cursor)
+            return jsonify({
+                "conversation": _serialize_conversation(conversation, messages),
+                "page": page_info(limit, next_cursor)
+            }), 200
         else:
             return jsonify({"error": "Conversation not found or unauthorized"}), 404
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print(f"Error fetching conversation: {e}")
         return jsonify({"error": "Failed to fetch conversation", "details": str(e)}), 500
 
+def _reply(conversation, user_message, job_id=None):
+    """
+    Gets Gemini's reply to user_message and stores both messages (tagged
+    with job_id when a background job is replying).
+    Returns (stored documents, cache status).
+    """
+    # Prepare chat history for Gemini API (recent turns + rolling summary, token-budgeted)
+    chat_history_for_gemini, gemini_options = context_window.build_context(conversation, user_message)
+
+    # Call Gemini API (pooled connection, timeouts and retries in llm_client),
+    # or reuse a cached reply for context-free / opted-in prompts
+    cacheable = response_cache.should_cache(conversation, chat_history_for_gemini, gemini_options)
+    gemini_result, cache_status = response_cache.generate(chat_history_for_gemini, gemini_options, cacheable)
+
+    ai_message = {
+        "role": "model",
+        "text": extract_text(gemini_result) or FALLBACK_REPLY,
+        "timestamp": datetime.datetime.utcnow()
+    }
+    messages = [user_message, ai_message]
+    if job_id is not None:
+        messages = [{**message, "job_id": job_id} for message in messages]
+    # Append both messages atomically (one $inc reserves their sequence numbers)
+    stored = conversation_store.append_messages(conversation["_id"], messages)
+    return stored, cache_status
+
+
+def _serialize_message(message):
+    serialized = {key: message[key] for key in ("seq", "role", "text")}
+    serialized["timestamp"] = message["timestamp"].isoformat()
+    return serialized
+
+
+@job_handler("ai_reply")
+def ai_reply_job(payload, job_id):
+    """
+    Background variant of add_message_and_get_ai_response (?async=true).
+    A rerun of a job whose reply is already stored returns that reply
+    instead of appending the turn again.
+    """
+    stored = conversation_store.job_messages(job_id)
+    if len(stored) < 2:
+        conversation = _find_conversation(payload["conversation_id"], payload["user_id"])
+        if not conversation:
+            raise PermanentJobError("Conversation not found")
+        user_message = {"role": "user", "text": payload["text"], "timestamp": payload["timestamp"]}
+        try:
+            stored, _ = _reply(conversation, user_message, job_id)
+        except BulkWriteError:
+            # Another run of this job stored its reply first
+            stored = conversation_store.job_messages(job_id)
+    return {"message": _serialize_message(stored[-1]), "message_count": stored[-1]["seq"]}
+
+
 @ask_ai_bp.route('/conversations/<conversation_id>/messages', methods=['POST'])
 @jwt_required()
 def add_message_and_get_ai_response(conversation_id):
     """
     Adds a user message to a conversation, calls Gemini API, and adds AI response.
-    Returns the updated conversation.
+    Returns the conversation with its most recent messages.
+    With ?async=true the Gemini call runs as a background job instead and the
+    response is 202 with a job id; the job's result holds the stored reply.
     """
     user_id = get_jwt_identity()
     data = request.get_json()
@@ -118,81 +235,154 @@ def add_message_and_get_ai_response(conversation_id):
         return jsonify({"error": "No message text provided"}), 400
 
     try:
-        # 1. Fetch the existing conversation
-        conversation = ai_conversations_collection.find_one({
-            "_id": ObjectId(conversation_id),
-            "user_id": ObjectId(user_id)
-        })
+        # 1. Fetch the existing conversation (metadata only)
+        conversation = _find_conversation(conversation_id, user_id)
 
         if not conversation:
             return jsonify({"error": "Conversation not found or unauthorized"}), 404
 
-        # 2. Add user message to conversation history
+        # 2. Build the user message; it is stored together with the reply
         user_message = {
             "role": "user",
             "text": user_message_text,
             "timestamp": datetime.datetime.utcnow()
         }
-        conversation['messages'].append(user_message)
-
-        # 3. Prepare chat history for Gemini API
-        # Gemini API expects 'parts' to be a list of objects, each with a 'text' key
-        chat_history_for_gemini = []
-        for msg in conversation['messages']:
-            chat_history_for_gemini.append({
-                "role": msg["role"],
-                "parts": [{"text": msg["text"]}]
-            })
+        if request.args.get("async", "").lower() == "true":
+            job_id = enqueue("ai_reply", {
+                "conversation_id": conversation_id,
+                "user_id": user_id,
+                **user_message
+            }, user_id=user_id)
+            return job_accepted(job_id)
 
-        # 4. Call Gemini API
-        gemini_payload = { "contents": chat_history_for_gemini }
-        gemini_headers = { 'Content-Type': 'application/json' }
-        gemini_response = requests.post(
-            f"{GEMINI_API_URL}?key={GEMINI_API_KEY}",
-            headers=gemini_headers,
-            json=gemini_payload
-        )
-        gemini_response.raise_for_status() # Raise an HTTPError for bad responses (4xx or 5xx)
-        gemini_result = gemini_response.json()
-
-        ai_response_text = "Sorry, I couldn't generate a response."
-        if gemini_result.get('candidates') and len(gemini_result['candidates']) > 0 and \
-           gemini_result['candidates'][0].get('content') and \
-           gemini_result['candidates'][0]['content'].get('parts') and \
-           len(gemini_result['candidates'][0]['content']['parts']) > 0:
-            ai_response_text = gemini_result['candidates'][0]['content']['parts'][0].get('text', ai_response_text)
-
-        # 5. Add AI response to conversation history
-        ai_message = {
-            "role": "model",
-            "text": ai_response_text,
-            "timestamp": datetime.datetime.utcnow()
-        }
-        conversation['messages'].append(ai_message)
+        # 3. Get the reply and store both messages
+        _, cache_status = _reply(conversation, user_message)
+        conversation["message_count"] += 2
 
-        # 6. Update conversation in database
-        ai_conversations_collection.update_one(
-            {"_id": ObjectId(conversation_id)},
-            {"$set": {"messages": conversation['messages']}}
-        )
+        # Return the conversation with its latest page of messages
+        limit, _ = page_args()
+        messages, next_cursor = conversation_store.page_messages(conversation["_id"], limit)
+        response = jsonify({
+            "conversation": _serialize_conversation(conversation, messages),
+            "page": page_info(limit, next_cursor)
+        })
+        response.headers["X-AI-Cache"] = cache_status
+        return response, 200
+
+    except LLMUnavailableError as e:
+        return _degraded_response(e)
+    except (requests.exceptions.RequestException, LLMError) as req_err:
+        print(f"Error calling Gemini API: {req_err}")
+        return jsonify({"error": "Failed to get AI response from external API", "details": str(req_err)}), 502
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error adding message or processing AI response: {e}")
+        return jsonify({"error": "Failed to process chat message", "details": str(e)}), 500
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@ask_ai_bp.route('/conversations/<conversation_id>/messages/stream', methods=['POST'])
+@jwt_required()
+def stream_message_and_ai_response(conversation_id):
+    """
+    Streaming variant of add_message_and_get_ai_response. Relays Gemini's reply
+    to the browser as server-sent events while it is generated:
+      event: delta  data: {"text": "..."}   (one per upstream chunk)
+      event: done   data: {"message": {...}, "message_count": N}
+      event: error  data: {"error": "..."}
+    Both messages are stored once the stream completes. If the client goes away
+    mid-stream the upstream request is closed and the partial reply is stored
+    with "incomplete": true. A cached reply is replayed as a single delta;
+    completed cacheable replies are added to the cache (streams aren't coalesced).
+    """
+    user_id = get_jwt_identity()
+    data = request.get_json()
+    user_message_text = data.get("text") if data else None
 
-        # Return the updated conversation (with both user and AI messages)
-        conversation['_id'] = str(conversation['_id'])
-        conversation['user_id'] = str(conversation['user_id'])
-        conversation['created_at'] = conversation['created_at'].isoformat()
-        for msg in conversation['messages']: # Ensure all timestamps are isoformat
-            if 'timestamp' in msg and isinstance(msg['timestamp'], datetime.datetime):
-                msg['timestamp'] = msg['timestamp'].isoformat()
+    if not user_message_text:
+        return jsonify({"error": "No message text provided"}), 400
 
-        return jsonify({"conversation": conversation}), 200
+    try:
+        conversation = _find_conversation(conversation_id, user_id)
+        if not conversation:
+            return jsonify({"error": "Conversation not found or unauthorized"}), 404
 
-    except requests.exceptions.RequestException as req_err:
+        user_message = {
+            "role": "user",
+            "text": user_message_text,
+            "timestamp": datetime.datetime.utcnow()
+        }
+        contents, gemini_options = context_window.build_context(conversation, user_message)
+
+        cache_key = cached = upstream = None
+        if response_cache.should_cache(conversation, contents, gemini_options):
+            cache_key = response_cache.key(contents, gemini_options)
+            cached = response_cache.lookup(cache_key)
+        started = time.perf_counter()
+        if cached is None:
+            upstream = gemini_client.stream_generate(contents, **gemini_options)
+    except LLMUnavailableError as e:
+        return _degraded_response(e)
+    except (requests.exceptions.RequestException, LLMError) as req_err:
         print(f"Error calling Gemini API: {req_err}")
         return jsonify({"error": "Failed to get AI response from external API", "details": str(req_err)}), 502
     except Exception as e:
-        print(f"Error adding message or processing AI response: {e}")
+        print(f"Error starting AI stream: {e}")
         return jsonify({"error": "Failed to process chat message", "details": str(e)}), 500
 
+    def generate():
+        chunks = []
+        completed = False
+        stored = None
+        try:
+            for event in upstream if upstream is not None else [cached]:
+                text = extract_text(event)
+                if text:
+                    chunks.append(text)
+                    yield _sse("delta", {"text": text})
+            completed = True
+            if cache_key and upstream is not None and chunks:
+                response_cache.store(cache_key, {
+                    "candidates": [{"content": {"role": "model", "parts": [{"text": "".join(chunks)}]}}],
+                    "usageMetadata": upstream.usage or {}
+                }, (time.perf_counter() - started) * 1000)
+        except (requests.exceptions.RequestException, LLMError) as e:
+            print(f"Error reading Gemini stream: {e}")
+            yield _sse("error", {"error": "AI response stream was interrupted"})
+        finally:
+            # Runs on completion, upstream failure, or client disconnect (GeneratorExit)
+            if upstream is not None:
+                upstream.close()
+            if completed or chunks:
+                ai_message = {
+                    "role": "model",
+                    "text": "".join(chunks) or FALLBACK_REPLY,
+                    "timestamp": datetime.datetime.utcnow()
+                }
+                if not completed:
+                    ai_message["incomplete"] = True
+                try:
+                    stored = conversation_store.append_messages(conversation["_id"], [user_message, ai_message])
+                except Exception as e:
+                    print(f"Error saving streamed AI response: {e}")
+
+        if stored:
+            yield _sse("done", {"message": _serialize_message(stored[1]), "message_count": stored[1]["seq"]})
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    if upstream is not None:
+        # generate()'s finally never runs if the client leaves before the first
+        # chunk; this releases the connection (and settles the breaker) then too
+        response.call_on_close(upstream.close)
+    return response
+
 @ask_ai_bp.route('/conversations/<conversation_id>', methods=['DELETE'])
 @jwt_required()
 def delete_conversation(conversation_id):
@@ -208,6 +398,7 @@ def delete_conversation(conversation_id):
         })
 
         if result.deleted_count == 1:
+            conversation_store.delete_conversation_messages(ObjectId(conversation_id))
             return jsonify({"message": "Conversation deleted successfully!"}), 200
         else:
             return jsonify({"error": "Conversation not found or unauthorized"}), 404
@@ -1,19 +1,16 @@
 import datetime
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, get_jwt, get_jwt_identity, jwt_required
-from pymongo import MongoClient
+from pymongo.errors import DuplicateKeyError
 import bcrypt
-import os
-from dotenv import load_dotenv
 from email_validator import validate_email, EmailNotValidError
+from utils import db
+from utils.auth_helpers import load_current_user
 from utils.jwt_blacklist import add_token_to_blacklist
+from utils.rollups import increment
 from bson.objectid import ObjectId
 
-load_dotenv()
-
-client = MongoClient(os.getenv("MONGO_URI"))
-db = client["healthsync"]
-users_collection = db["users"]
+users_collection = db.users()
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
@@ -54,7 +51,12 @@ def register():
     if 'profile_image_url' in data and data['profile_image_url']:
         user['profile_image_url'] = data['profile_image_url']
     
-    users_collection.insert_one(user)
+    try:
+        users_collection.insert_one(user)
+    except DuplicateKeyError:
+        # Unique index on email catches concurrent registrations
+        return jsonify({'error': 'User already exists'}), 400
+    increment("registrations")
     return jsonify({'message': 'User registered successfully'}), 201
 
 @auth_bp.route('/login', methods=['POST'])
@@ -71,9 +73,10 @@ def login():
 @auth_bp.route('/logout', methods=['POST'])
 @jwt_required()
 def logout():
-    jti = get_jwt()["jti"]
+    claims = get_jwt()
     user_id = get_jwt_identity()
-    add_token_to_blacklist(jti, user_id)
+    expires_at = datetime.datetime.utcfromtimestamp(claims["exp"])
+    add_token_to_blacklist(claims["jti"], user_id, expires_at)
     return jsonify({"message": "Logged out successfully"}), 200
 
 @auth_bp.route('/profile', methods=['GET'])
@@ -84,15 +87,12 @@ def profile():
     Requires a valid JWT access token.
     Returns user details like name, email, age, gender, history, and profile_image_url.
     """
-    current_user_id = get_jwt_identity()
-    
     try:
-        user = users_collection.find_one(
-            {'_id': ObjectId(current_user_id)},
-            {'password': 0} # Exclude password
-        )
+        user = load_current_user()
         
         if user:
+            # Copy before serializing so the request-scoped document stays intact
+            user = dict(user)
             # Convert ObjectId to string for JSON serialization
             for key, value in user.items():
                 if isinstance(value, ObjectId):
@@ -0,0 +1,139 @@
+# api/dashboard.py
+"""
+Single-request dashboard bootstrap.
+
+GET /api/dashboard returns everything the dashboard's first paint needs:
+profile, latest health check, and the first page of conversations, reports
+and prediction history. The JWT and blocklist checks run once, and the five
+independent queries run concurrently on a small shared thread pool, so the
+response takes about as long as the slowest query rather than the sum of
+five round trips. Each query projects only the fields the dashboard
+renders.
+
+Sections fail independently. A failed or slow section is null in the
+payload, and its message is listed under "errors". The lists carry the same
+"page" cursor as their own endpoints, so "show more" continues from there.
+
+Configuration:
+    DASHBOARD_WORKERS          threads shared by all dashboard requests (default 8)
+    DASHBOARD_TIMEOUT_SECONDS  overall wait for the sections (default 5)
+    DASHBOARD_LIST_LIMIT       items per list section (default 5)
+"""
+import datetime
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from bson.objectid import ObjectId
+from flask import Blueprint, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+
+from utils import db
+from utils.auth_helpers import get_user_role
+from utils.health_snapshots import get_snapshot
+from utils.pagination import page_info, paginate
+
+DASHBOARD_WORKERS = int(os.getenv("DASHBOARD_WORKERS", 8))
+DASHBOARD_TIMEOUT_SECONDS = float(os.getenv("DASHBOARD_TIMEOUT_SECONDS", 5))
+DASHBOARD_LIST_LIMIT = int(os.getenv("DASHBOARD_LIST_LIMIT", 5))
+
+PROFILE_PROJECTION = {"name": 1, "email": 1, "age": 1, "gender": 1, "history": 1, "profile_image_url": 1, "role": 1}
+CONVERSATION_PROJECTION = {"title": 1, "created_at": 1, "message_count": 1}
+REPORT_PROJECTION = {"report_name": 1, "report_date": 1, "uploaded_at": 1, "file_size": 1, "file_mime_type": 1}
+HISTORY_PROJECTION = {"symptoms": 1, "prediction": 1, "confidence": 1, "created_at": 1}
+
+users_collection = db.users()
+ai_conversations_collection = db.ai_conversations()
+medical_reports_collection = db.medical_reports()
+predictions_collection = db.predictions()
+
+_executor = ThreadPoolExecutor(max_workers=DASHBOARD_WORKERS, thread_name_prefix="dashboard")
+
+dashboard_bp = Blueprint('dashboard', __name__, url_prefix='/api/dashboard')
+
+
+def _jsonable(document):
+    for key, value in document.items():
+        if isinstance(value, ObjectId):
+            document[key] = str(value)
+        elif isinstance(value, datetime.datetime):
+            document[key] = value.isoformat()
+    return document
+
+
+def _profile(user_id):
+    user = users_collection.find_one({"_id": ObjectId(user_id)}, PROFILE_PROJECTION)
+    return _jsonable(user) if user else None
+
+
+def _health(user_id):
+    snapshot = get_snapshot(ObjectId(user_id))
+    if snapshot is None:
+        return None
+    record = _jsonable(dict(snapshot["record"]))
+    record["metrics"] = snapshot.get("metrics", {})
+    return record
+
+
+def _page(collection, query, sort, projection, transform=_jsonable):
+    items, next_cursor = paginate(collection, query, sort, projection=projection, limit=DASHBOARD_LIST_LIMIT)
+    return {"items": [transform(item) for item in items], "page": page_info(DASHBOARD_LIST_LIMIT, next_cursor)}
+
+
+def _conversations(user_id):
+    return _page(ai_conversations_collection, {"user_id": ObjectId(user_id)}, [("created_at", -1)], CONVERSATION_PROJECTION)
+
+
+def _report(report):
+    report = _jsonable(report)
+    report["download_url"] = f"/api/history/reports/{report['_id']}/file"
+    return report
+
+
+def _reports(user_id):
+    return _page(medical_reports_collection, {"user_id": ObjectId(user_id)}, [("report_date", -1)], REPORT_PROJECTION, _report)
+
+
+def _history(user_id):
+    # Same rule as /api/history
+    if get_user_role(user_id) != "user":
+        return None
+    return _page(predictions_collection, {"user_id": user_id}, [("created_at", -1)], HISTORY_PROJECTION)
+
+
+SECTIONS = {
+    "profile": _profile,
+    "health": _health,
+    "conversations": _conversations,
+    "reports": _reports,
+    "history": _history,
+}
+
+
+@dashboard_bp.route('', methods=['GET'])
+@jwt_required()
+def get_dashboard():
+    """
+    Returns {"profile", "health", "conversations", "reports", "history",
+    "errors"}; see the module docstring.
+    """
+    user_id = get_jwt_identity()
+    futures = {name: _executor.submit(section, user_id) for name, section in SECTIONS.items()}
+    wait(futures.values(), timeout=DASHBOARD_TIMEOUT_SECONDS)
+
+    payload, errors = {}, {}
+    for name, future in futures.items():
+        payload[name] = None
+        if not future.done():
+            future.cancel()
+            errors[name] = "Timed out"
+            continue
+        try:
+            payload[name] = future.result()
+        except Exception as e:
+            print(f"Error loading dashboard section {name}: {e}")
+            errors[name] = str(e)
+
+    if errors.keys() == SECTIONS.keys():
+        return jsonify({"error": "Failed to load dashboard", "details": errors}), 500
+    payload["errors"] = errors
+    return jsonify(payload), 200
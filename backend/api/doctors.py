@@ -1,17 +1,15 @@
 import datetime
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from pymongo import MongoClient
-import os
-from dotenv import load_dotenv
 from bson.objectid import ObjectId
+from utils import db
+from utils.doctor_search import doctor_search, tokenize
+# Fields clients may sort by; each has a matching index, and the search index ranks each
+from utils.indexes import DOCTOR_SORT_KEYS as DOCTOR_SORT_FIELDS
+from utils.pagination import PaginationError, decode_cursor, encode_cursor, page_args, page_info, paginate
 
-load_dotenv()
-
-client = MongoClient(os.getenv("MONGO_URI"))
-db = client["healthsync"]
-doctors_collection = db["doctors"]
-doctor_consultations_collection = db["doctor_consultations"] # New collection for doctor-patient chats
+doctors_collection = db.doctors()
+doctor_consultations_collection = db.doctor_consultations() # New collection for doctor-patient chats
 
 doctors_bp = Blueprint('doctors', __name__, url_prefix='/api/doctors')
 
@@ -93,6 +91,7 @@ def insert_mock_doctors():
             },
         ]
         doctors_collection.insert_many(mock_doctors)
+        doctor_search.invalidate()
         print("Mock doctors inserted into the database.")
 
 # Call this function when the blueprint is registered or app starts
@@ -107,9 +106,12 @@ def get_doctors():
     Retrieves a list of doctors, with optional filtering, searching, and sorting.
     Query parameters:
     - specialty: Filter by specialty (e.g., 'Cardiology')
-    - search: Search by doctor name or specialty
-    - sort_by: Field to sort by (e.g., 'rating', 'experience', 'name')
-    - sort_order: 'asc' or 'desc' (default 'desc' for rating/experience, 'asc' for name)
+    - search: Search by doctor name, specialty or hospital (prefix and typo
+      tolerant, ranked by relevance; see utils/doctor_search.py)
+    - sort_by: Field to sort by ('rating', 'experience', 'name' or 'consultation_fee',
+      or 'relevance' with search, which is the default there)
+    - sort_order: 'asc' or 'desc' (default 'desc')
+    - limit, cursor: pagination (see utils/pagination.py)
     """
     user_id = get_jwt_identity() # Ensure user is authenticated
 
@@ -122,15 +124,13 @@ def get_doctors():
     if specialty:
         query["specialty"] = specialty
 
-    if search_query:
-        # Case-insensitive search on name and specialty
-        query["$or"] = [
-            {"name": {"$regex": search_query, "$options": "i"}},
-            {"specialty": {"$regex": search_query, "$options": "i"}}
-        ]
+    if search_query and tokenize(search_query):
+        return _search_doctors(search_query, specialty, sort_by, sort_order)
 
     sort_criteria = []
     if sort_by:
+        if sort_by not in DOCTOR_SORT_FIELDS:
+            return jsonify({"error": f"sort_by must be one of: {', '.join(DOCTOR_SORT_FIELDS)}"}), 400
         order = 1 if sort_order == 'asc' else -1
         sort_criteria.append((sort_by, order))
     else:
@@ -138,18 +138,65 @@ def get_doctors():
         sort_criteria.append(("rating", -1)) # Sort by rating descending by default
 
     try:
-        doctors_cursor = doctors_collection.find(query).sort(sort_criteria)
+        limit, cursor = page_args()
+        doctors_page, next_cursor = paginate(
+            doctors_collection, query, sort_criteria, limit=limit, cursor=cursor
+        )
         
         doctors = []
-        for doctor in doctors_cursor:
+        for doctor in doctors_page:
             doctor['_id'] = str(doctor['_id']) # Convert ObjectId to string
             doctors.append(doctor)
         
-        return jsonify({"doctors": doctors}), 200
+        return jsonify({"doctors": doctors, "page": page_info(limit, next_cursor)}), 200
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print(f"Error fetching doctors: {e}")
         return jsonify({"error": "Failed to fetch doctors", "details": str(e)}), 500
 
+def _search_doctors(search_query, specialty, sort_by, sort_order):
+    """
+    Ranked search through the in-memory index, then one $in fetch for the
+    page. Pages use an offset cursor, since results are ranked, not keyed.
+    """
+    if sort_by in (None, "relevance"):
+        sort_by = None
+    elif sort_by not in DOCTOR_SORT_FIELDS:
+        return jsonify({"error": f"sort_by must be one of: relevance, {', '.join(DOCTOR_SORT_FIELDS)}"}), 400
+
+    try:
+        limit, cursor = page_args()
+        offset = 0
+        if cursor:
+            values = decode_cursor(cursor)
+            if len(values) != 2 or values[0] != "search" or not isinstance(values[1], int) or values[1] < 0:
+                raise PaginationError("Invalid cursor")
+            offset = values[1]
+
+        total, hits = doctor_search.search(
+            search_query, specialty=specialty, sort_by=sort_by,
+            descending=sort_order != 'asc', offset=offset, limit=limit
+        )
+        found = {doctor["_id"]: doctor for doctor in doctors_collection.find({"_id": {"$in": [doctor_id for doctor_id, _ in hits]}})}
+
+        doctors = []
+        for doctor_id, score in hits:
+            doctor = found.get(doctor_id)
+            if doctor is None:
+                continue  # deleted since the index was built
+            doctor['_id'] = str(doctor['_id'])
+            doctor['score'] = score
+            doctors.append(doctor)
+
+        next_cursor = encode_cursor(["search", offset + limit]) if offset + limit < total else None
+        return jsonify({"doctors": doctors, "total": total, "page": page_info(limit, next_cursor)}), 200
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error searching doctors: {e}")
+        return jsonify({"error": "Failed to search doctors", "details": str(e)}), 500
+
 # --- Consultation Endpoints ---
 @doctors_bp.route('/consultation/initiate', methods=['POST'])
 @jwt_required()
@@ -1,20 +1,24 @@
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from pymongo import MongoClient
+import hashlib
+import io
 from datetime import datetime
-import os
-from dotenv import load_dotenv
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.formparser import parse_form_data
+from werkzeug.wsgi import wrap_file
+from utils import db
+from utils import report_store
 from utils.auth_helpers import get_user_role
+from utils.pagination import PaginationError, page_args, page_info, paginate
+from utils.pdf_report import render_report
+from utils.jobs import PermanentJobError, enqueue, job_handler
+from api.jobs import job_accepted
+from pymongo.errors import DuplicateKeyError
 from bson.objectid import ObjectId # Needed for querying by user ID
 
-load_dotenv()
-
-client = MongoClient(os.getenv("MONGO_URI"))
-db = client["healthsync"]
 # Define new collection for medical reports
-medical_reports_collection = db["medical_reports"]
-# MongoDB setup
-prediction_collection = db["predictions"]
+medical_reports_collection = db.medical_reports()
+prediction_collection = db.predictions()
 
 # Blueprint for history
 history_bp = Blueprint('history', __name__, url_prefix='/api/history')
@@ -26,20 +30,116 @@ def get_user_history():
     if get_user_role(user_id) != "user":
         return jsonify({"error": "Only users can access history"}), 403
 
-    history_cursor = prediction_collection.find({"user_id": user_id}, {"_id": 0})
-    history = list(history_cursor)
-    return jsonify({"history": history}), 200
+    try:
+        limit, cursor = page_args()
+        history, next_cursor = paginate(
+            prediction_collection, {"user_id": user_id}, [("created_at", -1)],
+            limit=limit, cursor=cursor
+        )
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+
+    for record in history:
+        record.pop("_id", None)
+    return jsonify({"history": history, "page": page_info(limit, next_cursor)}), 200
+
+
+
+def _insert_report_document(user_id, report_name, report_date, file_id, file_sha256, file_size, file_mime_type, job_id=None):
+    report_document = {
+        "user_id": ObjectId(user_id),
+        "report_name": report_name,
+        "report_date": report_date,
+        "file_id": file_id,
+        "file_sha256": file_sha256,
+        "file_size": file_size,
+        "file_mime_type": file_mime_type,
+        "uploaded_at": datetime.utcnow()  # <- FIXED LINE
+    }
+    if job_id is not None:
+        report_document["job_id"] = job_id
+    result = medical_reports_collection.insert_one(report_document)
+    return str(result.inserted_id)
+
+
+def _save_report_document(user_id, report_name, report_date, file_id, *file_details):
+    try:
+        report_id = _insert_report_document(user_id, report_name, report_date, file_id, *file_details)
+    except Exception:
+        # Give back the file reference taken for this report
+        report_store.release_report_file(file_id)
+        raise
+    return jsonify({
+        "message": "Medical report uploaded successfully!",
+        "report_id": report_id
+    }), 201
+
+
+def _upload_multipart_report(user_id):
+    """
+    Streams a multipart/form-data upload (fields report_name, report_date and
+    a "file" part) into GridFS without buffering the file in memory.
+    """
+    max_bytes = report_store.MAX_REPORT_BYTES
+    if request.content_length and request.content_length > max_bytes + 64 * 1024:
+        return jsonify({"error": f"File exceeds the {max_bytes} byte limit"}), 413
+
+    writers = []
 
+    def stream_factory(total_content_length, content_type, filename, content_length=None):
+        if writers:
+            raise report_store.ReportUploadError("Only one file can be uploaded per report")
+        writer = report_store.StreamingReportWriter(filename, max_bytes)
+        writers.append(writer)
+        return writer
+
+    try:
+        _, form, files = parse_form_data(
+            request.environ,
+            stream_factory=stream_factory,
+            max_form_memory_size=64 * 1024,
+            silent=False
+        )
+        report_name = form.get("report_name")
+        report_date = form.get("report_date")
+        if not report_name or not report_date or "file" not in files:
+            raise report_store.ReportUploadError("Missing required fields: report_name, report_date, file")
+
+        file_id, file_sha256, file_size, file_mime_type = writers[0].finish()
+        return _save_report_document(user_id, report_name, report_date, file_id, file_sha256, file_size, file_mime_type)
+    except report_store.ReportUploadError as e:
+        return jsonify({"error": str(e)}), e.status
+    except RequestEntityTooLarge:
+        return jsonify({"error": "Upload is too large"}), 413
+    except ValueError as e:
+        return jsonify({"error": f"Malformed multipart body: {e}"}), 400
+    except Exception as e:
+        print(f"Error uploading report: {e}")
+        return jsonify({"error": "Failed to upload report", "details": str(e)}), 500
+    finally:
+        for writer in writers:
+            writer.abort()
 
 
 @history_bp.route('/reports', methods=['POST'])
 @jwt_required()
 def upload_report():
     """
-    Allows a user to upload (record) a new medical report, including Base64 PDF content.
-    Expects report_name, report_date, and base64_file_content in the request body.
+    Allows a user to upload (record) a new medical report.
+    Accepts either multipart/form-data (report_name, report_date, file), which is
+    streamed to storage, or JSON with report_name, report_date, file_mime_type and
+    base64_file_content for older clients.
+    The file is stored in GridFS; the report document only keeps metadata.
     """
     user_id = get_jwt_identity()
+    if request.mimetype == "multipart/form-data":
+        return _upload_multipart_report(user_id)
+
+    # Base64 inflates the payload by a third; reject oversized bodies before parsing them
+    max_json_bytes = report_store.MAX_REPORT_BYTES * 4 // 3 + 64 * 1024
+    if request.content_length and request.content_length > max_json_bytes:
+        return jsonify({"error": f"File exceeds the {report_store.MAX_REPORT_BYTES} byte limit"}), 413
+
     data = request.get_json()
 
     if not data:
@@ -53,22 +153,23 @@ def upload_report():
     if not report_name or not report_date or not base64_file_content or not file_mime_type:
         return jsonify({"error": "Missing required fields: report_name, report_date, base64_file_content, file_mime_type"}), 400
 
-    # Basic validation for Base64 prefix (e.g., "data:application/pdf;base64,")
-    if not base64_file_content.startswith(f"data:{file_mime_type};base64,"):
+    # Validates the Base64 prefix (e.g., "data:application/pdf;base64,") and payload
+    file_bytes = report_store.decode_data_uri(base64_file_content, file_mime_type)
+    if file_bytes is None:
         return jsonify({"error": "Invalid Base64 file format or MIME type mismatch"}), 400
+    if len(file_bytes) > report_store.MAX_REPORT_BYTES:
+        return jsonify({"error": f"File exceeds the {report_store.MAX_REPORT_BYTES} byte limit"}), 413
+
+    # Trust the file's leading bytes, not the declared MIME type
+    sniffed_mime_type = report_store.sniff_mime_type(file_bytes[:report_store.SNIFF_BYTES])
+    if sniffed_mime_type is None:
+        return jsonify({"error": "Unsupported file type"}), 415
+    if sniffed_mime_type != report_store.normalize_mime_type(file_mime_type):
+        return jsonify({"error": "File content does not match file_mime_type"}), 400
 
     try:
-        report_document = {
-            "user_id": ObjectId(user_id),
-            "report_name": report_name,
-            "report_date": report_date,
-            "base64_file_content": base64_file_content,
-            "file_mime_type": file_mime_type,
-            "uploaded_at": datetime.utcnow()  # <- FIXED LINE
-        }
-
-        medical_reports_collection.insert_one(report_document)
-        return jsonify({"message": "Medical report uploaded successfully!"}), 201
+        file_id, file_sha256, file_size = report_store.store_report_file(file_bytes, sniffed_mime_type, report_name)
+        return _save_report_document(user_id, report_name, report_date, file_id, file_sha256, file_size, sniffed_mime_type)
     except Exception as e:
         print(f"Error uploading report: {e}")
         return jsonify({"error": "Failed to upload report", "details": str(e)}), 500
@@ -78,44 +179,170 @@ def upload_report():
 def get_reports():
     """
     Retrieves all medical reports for the logged-in user, sorted by date.
-    Includes base64_file_content.
+    Returns metadata only; file bytes are served by /reports/<report_id>/file.
     """
     user_id = get_jwt_identity()
 
     try:
-        reports_cursor = medical_reports_collection.find(
-            {"user_id": ObjectId(user_id)}
-        ).sort("report_date", -1)
+        limit, cursor = page_args()
+        reports_page, next_cursor = paginate(
+            medical_reports_collection,
+            {"user_id": ObjectId(user_id)},
+            [("report_date", -1)],
+            projection={"base64_file_content": 0, "file_id": 0},
+            limit=limit,
+            cursor=cursor
+        )
 
         reports = []
-        for report in reports_cursor:
+        for report in reports_page:
             report['_id'] = str(report['_id'])
             report['user_id'] = str(report['user_id'])
             if 'uploaded_at' in report and isinstance(report['uploaded_at'], datetime):  # FIXED LINE
                 report['uploaded_at'] = report['uploaded_at'].isoformat()
+            report['download_url'] = f"/api/history/reports/{report['_id']}/file"
             reports.append(report)
 
         
-        return jsonify({"reports": reports}), 200
+        return jsonify({"reports": reports, "page": page_info(limit, next_cursor)}), 200
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print(f"Error fetching reports: {e}")
         return jsonify({"error": "Failed to fetch reports", "details": str(e)}), 500
 
-@history_bp.route('/reports/<report_id>', methods=['DELETE'])
+# Fields of a health check record printed on the generated PDF report
+HEALTH_REPORT_FIELDS = (
+    "total_cholesterol", "hdl_cholesterol", "ldl_cholesterol", "blood_pressure",
+    "weight", "height", "diabetes_status", "injury_description", "injury_date", "injury_severity",
+)
+
+
+@job_handler("render_health_report")
+def render_health_report_job(payload, job_id):
+    """
+    Renders the user's latest health check as a PDF and files it under their
+    medical reports. A rerun of the same job returns the report it already filed.
+    """
+    existing = medical_reports_collection.find_one({"job_id": job_id}, {"_id": 1})
+    if existing:
+        return _generated_report(existing["_id"])
+
+    user_id = payload["user_id"]
+    record = db.health_records().find_one({"user_id": ObjectId(user_id)}, sort=[("timestamp", -1)])
+    if not record:
+        raise PermanentJobError("No health data found for this user")
+
+    data = {"Date": record["timestamp"].strftime("%Y-%m-%d")}
+    for field in HEALTH_REPORT_FIELDS:
+        if record.get(field) not in (None, ""):
+            data[field.replace("_", " ").capitalize()] = record[field]
+    pdf_bytes = render_report(data)
+
+    report_name = payload["report_name"]
+    file_id, file_sha256, file_size = report_store.store_report_file(pdf_bytes, "application/pdf", f"{report_name}.pdf")
+    try:
+        report_id = _insert_report_document(
+            user_id, report_name, data["Date"], file_id, file_sha256, file_size, "application/pdf", job_id
+        )
+    except Exception as e:
+        report_store.release_report_file(file_id)
+        if not isinstance(e, DuplicateKeyError):
+            raise
+        # Another run of this job filed the report first
+        return _generated_report(medical_reports_collection.find_one({"job_id": job_id}, {"_id": 1})["_id"])
+    return _generated_report(report_id)
+
+
+def _generated_report(report_id):
+    return {"report_id": str(report_id), "download_url": f"/api/history/reports/{report_id}/file"}
+
+
+@history_bp.route('/reports/generate', methods=['POST'])
 @jwt_required()
-def delete_report(report_id):
+def generate_health_report():
     """
-    Deletes a specific medical report for the logged-in user.
+    Queues rendering of a PDF report from the latest health check. Returns 202
+    with a job id; the job's result carries the new report's download_url.
+    """
+    user_id = get_jwt_identity()
+    data = request.get_json(silent=True) or {}
+    report_name = data.get("report_name") or f"Health Report {datetime.utcnow().strftime('%Y-%m-%d')}"
+
+    try:
+        job_id = enqueue("render_health_report", {"user_id": user_id, "report_name": report_name}, user_id=user_id)
+        return job_accepted(job_id)
+    except Exception as e:
+        print(f"Error queueing health report: {e}")
+        return jsonify({"error": "Failed to queue health report", "details": str(e)}), 500
+
+@history_bp.route('/reports/<report_id>/file', methods=['GET'])
+@jwt_required()
+def download_report(report_id):
+    """
+    Streams a report's file. Supports Range requests and ETag revalidation,
+    so large scans can be resumed and unchanged files aren't re-sent.
     """
     user_id = get_jwt_identity()
 
     try:
-        result = medical_reports_collection.delete_one({
+        report = medical_reports_collection.find_one({
             "_id": ObjectId(report_id),
             "user_id": ObjectId(user_id)
         })
+        if not report:
+            return jsonify({"error": "Report not found or unauthorized"}), 404
+
+        if report.get("file_id"):
+            file_stream = report_store.open_report_file(report["file_id"])
+            if file_stream is None:
+                return jsonify({"error": "Report file is missing"}), 404
+            file_size = file_stream.length
+            etag = report["file_sha256"]
+        else:
+            # Legacy report that hasn't been migrated to GridFS yet
+            file_bytes = report_store.decode_data_uri(
+                report.get("base64_file_content", ""), report.get("file_mime_type", "")
+            )
+            if file_bytes is None:
+                return jsonify({"error": "Report file is missing"}), 404
+            file_stream = io.BytesIO(file_bytes)
+            file_size = len(file_bytes)
+            etag = hashlib.sha256(file_bytes).hexdigest()
+
+        response = Response(
+            wrap_file(request.environ, file_stream, buffer_size=report_store.CHUNK_SIZE),
+            mimetype=report.get("file_mime_type", "application/octet-stream"),
+            direct_passthrough=True
+        )
+        response.content_length = file_size
+        response.set_etag(etag)
+        if isinstance(report.get("uploaded_at"), datetime):
+            response.last_modified = report["uploaded_at"]
+        response.headers.set("Content-Disposition", "inline", filename=report.get("report_name", "report"))
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response.make_conditional(request, accept_ranges=True, complete_length=file_size)
+    except Exception as e:
+        print(f"Error downloading report: {e}")
+        return jsonify({"error": "Failed to download report", "details": str(e)}), 500
+
+@history_bp.route('/reports/<report_id>', methods=['DELETE'])
+@jwt_required()
+def delete_report(report_id):
+    """
+    Deletes a specific medical report for the logged-in user.
+    """
+    user_id = get_jwt_identity()
+
+    try:
+        deleted = medical_reports_collection.find_one_and_delete(
+            {"_id": ObjectId(report_id), "user_id": ObjectId(user_id)},
+            projection={"file_id": 1}
+        )
 
-        if result.deleted_count == 1:
+        if deleted:
+            report_store.release_report_file(deleted.get("file_id"))
             return jsonify({"message": "Medical report deleted successfully!"}), 200
         else:
             return jsonify({"error": "Report not found or unauthorized"}), 404
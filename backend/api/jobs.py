@@ -0,0 +1,73 @@
+from flask import Blueprint, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+
+from utils.auth_helpers import get_user_role
+from utils.jobs import jobs_collection, serialize_job
+from utils.pagination import PaginationError, page_args, page_info, paginate
+
+jobs_bp = Blueprint('jobs', __name__, url_prefix='/api/jobs')
+
+JOB_PROJECTION = {"payload": 0, "worker": 0, "locked_until": 0}
+
+
+def job_accepted(job_id):
+    """
+    202 response for an endpoint that handed its work to a background job.
+    """
+    status_url = f"/api/jobs/{job_id}"
+    response = jsonify({"message": "Accepted", "job_id": job_id, "status_url": status_url})
+    response.headers["Location"] = status_url
+    return response, 202
+
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id):
+    """
+    Returns a job's status, and its result once it has succeeded. Clients poll
+    this until status is "succeeded" or "failed".
+    """
+    user_id = get_jwt_identity()
+
+    try:
+        job = jobs_collection.find_one({"_id": ObjectId(job_id)}, JOB_PROJECTION)
+    except InvalidId:
+        return jsonify({"error": "Invalid job ID"}), 400
+    except Exception as e:
+        print(f"Error fetching job: {e}")
+        return jsonify({"error": "Failed to fetch job", "details": str(e)}), 500
+
+    if not job or (job.get("user_id") != user_id and get_user_role(user_id) != "admin"):
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify({"job": serialize_job(job)}), 200
+
+
+@jobs_bp.route('', methods=['GET'])
+@jwt_required()
+def get_jobs():
+    """
+    Lists the logged-in user's recent jobs, newest first.
+    """
+    user_id = get_jwt_identity()
+
+    try:
+        limit, cursor = page_args()
+        jobs_page, next_cursor = paginate(
+            jobs_collection,
+            {"user_id": user_id},
+            [("created_at", -1)],
+            projection=JOB_PROJECTION,
+            limit=limit,
+            cursor=cursor
+        )
+        return jsonify({
+            "jobs": [serialize_job(job) for job in jobs_page],
+            "page": page_info(limit, next_cursor)
+        }), 200
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error fetching jobs: {e}")
+        return jsonify({"error": "Failed to fetch jobs", "details": str(e)}), 500
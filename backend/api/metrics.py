@@ -0,0 +1,83 @@
+from flask import Blueprint, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+
+from utils import db
+from utils.auth_helpers import get_user_role
+from utils.jwt_blacklist import revocation_cache
+from utils.llm_client import gemini_client
+from utils.mailer import mail_dispatcher
+from utils.inference_scheduler import scheduler
+from utils.model_registry import registry
+from utils.prediction_cache import prediction_cache
+from utils.response_cache import response_cache
+
+metrics_bp = Blueprint('metrics', __name__, url_prefix='/api/metrics')
+
+
+@metrics_bp.route('/db', methods=['GET'])
+@jwt_required()
+def db_pool_metrics():
+    """
+    Returns this worker's MongoDB connection pool statistics (admin only).
+    """
+    if get_user_role(get_jwt_identity()) != "admin":
+        return jsonify({"error": "Unauthorized"}), 403
+
+    return jsonify({"db_pool": db.get_pool_stats()}), 200
+
+
+@metrics_bp.route('/auth', methods=['GET'])
+@jwt_required()
+def auth_metrics():
+    """
+    Returns this worker's revoked-token cache counters (admin only).
+    """
+    if get_user_role(get_jwt_identity()) != "admin":
+        return jsonify({"error": "Unauthorized"}), 403
+
+    return jsonify({"revocation_cache": dict(revocation_cache.stats)}), 200
+
+
+@metrics_bp.route('/llm', methods=['GET'])
+@jwt_required()
+def llm_metrics():
+    """
+    Returns this worker's Gemini call latency, token, circuit breaker and
+    response cache stats (admin only).
+    """
+    if get_user_role(get_jwt_identity()) != "admin":
+        return jsonify({"error": "Unauthorized"}), 403
+
+    return jsonify({"llm": gemini_client.stats(), "response_cache": response_cache.snapshot()}), 200
+
+
+@metrics_bp.route('/mail', methods=['GET'])
+@jwt_required()
+def mail_metrics():
+    """
+    Returns this worker's mail dispatcher queue and delivery counters (admin only).
+    """
+    if get_user_role(get_jwt_identity()) != "admin":
+        return jsonify({"error": "Unauthorized"}), 403
+
+    return jsonify({"mail": mail_dispatcher.snapshot()}), 200
+
+
+@metrics_bp.route('/model', methods=['GET'])
+@jwt_required()
+def model_metrics():
+    """
+    Returns this worker's active model version and its load, warm-up and
+    prediction timings, shadow evaluation counters, prediction cache hit
+    rate, and micro-batching queue stats (admin only).
+    """
+    if get_user_role(get_jwt_identity()) != "admin":
+        return jsonify({"error": "Unauthorized"}), 403
+
+    _, model = registry.active()
+    return jsonify({
+        "model": model.snapshot(),
+        "registry": registry.snapshot(),
+        "prediction_cache": prediction_cache.snapshot(),
+        "scheduler": scheduler.snapshot()
+    }), 200
@@ -1,17 +1,17 @@
 from flask import Blueprint, request, jsonify
-from pymongo import MongoClient
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
-import smtplib
-import ssl
 import random
-import os
+import secrets
+from bson.objectid import ObjectId
+from extension import limiter
+from utils import db
+from utils.jobs import FAILED, PermanentJobError, enqueue, jobs_collection, job_handler
+from utils.mailer import mail_dispatcher
 
 load_dotenv()
 
-client = MongoClient(os.getenv("MONGO_URI"))
-db = client["healthsync"]
-otp_collection = db["otp"]
+otp_collection = db.otp()
 
 otp_bp = Blueprint("otp", __name__, url_prefix="/api/auth")
 
@@ -19,15 +19,26 @@ otp_bp = Blueprint("otp", __name__, url_prefix="/api/auth")
 def generate_otp():
     return str(random.randint(100000, 999999))
 
-# Send OTP email
+# Background job: mails the OTP currently stored for the address, so a retry
+# after a later resend never delivers a stale code. The job waits for the
+# pooled SMTP dispatcher to report the outcome, so a mail lost to a restart
+# is retried from the job queue instead of silently dropped.
+@job_handler("send_otp_email")
+def send_otp_email_job(payload, job_id):
+    record = otp_collection.find_one({'email': payload['email']}, {'otp': 1})
+    if not record:
+        raise PermanentJobError("OTP expired before it could be sent")
+    send_email(payload['email'], record['otp'])
+    # The otp filter keeps an older send from marking a newer code as sent
+    otp_collection.update_one(
+        {'email': payload['email'], 'otp': record['otp']},
+        {'$set': {'delivery_status': 'sent'}}
+    )
+    return {'sent': True}
+
+# Send the OTP email through the pooled SMTP dispatcher and wait for the result
 def send_email(to_email, otp):
-    context = ssl.create_default_context()
-    message = f"""Subject: HealthSync Email Verification\n\nYour OTP is: {otp}"""
-    
-    with smtplib.SMTP(os.getenv("EMAIL_HOST"), int(os.getenv("EMAIL_PORT"))) as server:
-        server.starttls(context=context)
-        server.login(os.getenv("EMAIL_ADDRESS"), os.getenv("EMAIL_PASSWORD"))
-        server.sendmail(os.getenv("EMAIL_ADDRESS"), to_email, message)
+    mail_dispatcher.send(to_email, "HealthSync Email Verification", f"Your OTP is: {otp}")
 
 # Route: Send OTP
 @otp_bp.route('/send-otp', methods=['POST'])
@@ -39,15 +50,36 @@ def send_otp():
         return jsonify({'error': 'Email is required'}), 400
 
     otp = generate_otp()
-    send_email(email, otp)
+    # Only the client that asked for this code can read its delivery status
+    status_token = secrets.token_urlsafe(16)
 
-    # Save OTP with timestamp
+    # Save OTP with timestamp, then hand the mail to a background job
     otp_collection.update_one(
         {'email': email},
-        {'$set': {'otp': otp, 'timestamp': datetime.utcnow()}},
+        {'$set': {'otp': otp, 'timestamp': datetime.utcnow(), 'delivery_status': 'queued', 'status_token': status_token}},
         upsert=True
     )
-    return jsonify({'message': 'OTP sent successfully'}), 200
+    job_id = enqueue("send_otp_email", {'email': email})
+    otp_collection.update_one({'email': email, 'otp': otp}, {'$set': {'job_id': job_id}})
+    return jsonify({'message': 'OTP is being sent', 'status_url': f'/api/auth/otp-status?token={status_token}'}), 202
+
+# Route: OTP delivery status ("queued", "sent" or "failed") for the token
+# returned by send-otp; unknown and expired tokens get the same 404
+@otp_bp.route('/otp-status', methods=['GET'])
+@limiter.limit("30 per minute")
+def otp_status():
+    token = request.args.get('token')
+    record = otp_collection.find_one({'status_token': token}, {'delivery_status': 1, 'job_id': 1}) if token else None
+    if not record:
+        return jsonify({'error': 'Unknown or expired status token'}), 404
+
+    status = record.get('delivery_status', 'sent')
+    if status == 'queued' and record.get('job_id'):
+        # The job gives up after its last attempt; the OTP record only learns about successes
+        job = jobs_collection.find_one({'_id': ObjectId(record['job_id'])}, {'status': 1})
+        if job and job['status'] == FAILED:
+            status = 'failed'
+    return jsonify({'delivery_status': status}), 200
 
 # Route: Verify OTP
 @otp_bp.route('/verify-otp', methods=['POST'])
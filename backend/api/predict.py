@@ -1,27 +1,243 @@
 import datetime
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from pymongo import MongoClient
+import json
 import os
-from dotenv import load_dotenv
+import queue
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt_identity
 from bson.objectid import ObjectId # Needed for querying by user ID
+from utils import db
+from utils.health_metrics import METRIC_FIELDS, TREND_INTERVALS, health_trends, max_range, record_health_metrics
+from utils.health_snapshots import get_snapshot, invalidate_snapshot, update_snapshot
+from utils.model_registry import registry
+from utils.prediction_cache import prediction_cache
+from utils.rollups import record_predictions
+from utils.preprocess import encode_symptom_batch, preprocess_symptoms
+from utils.symptom_vocabulary import vocabulary
 
-load_dotenv()
-
-client = MongoClient(os.getenv("MONGO_URI"))
-db = client["healthsync"]
 # Define new collection for health records
-health_records_collection = db["health_records"]
+health_records_collection = db.health_records()
+predictions_collection = db.predictions()
+
+# Rows per predict_proba call / insert_many in the batch endpoint
+PREDICT_BATCH_CHUNK_SIZE = int(os.getenv("PREDICT_BATCH_CHUNK_SIZE", 512))
+PREDICT_BATCH_MAX_ITEMS = int(os.getenv("PREDICT_BATCH_MAX_ITEMS", 10000))
+NDJSON_MIMETYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
 
 predict_bp = Blueprint('predict', __name__, url_prefix='/api/predict')
 
-# Example prediction route (keep your existing prediction logic here)
+@predict_bp.route('/symptoms', methods=['GET'])
+def suggest_symptoms():
+    """
+    Symptom autocomplete: GET /api/predict/symptoms?q=hea&limit=10
+    """
+    try:
+        limit = min(max(int(request.args.get("limit", 10)), 1), 50)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+
+    response = jsonify({"suggestions": vocabulary.suggest(request.args.get("q", ""), limit)})
+    # The vocabulary only changes on deploy, so browsers can reuse answers per prefix
+    response.headers["Cache-Control"] = "public, max-age=3600"
+    return response, 200
+
+
 @predict_bp.route('/your-prediction-route', methods=['POST'])
 @jwt_required()
 def make_prediction():
-    # Your existing prediction logic would go here
-    # For now, just a placeholder response
-    return jsonify({"message": "Prediction endpoint hit!", "result": "Example result"}), 200
+    """
+    Predicts a disease from {"symptoms": [...]}. Symptom combinations seen
+    before are answered from the prediction cache (X-Prediction-Cache: hit);
+    the rest are micro-batched into shared model calls by the inference
+    scheduler.
+    """
+    user_id = get_jwt_identity()
+    data = request.get_json(silent=True) or {}
+    symptoms = data.get("symptoms")
+
+    if not isinstance(symptoms, list) or not all(isinstance(symptom, str) for symptom in symptoms):
+        return jsonify({"error": "symptoms must be a list of strings"}), 400
+
+    try:
+        features = preprocess_symptoms(symptoms)
+        label, confidence, model_version, cache_status = prediction_cache.predict(features)
+    except queue.Full:
+        return jsonify({"error": "Prediction service is busy, please retry"}), 503
+    except Exception as e:
+        print(f"Error running prediction: {e}")
+        return jsonify({"error": "Prediction failed", "details": str(e)}), 500
+
+    try:
+        predictions_collection.insert_one(
+            _prediction_document(
+                user_id, symptoms, label, confidence, datetime.datetime.utcnow(), model_version=model_version
+            )
+        )
+        record_predictions(user_id)
+    except Exception as e:
+        print(f"Error saving prediction: {e}")
+    response = jsonify({
+        "prediction": label,
+        "confidence": confidence,
+        "model_version": model_version,
+        "unrecognized_symptoms": vocabulary.unrecognized(symptoms)
+    })
+    response.headers["X-Prediction-Cache"] = cache_status
+    return response, 200
+
+
+def _prediction_document(user_id, symptoms, label, confidence, created_at, **extra):
+    """
+    The shape stored in predictions (and listed by /api/history).
+    """
+    return {
+        "user_id": user_id,
+        "symptoms": symptoms,
+        "prediction": label,
+        "confidence": round(float(confidence), 2),
+        "created_at": created_at,
+        **extra
+    }
+
+
+class BatchInputError(ValueError):
+    pass
+
+
+def _ndjson_items():
+    for line_number, line in enumerate(request.stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            raise BatchInputError(f"Invalid JSON on line {line_number}")
+
+
+def _batch_items():
+    """
+    Returns the raw items of a batch request: a JSON array (or {"items": [...]}),
+    or NDJSON with one item per line, read incrementally from the body.
+    """
+    if request.mimetype in NDJSON_MIMETYPES:
+        return _ndjson_items()
+
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get("items")
+    if not isinstance(data, list):
+        raise BatchInputError("Expected a JSON array of symptom lists, {\"items\": [...]}, or NDJSON")
+    if len(data) > PREDICT_BATCH_MAX_ITEMS:
+        raise BatchInputError(f"Batches are limited to {PREDICT_BATCH_MAX_ITEMS} items")
+    return data
+
+
+def _parse_item(item):
+    """
+    Accepts ["fever", ...] or {"symptoms": [...], "id": ...}. Returns (symptoms, client_id).
+    """
+    client_id = None
+    if isinstance(item, dict):
+        client_id = item.get("id")
+        item = item.get("symptoms")
+    if not isinstance(item, list) or not all(isinstance(symptom, str) for symptom in item):
+        raise BatchInputError("symptoms must be a list of strings")
+    return item, client_id
+
+
+def _predict_chunk(user_id, batch_id, chunk):
+    """
+    Runs one vectorized prediction over the rows of a chunk of (index,
+    symptoms, client_id) that miss the prediction cache, and stores the
+    outcomes with a single insert_many. Returns the result rows.
+    """
+    labels, confidences, model_version = prediction_cache.predict_rows(
+        encode_symptom_batch([symptoms for _, symptoms, _ in chunk])
+    )
+    now = datetime.datetime.utcnow()
+    documents = [
+        _prediction_document(user_id, symptoms, label, confidence, now, batch_id=batch_id, model_version=model_version)
+        for (_, symptoms, _), label, confidence in zip(chunk, labels, confidences)
+    ]
+    predictions_collection.insert_many(documents, ordered=False)
+    record_predictions(user_id, len(documents))
+
+    results = []
+    for (index, _, client_id), document in zip(chunk, documents):
+        result = {
+            "index": index,
+            "prediction": document["prediction"],
+            "confidence": document["confidence"],
+            "model_version": document["model_version"],
+        }
+        if client_id is not None:
+            result["id"] = client_id
+        results.append(result)
+    return results
+
+
+@predict_bp.route('/batch', methods=['POST'])
+@jwt_required()
+def batch_predict():
+    """
+    Predicts many symptom sets in one request. Input is a JSON array (or
+    {"items": [...]}) or NDJSON (Content-Type: application/x-ndjson); each
+    item is a symptom list or {"symptoms": [...], "id": "..."}.
+
+    Items are encoded into one matrix and predicted PREDICT_BATCH_CHUNK_SIZE
+    rows at a time, and each chunk is stored with one insert_many. Results
+    stream back as NDJSON, one line per item carrying its input index
+    (invalid items are reported as soon as they are read):
+        {"index": 0, "id": "...", "prediction": "...", "confidence": 87.5}
+        {"index": 1, "error": "symptoms must be a list of strings"}
+    followed by {"summary": {"batch_id": ..., "total": N, "predicted": N, "errors": N}}.
+    """
+    user_id = get_jwt_identity()
+    try:
+        registry.active()[1].get()  # fail with a clear error before streaming if the model can't load
+    except Exception as e:
+        print(f"Error loading prediction model: {e}")
+        return jsonify({"error": "Prediction model unavailable", "details": str(e)}), 503
+
+    try:
+        items = _batch_items()
+    except BatchInputError as e:
+        return jsonify({"error": str(e)}), 400
+
+    batch_id = str(ObjectId())
+
+    def generate():
+        summary = {"batch_id": batch_id, "total": 0, "predicted": 0, "errors": 0}
+        chunk = []
+        try:
+            for index, item in enumerate(items):
+                if index >= PREDICT_BATCH_MAX_ITEMS:
+                    raise BatchInputError(f"Batches are limited to {PREDICT_BATCH_MAX_ITEMS} items")
+                summary["total"] += 1
+                try:
+                    symptoms, client_id = _parse_item(item)
+                except BatchInputError as e:
+                    summary["errors"] += 1
+                    yield json.dumps({"index": index, "error": str(e)}) + "\n"
+                    continue
+                chunk.append((index, symptoms, client_id))
+                if len(chunk) >= PREDICT_BATCH_CHUNK_SIZE:
+                    for result in _predict_chunk(user_id, batch_id, chunk):
+                        yield json.dumps(result) + "\n"
+                    summary["predicted"] += len(chunk)
+                    chunk = []
+            if chunk:
+                for result in _predict_chunk(user_id, batch_id, chunk):
+                    yield json.dumps(result) + "\n"
+                summary["predicted"] += len(chunk)
+        except BatchInputError as e:
+            yield json.dumps({"error": str(e)}) + "\n"
+        except Exception as e:
+            print(f"Error in batch prediction {batch_id}: {e}")
+            yield json.dumps({"error": "Batch prediction failed", "details": str(e)}) + "\n"
+        yield json.dumps({"summary": summary}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
 
 
 @predict_bp.route('/health-check', methods=['POST'])
@@ -54,37 +270,125 @@ def submit_health_check():
 
     try:
         # Insert the new health record
-        health_records_collection.insert_one(health_data)
-        return jsonify({"message": "Health data saved successfully!"}), 201
+        result = health_records_collection.insert_one(health_data)
     except Exception as e:
         print(f"Error saving health data: {e}")
         return jsonify({"error": "Failed to save health data", "details": str(e)}), 500
 
+    try:
+        # The dashboard reads the latest values from this snapshot by _id
+        update_snapshot(health_data)
+    except Exception as e:
+        print(f"Error updating health snapshot: {e}")
+        try:
+            # A stale snapshot would keep serving (and 304-ing) the previous
+            # record; get_snapshot() rebuilds a missing one from health_records
+            invalidate_snapshot(health_data["user_id"])
+        except Exception as e:
+            print(f"Error invalidating health snapshot: {e}")
+            return jsonify({"error": "Health data saved but the dashboard could not be updated", "details": str(e)}), 500
+
+    try:
+        # Numeric values (and BMI, LDL/HDL, parsed BP) go to the time series for trends
+        record_health_metrics(health_data["user_id"], health_data["timestamp"], data, result.inserted_id)
+    except Exception as e:
+        # The record is saved; `flask db migrate-health-metrics` backfills anything missed here
+        print(f"Error saving health metrics: {e}")
+    return jsonify({"message": "Health data saved successfully!"}), 201
+
+
+def _parse_date(value, default):
+    if not value:
+        return default
+    parsed = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+@predict_bp.route('/health-trends', methods=['GET'])
+@jwt_required()
+def get_health_trends():
+    """
+    Downsampled health metric series for charts:
+        GET /api/predict/health-trends?interval=week&metrics=weight,bmi&from=2024-01-01&to=2025-01-01
+
+    interval is day, week or month (default week); the range defaults to the
+    last year. Each point carries the bucket start, the number of checks in
+    it, and avg/min/max per metric.
+    """
+    user_id = get_jwt_identity()
+    interval = request.args.get("interval", "week")
+    if interval not in TREND_INTERVALS:
+        return jsonify({"error": f"interval must be one of {', '.join(TREND_INTERVALS)}"}), 400
+
+    metrics = [metric for metric in request.args.get("metrics", "").split(",") if metric] or list(METRIC_FIELDS)
+    unknown = [metric for metric in metrics if metric not in METRIC_FIELDS]
+    if unknown:
+        return jsonify({"error": f"Unknown metrics: {', '.join(unknown)}", "metrics": list(METRIC_FIELDS)}), 400
+
+    try:
+        end = _parse_date(request.args.get("to"), datetime.datetime.utcnow())
+        start = _parse_date(request.args.get("from"), end - datetime.timedelta(days=365))
+    except ValueError:
+        return jsonify({"error": "from and to must be ISO 8601 dates"}), 400
+    if start >= end:
+        return jsonify({"error": "from must be before to"}), 400
+    if end - start > max_range(interval):
+        return jsonify({"error": f"Range too long for interval={interval}; use a coarser interval"}), 400
+
+    try:
+        points = health_trends(ObjectId(user_id), start, end, interval, metrics)
+    except Exception as e:
+        print(f"Error aggregating health trends: {e}")
+        return jsonify({"error": "Failed to fetch health trends", "details": str(e)}), 500
+
+    for point in points:
+        point["t"] = point["t"].isoformat()
+    return jsonify({
+        "interval": interval,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "metrics": metrics,
+        "points": points
+    }), 200
+
 
 @predict_bp.route('/latest-health-check', methods=['GET'])
 @jwt_required()
 def get_latest_health_check():
     """
-    Retrieves the most recent health check record for the logged-in user.
+    Retrieves the most recent health check record for the logged-in user,
+    from the materialized snapshot (one _id lookup). The record id is the
+    ETag, so an unchanged snapshot revalidates with 304 Not Modified.
     """
     user_id = get_jwt_identity()
 
     try:
-        # Find the latest health record for the user, sorted by timestamp descending
-        latest_record = health_records_collection.find_one(
-            {"user_id": ObjectId(user_id)},
-            sort=[("timestamp", -1)] # Sort by timestamp descending
-        )
+        snapshot = get_snapshot(ObjectId(user_id))
 
-        if latest_record:
+        if snapshot:
+            latest_record = dict(snapshot["record"])
+            etag = str(latest_record["_id"])
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+                response.set_etag(etag)
+                response.cache_control.private = True
+                response.cache_control.no_cache = True
+                return response
             # Convert ObjectId to string for JSON serialization
             latest_record['_id'] = str(latest_record['_id'])
             latest_record['user_id'] = str(latest_record['user_id'])
             # Convert datetime objects to ISO format strings for JSON serialization
             if 'timestamp' in latest_record and isinstance(latest_record['timestamp'], datetime.datetime):
                 latest_record['timestamp'] = latest_record['timestamp'].isoformat()
-            
-            return jsonify({"data": latest_record}), 200
+            latest_record['metrics'] = snapshot.get("metrics", {})
+
+            response = jsonify({"data": latest_record})
+            response.set_etag(etag)
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response, 200
         else:
             return jsonify({"message": "No health data found for this user"}), 404
     except Exception as e:
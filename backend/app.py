@@ -1,5 +1,4 @@
 from datetime import timedelta
-import certifi
 from flask import Flask, jsonify
 from flask_cors import CORS # Keep this import
 from flask_jwt_extended import JWTManager
@@ -12,7 +11,6 @@ from flask_limiter.errors import RateLimitExceeded
 # Import the limiter instance from extension.py
 from extension import limiter 
 from api.otp import otp_bp
-from pymongo import MongoClient
 
 load_dotenv()
 app = Flask(__name__)
@@ -44,11 +42,19 @@ def check_if_token_revoked(jwt_header, jwt_payload):
     """
     return is_token_revoked(jwt_payload)
 
-# MongoDB setup
+# MongoDB setup lives in utils/db.py: one pooled client shared by every blueprint.
 # Ensure your MONGO_URI environment variable is correctly set
+from cli import bootstrap_indexes, register_cli
 
-client = MongoClient(os.getenv("MONGO_URI"), tlsCAFile=certifi.where())
-db = client["healthsync"]
+register_cli(app)
+if os.getenv("MONGO_ENSURE_INDEXES", "true").lower() == "true":
+    bootstrap_indexes()
+
+# Load and warm up the prediction model before serving (and before a
+# pre-forking server forks) instead of on the first prediction request
+if os.getenv("MODEL_PRELOAD", "false").lower() == "true":
+    from utils.model_registry import registry
+    registry.preload()
 
 # Initialize the limiter with the Flask app instance
 limiter.init_app(app)
@@ -65,6 +71,11 @@ from api.predict import predict_bp
 from api.history import history_bp
 from api.ask_ai import ask_ai_bp
 from api.doctors import doctors_bp
+from api.metrics import metrics_bp
+from api.jobs import jobs_bp
+from api.dashboard import dashboard_bp
+from api.admin import admin_bp
+from utils.jobs import worker_pool
 from doctors import doctors_data 
 
 app.register_blueprint(auth_bp)
@@ -72,6 +83,17 @@ app.register_blueprint(predict_bp)
 app.register_blueprint(history_bp)
 app.register_blueprint(ask_ai_bp)
 app.register_blueprint(doctors_bp)
+app.register_blueprint(metrics_bp)
+app.register_blueprint(jobs_bp)
+app.register_blueprint(dashboard_bp)
+app.register_blueprint(admin_bp)
+
+# Background job workers run inside each web worker process (JOB_WORKERS
+# threads, 0 to disable) and/or in a separate `flask jobs work` process.
+# They start on the first request so pre-forked workers each get their own.
+@app.before_request
+def start_job_workers():
+    worker_pool.start()
 
 # Error handler for rate limit exceeded
 @app.errorhandler(RateLimitExceeded)
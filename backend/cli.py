@@ -0,0 +1,216 @@
+# cli.py
+"""
+Maintenance commands, available through the Flask CLI:
+
+    flask db ensure-indexes
+    flask db audit-indexes
+    flask db migrate-reports
+    flask db migrate-conversations
+    flask db migrate-health-metrics
+    flask db rebuild-health-snapshots
+    flask db rebuild-rollups
+    flask db backfill-token-expiry
+    flask jobs work [--workers N]
+    flask model register VERSION PATH [--description TEXT] [--validate]
+    flask model activate VERSION
+    flask model shadow [VERSION --rate R | --off]
+    flask model list
+"""
+import time
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from pymongo.errors import DuplicateKeyError
+
+from utils import db
+from utils.conversation_store import migrate_all_conversations
+from utils.health_metrics import migrate_health_records
+from utils.health_snapshots import rebuild_snapshots
+from utils.indexes import audit_indexes, ensure_indexes
+from utils.jobs import JobWorkerPool, requeue_expired_leases
+from utils.jwt_blacklist import backfill_blacklist_expiry
+from utils.model_loader import MODEL_MMAP_MODE, LazyModel
+from utils.model_registry import activate_version, list_versions, register_version, resolve_model_path, set_shadow
+from utils.report_store import migrate_base64_reports
+from utils.rollups import rebuild_rollups
+
+db_cli = AppGroup("db", help="Database maintenance commands.")
+jobs_cli = AppGroup("jobs", help="Background job commands.")
+model_cli = AppGroup("model", help="Prediction model registry commands.")
+
+
+@db_cli.command("ensure-indexes")
+def ensure_indexes_command():
+    """Create every index the API relies on (safe to re-run)."""
+    created = ensure_indexes()
+    for collection_name, names in created.items():
+        click.echo(f"{collection_name}: {', '.join(names)}")
+
+
+@db_cli.command("audit-indexes")
+def audit_indexes_command():
+    """Explain every hot query and fail if any still scans a collection."""
+    failures = 0
+    for result in audit_indexes():
+        status = "ok" if result["ok"] else "COLLSCAN"
+        shape = f"filter={result['filter']} sort={result['sort']}"
+        click.echo(f"[{status}] {result['collection']} {shape} -> {' > '.join(result['stages'])}")
+        if not result["ok"]:
+            failures += 1
+
+    if failures:
+        raise click.ClickException(f"{failures} query shape(s) are not covered by an index")
+    click.echo("All query shapes use an index.")
+
+
+@db_cli.command("migrate-reports")
+def migrate_reports_command():
+    """Move base64 report payloads into GridFS."""
+    migrated = migrate_base64_reports()
+    click.echo(f"Migrated {migrated} report(s) to GridFS.")
+
+
+@db_cli.command("migrate-conversations")
+def migrate_conversations_command():
+    """Move embedded AI chat messages into the ai_messages collection."""
+    migrated = migrate_all_conversations()
+    click.echo(f"Migrated {migrated} conversation(s) to ai_messages.")
+
+
+@db_cli.command("migrate-health-metrics")
+def migrate_health_metrics_command():
+    """Backfill the health_metrics time series from health_records."""
+    migrated = migrate_health_records()
+    click.echo(f"Wrote {migrated} health metric document(s).")
+
+
+@db_cli.command("rebuild-health-snapshots")
+def rebuild_health_snapshots_command():
+    """Recompute every user's latest health snapshot from health_records."""
+    rebuilt = rebuild_snapshots()
+    click.echo(f"Rebuilt {rebuilt} health snapshot(s).")
+
+
+@db_cli.command("rebuild-rollups")
+def rebuild_rollups_command():
+    """Backfill daily analytics rollups and recompute per-user prediction counts."""
+    # Per-user counts written while this runs may be overwritten; run it at a quiet time
+    days = rebuild_rollups()
+    click.echo(f"Rebuilt rollups for {days} day(s).")
+
+
+@db_cli.command("backfill-token-expiry")
+def backfill_token_expiry_command():
+    """Date blacklist entries that predate "expires" so the TTL index can remove them."""
+    updated = backfill_blacklist_expiry(current_app.config["JWT_ACCESS_TOKEN_EXPIRES"])
+    click.echo(f"Set expiry on {updated} blacklist entr{'y' if updated == 1 else 'ies'}.")
+
+
+@jobs_cli.command("work")
+@click.option("--workers", default=4, show_default=True, help="Worker threads.")
+def jobs_work_command(workers):
+    """Run a dedicated background job worker until interrupted."""
+    requeued = requeue_expired_leases()
+    if requeued:
+        click.echo(f"Requeued {requeued} job(s) with expired leases.")
+    pool = JobWorkerPool(size=workers)
+    pool.start()
+    click.echo(f"Job worker running with {workers} thread(s). Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        click.echo("Stopping job worker...")
+        pool.stop(timeout=30)
+
+
+@model_cli.command("register")
+@click.argument("version")
+@click.argument("path")
+@click.option("--description", default="", help="What changed in this version.")
+@click.option("--validate", is_flag=True, help="Load the file and run a test prediction first.")
+def model_register_command(version, path, description, validate):
+    """Register a model file as a new version (relative paths resolve against backend/)."""
+    if validate:
+        candidate = LazyModel(resolve_model_path(path), MODEL_MMAP_MODE)
+        candidate.preload(warm_up=True)
+        click.echo(f"Loaded in {candidate.stats['load_ms']} ms, warm-up {candidate.stats['warm_up_ms']} ms.")
+    try:
+        register_version(version, path, description)
+    except FileNotFoundError as e:
+        raise click.ClickException(f"Model file not found: {e}")
+    except DuplicateKeyError:
+        raise click.ClickException(f"Model version {version} already exists")
+    click.echo(f"Registered model version {version}.")
+
+
+@model_cli.command("activate")
+@click.argument("version")
+def model_activate_command(version):
+    """Serve VERSION; running workers swap to it within one poll interval."""
+    try:
+        activate_version(version)
+    except LookupError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Activated model version {version}.")
+
+
+@model_cli.command("shadow")
+@click.argument("version", required=False)
+@click.option("--rate", type=click.FloatRange(0, 1), default=0.05, show_default=True,
+              help="Fraction of live predictions also scored by VERSION.")
+@click.option("--off", is_flag=True, help="Stop shadow evaluation.")
+def model_shadow_command(version, rate, off):
+    """Shadow-score a candidate version on a sample of live traffic."""
+    if off:
+        set_shadow(None, 0)
+        click.echo("Shadow evaluation stopped.")
+        return
+    if not version:
+        raise click.UsageError("Give a VERSION or --off.")
+    try:
+        set_shadow(version, rate)
+    except LookupError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Shadowing model version {version} on {rate:.0%} of predictions.")
+
+
+@model_cli.command("list")
+def model_list_command():
+    """List registered versions with their shadow agreement."""
+    pointer, versions = list_versions()
+    for version in versions:
+        marks = []
+        if version["_id"] == pointer.get("active"):
+            marks.append("active")
+        if version["_id"] == pointer.get("shadow"):
+            marks.append(f"shadow {pointer.get('shadow_rate', 0):.0%}")
+        shadow = version.get("shadow") or {}
+        scored = shadow.get("samples", 0) - shadow.get("errors", 0)
+        agreement = f"{shadow.get('agreements', 0) / scored:.1%} agree over {scored}" if scored else "no shadow samples"
+        label = f" [{', '.join(marks)}]" if marks else ""
+        click.echo(f"{version['_id']}{label}  {version['path']}  {agreement}  {version.get('description', '')}")
+    if not pointer.get("active"):
+        click.echo("No active version set; workers serve MODEL_PATH.")
+
+
+def bootstrap_indexes():
+    """
+    Runs ensure_indexes() at app start on a short-lived client, so the
+    shared pool isn't opened before a pre-forking server forks its workers.
+    Failures are logged rather than raised so the API can still start.
+    """
+    client = db.create_client(event_listeners=[])
+    try:
+        ensure_indexes(db.get_db(client))
+    except Exception as e:
+        print(f"Index bootstrap failed: {e}")
+    finally:
+        client.close()
+
+
+def register_cli(app):
+    app.cli.add_command(db_cli)
+    app.cli.add_command(jobs_cli)
+    app.cli.add_command(model_cli)
@@ -0,0 +1,68 @@
+# scripts/bench_ai_stream.py
+"""
+Compares time-to-first-token and total latency of the blocking and the
+streaming Ask-AI endpoints. Run the API against scripts/fake_gemini.py (or
+the real API) and pass a JWT for an existing user:
+
+    python scripts/bench_ai_stream.py --token <JWT> --runs 20
+"""
+import argparse
+import statistics
+import time
+
+import requests
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(name, samples):
+    print(
+        f"{name:<28} n={len(samples):<4} "
+        f"p50={statistics.median(samples) * 1000:8.1f} ms  "
+        f"p95={percentile(samples, 95) * 1000:8.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:5000/api/ai")
+    parser.add_argument("--token", required=True)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--prompt", default="What are the common symptoms of diabetes?")
+    options = parser.parse_args()
+
+    session = requests.Session()
+    session.headers["Authorization"] = f"Bearer {options.token}"
+    conversation = session.post(f"{options.base_url}/conversations", json={"title": "bench"}).json()
+    conversation_url = f"{options.base_url}/conversations/{conversation['conversation_id']}"
+
+    blocking, stream_first, stream_total = [], [], []
+    try:
+        for _ in range(options.runs):
+            started = time.perf_counter()
+            session.post(f"{conversation_url}/messages", json={"text": options.prompt}).raise_for_status()
+            blocking.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            first = None
+            with session.post(f"{conversation_url}/messages/stream", json={"text": options.prompt}, stream=True) as response:
+                response.raise_for_status()
+                for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                    if first is None and line.startswith("event: delta"):
+                        first = time.perf_counter() - started
+            stream_total.append(time.perf_counter() - started)
+            stream_first.append(first if first is not None else stream_total[-1])
+    finally:
+        session.delete(conversation_url)
+
+    summarize("blocking (first = total)", blocking)
+    summarize("stream time-to-first-token", stream_first)
+    summarize("stream total", stream_total)
+
+
+if __name__ == "__main__":
+    main()
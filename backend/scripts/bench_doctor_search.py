@@ -0,0 +1,73 @@
+# scripts/bench_doctor_search.py
+"""
+Query latency of utils/doctor_search.py on synthetic doctors, replaying
+every keystroke of a few typical searches (including a typo):
+
+    python scripts/bench_doctor_search.py --doctors 100000 --repeat 20
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+from bson.objectid import ObjectId
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils.doctor_search import DoctorSearchIndex  # noqa: E402
+
+FIRST_NAMES = ["Asha", "Rohit", "Emily", "John", "Sarah", "Michael", "Jessica", "David", "Anya", "Ben",
+               "Priya", "Vikram", "Neha", "Arjun", "Kavya", "Rahul", "Meera", "Sanjay", "Pooja", "Karan"]
+LAST_NAMES = ["Mehta", "Sharma", "Smith", "Davis", "Lee", "Brown", "White", "Green", "Carter", "Iyer",
+              "Patel", "Reddy", "Kapoor", "Nair", "Gupta", "Singh", "Rao", "Joshi", "Das", "Bose"]
+SPECIALTIES = ["Cardiology", "Dermatology", "Pediatrics", "Neurology", "Orthopedics", "Ophthalmology",
+               "Psychiatry", "Oncology", "Gastroenterology", "Endocrinology", "Urology", "Nephrology"]
+HOSPITALS = ["Apollo Hospitals", "Fortis Hospital", "Max Healthcare", "Manipal Hospital", "AIIMS",
+             "Medanta", "Narayana Health", "Kokilaben Hospital", "Skin Care Clinic", "City Clinic"]
+CITIES = ["Delhi", "Mumbai", "Bengaluru", "Chennai", "Kolkata", "Hyderabad", "Pune", "Jaipur"]
+QUERIES = ["cardiology", "sharma", "apollo delhi", "priya pediatrics", "cardiolgy"]
+
+
+def synthetic_doctors(count, rng):
+    for i in range(count):
+        yield {
+            "_id": ObjectId(),
+            "name": f"Dr. {rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}{'' if i % 7 else f' {i}'}",
+            "specialty": rng.choice(SPECIALTIES),
+            "hospital": f"{rng.choice(HOSPITALS)}, {rng.choice(CITIES)}",
+            "rating": round(rng.uniform(3, 5), 1),
+            "experience": rng.randint(1, 40),
+            "consultation_fee": rng.randint(5, 50) * 10,
+        }
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--doctors", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=20, help="times each keystroke is replayed")
+    parser.add_argument("--limit", type=int, default=20, help="page size")
+    options = parser.parse_args()
+
+    started = time.perf_counter()
+    index = DoctorSearchIndex(synthetic_doctors(options.doctors, random.Random(0)))
+    print(f"Indexed {len(index)} doctors ({len(index.tokens)} tokens) in {time.perf_counter() - started:.2f} s")
+
+    print(f"{'query':<20} {'matches':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for query in QUERIES:
+        latencies = []
+        for _ in range(options.repeat):
+            for end in range(1, len(query) + 1):
+                began = time.perf_counter()
+                total, _ = index.search(query[:end], limit=options.limit)
+                latencies.append((time.perf_counter() - began) * 1000)
+        print(f"{query:<20} {total:>8} {percentile(latencies, 50):8.2f} {percentile(latencies, 99):8.2f} {max(latencies):8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# scripts/bench_inference.py
+"""
+Throughput vs. tail latency of single predictions, called directly and
+through utils/inference_scheduler.py with different batching windows.
+
+Uses the real model when MODEL_PATH (or backend/models/final_model.pkl)
+exists, otherwise a synthetic model whose cost is a fixed per-call overhead
+plus a small per-row cost, which is the shape that makes batching pay off:
+
+    python scripts/bench_inference.py --clients 32 --requests 200 --windows 0,1,2,5,10
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils.inference_scheduler import InferenceScheduler  # noqa: E402
+from utils.model_loader import model  # noqa: E402
+
+
+def synthetic_predict(call_overhead_ms, row_cost_us):
+    lock = threading.Lock()  # a model call holds the GIL; serialize like one
+
+    def predict(rows):
+        rows = np.asarray(rows)
+        with lock:
+            time.sleep(call_overhead_ms / 1000 + row_cost_us * len(rows) / 1e6)
+        return ["flu"] * len(rows), np.full(len(rows), 90.0), "synthetic"
+    return predict
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run(call, options):
+    latencies = []
+    lock = threading.Lock()
+    rng = np.random.default_rng(0)
+    rows = rng.integers(0, 2, size=(options.requests, options.n_features)).astype(np.float32)
+
+    def client():
+        local = []
+        for row in rows:
+            started = time.perf_counter()
+            call(row)
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client) for _ in range(options.clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return len(latencies) / elapsed, percentile(latencies, 50) * 1000, percentile(latencies, 99) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=32, help="concurrent callers")
+    parser.add_argument("--requests", type=int, default=200, help="predictions per caller")
+    parser.add_argument("--windows", default="0,1,2,5,10", help="max_wait_ms values to try")
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--call-overhead-ms", type=float, default=1.0, help="synthetic model only")
+    parser.add_argument("--row-cost-us", type=float, default=5.0, help="synthetic model only")
+    options = parser.parse_args()
+
+    options.n_features = 4
+    if os.path.exists(model.path):
+        model.preload()
+        options.n_features = getattr(model.get(), "n_features_in_", options.n_features)
+        def predict_fn(rows):
+            return (*model.predict(rows), "default")
+        print(f"Model: {model.path}")
+    else:
+        predict_fn = synthetic_predict(options.call_overhead_ms, options.row_cost_us)
+        print(f"Model: synthetic ({options.call_overhead_ms} ms/call + {options.row_cost_us} us/row)")
+
+    print(f"{'mode':<22} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    throughput, p50, p99 = run(lambda row: predict_fn([row]), options)
+    print(f"{'direct':<22} {throughput:9.0f} {p50:9.2f} {p99:9.2f}")
+
+    for window in (float(w) for w in options.windows.split(",")):
+        scheduler = InferenceScheduler(predict_fn, max_batch_size=options.max_batch_size, max_wait_ms=window)
+        throughput, p50, p99 = run(scheduler.predict, options)
+        avg_batch = scheduler.snapshot()["avg_batch_size"]
+        print(f"{f'batched {window:g} ms':<22} {throughput:9.0f} {p50:9.2f} {p99:9.2f}   avg batch {avg_batch}")
+
+
+if __name__ == "__main__":
+    main()
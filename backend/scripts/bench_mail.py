@@ -0,0 +1,83 @@
+# scripts/bench_mail.py
+"""
+Compares sending OTP-sized mails with a new SMTP connection per message
+(the old send_email) against utils/mailer.py's pooled dispatcher. Start
+scripts/smtp_sink.py first, ideally with a --handshake-delay to model TLS
+and login cost:
+
+    python scripts/smtp_sink.py --port 8025 --handshake-delay 0.1
+    python scripts/bench_mail.py --port 8025 --messages 200
+"""
+import argparse
+import os
+import smtplib
+import sys
+import threading
+import time
+from email.message import EmailMessage
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils.mailer import MailDispatcher  # noqa: E402
+
+
+def build_message(i):
+    message = EmailMessage()
+    message["From"] = "bench@example.com"
+    message["To"] = f"user{i}@example.com"
+    message["Subject"] = "HealthSync Email Verification"
+    message.set_content("Your OTP is: 123456")
+    return message
+
+
+def per_message_connections(options):
+    for i in range(options.messages):
+        with smtplib.SMTP(options.host, options.port, timeout=10) as server:
+            server.login("bench", "bench")
+            server.send_message(build_message(i))
+
+
+def pooled_dispatcher(options):
+    dispatcher = MailDispatcher(
+        options.host, options.port, username="bench", password="bench", sender="bench@example.com",
+        starttls=False, pool_size=options.pool_size, batch_size=options.batch_size
+    )
+    failures = []
+    lock = threading.Lock()
+
+    def on_result(mail_id, status, error):
+        if status != "sent":
+            with lock:
+                failures.append(error)
+
+    for i in range(options.messages):
+        dispatcher.submit(f"user{i}@example.com", "HealthSync Email Verification", "Your OTP is: 123456", on_result)
+    dispatcher.join()
+    return dispatcher.snapshot(), failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--messages", type=int, default=100)
+    parser.add_argument("--pool-size", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=20)
+    options = parser.parse_args()
+
+    started = time.perf_counter()
+    per_message_connections(options)
+    elapsed = time.perf_counter() - started
+    print(f"{'connection per message':<24} {options.messages / elapsed:8.1f} msg/s  ({elapsed:.2f} s)")
+
+    started = time.perf_counter()
+    stats, failures = pooled_dispatcher(options)
+    elapsed = time.perf_counter() - started
+    print(
+        f"{'pooled dispatcher':<24} {options.messages / elapsed:8.1f} msg/s  ({elapsed:.2f} s, "
+        f"{stats['connections_opened']} connection(s), {stats['batches']} batch(es), {len(failures)} failed)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# scripts/fake_gemini.py
+"""
+Local stand-in for the Gemini generateContent API, for offline testing and
+benchmarking of the Ask-AI endpoints.
+
+    python scripts/fake_gemini.py --port 8099 --chunks 20 --chunk-delay 0.05
+    GEMINI_API_BASE=http://127.0.0.1:8099/v1beta flask run
+
+Serves:
+    POST /v1beta/models/<model>:generateContent          one JSON reply
+    POST /v1beta/models/<model>:streamGenerateContent    SSE (?alt=sse) or JSON array
+
+Each reply is a canned sentence that echoes the last user message, split
+into --chunks pieces. --first-token-delay and --chunk-delay simulate model
+latency; --fail-rate makes a fraction of calls answer with --fail-status,
+to exercise retries and the circuit breaker.
+"""
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+def build_reply(contents, chunks):
+    last_text = ""
+    for content in reversed(contents):
+        if content.get("role") == "user":
+            last_text = " ".join(part.get("text", "") for part in content.get("parts", []))
+            break
+    words = (
+        f"This is a simulated health assistant reply to: {last_text.strip()[:200]}. "
+        "Please consult a qualified doctor for medical advice."
+    ).split(" ")
+    size = max(1, len(words) // max(1, chunks))
+    return [" ".join(words[i:i + size]) + " " for i in range(0, len(words), size)]
+
+
+def candidate(text, finished=False):
+    item = {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+    if finished:
+        item["finishReason"] = "STOP"
+    return item
+
+
+def usage(contents, reply):
+    prompt_chars = sum(len(part.get("text", "")) for c in contents for part in c.get("parts", []))
+    prompt_tokens = max(1, prompt_chars // 4)
+    reply_tokens = max(1, len(reply) // 4)
+    return {
+        "promptTokenCount": prompt_tokens,
+        "candidatesTokenCount": reply_tokens,
+        "totalTokenCount": prompt_tokens + reply_tokens,
+    }
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    options = None
+
+    def log_message(self, format, *args):
+        if self.options.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._send_json(400, {"error": {"code": 400, "message": "Invalid JSON"}})
+
+        if random.random() < self.options.fail_rate:
+            status = self.options.fail_status
+            return self._send_json(status, {"error": {"code": status, "message": "Simulated failure"}})
+
+        contents = payload.get("contents", [])
+        pieces = build_reply(contents, self.options.chunks)
+        reply = "".join(pieces)
+        time.sleep(self.options.first_token_delay)
+
+        if url.path.endswith(":generateContent"):
+            time.sleep(self.options.chunk_delay * (len(pieces) - 1))
+            return self._send_json(200, {
+                "candidates": [candidate(reply, finished=True)],
+                "usageMetadata": usage(contents, reply),
+            })
+
+        if not url.path.endswith(":streamGenerateContent"):
+            return self._send_json(404, {"error": {"code": 404, "message": "Unknown method"}})
+
+        events = [
+            {"candidates": [candidate(piece, finished=i == len(pieces) - 1)]}
+            for i, piece in enumerate(pieces)
+        ]
+        events[-1]["usageMetadata"] = usage(contents, reply)
+
+        if parse_qs(url.query).get("alt") != ["sse"]:
+            time.sleep(self.options.chunk_delay * (len(pieces) - 1))
+            return self._send_json(200, events)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        try:
+            for i, event in enumerate(events):
+                if i:
+                    time.sleep(self.options.chunk_delay)
+                self.wfile.write(f"data: {json.dumps(event)}\r\n\r\n".encode("utf-8"))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client went away mid-stream
+        self.close_connection = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--chunks", type=int, default=12, help="pieces per streamed reply")
+    parser.add_argument("--first-token-delay", type=float, default=0.3, help="seconds before the first chunk")
+    parser.add_argument("--chunk-delay", type=float, default=0.08, help="seconds between chunks")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of calls that fail")
+    parser.add_argument("--fail-status", type=int, default=503)
+    parser.add_argument("--verbose", action="store_true")
+    options = parser.parse_args()
+
+    FakeGeminiHandler.options = options
+    server = ThreadingHTTPServer((options.host, options.port), FakeGeminiHandler)
+    print(f"Fake Gemini listening on http://{options.host}:{options.port}/v1beta")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# scripts/smtp_sink.py
+"""
+Local SMTP relay that accepts and discards every message, for testing the
+OTP flow and benchmarking utils/mailer.py without a real mail server.
+
+    python scripts/smtp_sink.py --port 8025 --handshake-delay 0.2
+    EMAIL_HOST=127.0.0.1 EMAIL_PORT=8025 EMAIL_STARTTLS=false flask run
+
+Speaks just enough SMTP for smtplib: EHLO/HELO, AUTH PLAIN/LOGIN (any
+credentials), MAIL, RCPT, DATA, RSET, NOOP and QUIT. No STARTTLS.
+--handshake-delay simulates the TCP + TLS + login cost of a new connection,
+--message-delay the per-message cost, and --drop-rate makes the sink hang up
+on a fraction of messages to exercise reconnects.
+"""
+import argparse
+import random
+import socketserver
+import threading
+import time
+
+stats = {"connections": 0, "messages": 0, "dropped": 0}
+stats_lock = threading.Lock()
+
+
+def count(name):
+    with stats_lock:
+        stats[name] += 1
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    options = None
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode("ascii"))
+
+    def readline(self):
+        line = self.rfile.readline()
+        if not line:
+            raise ConnectionError("client closed the connection")
+        return line.decode("utf-8", "replace").rstrip("\r\n")
+
+    def handle(self):
+        count("connections")
+        time.sleep(self.options.handshake_delay)
+        self.reply("220 localhost smtp-sink ready")
+        try:
+            while True:
+                line = self.readline()
+                command = line[:4].upper()
+                if command == "EHLO":
+                    self.reply("250-localhost")
+                    self.reply("250-AUTH PLAIN LOGIN")
+                    self.reply("250 8BITMIME")
+                elif command == "HELO":
+                    self.reply("250 localhost")
+                elif command == "AUTH":
+                    self.authenticate(line.split())
+                elif command in ("MAIL", "RCPT", "RSET", "NOOP"):
+                    self.reply("250 OK")
+                elif command == "DATA":
+                    self.reply("354 End data with <CR><LF>.<CR><LF>")
+                    while self.readline() != ".":
+                        pass
+                    time.sleep(self.options.message_delay)
+                    if random.random() < self.options.drop_rate:
+                        count("dropped")
+                        return
+                    count("messages")
+                    self.reply("250 OK queued")
+                elif command == "QUIT":
+                    self.reply("221 Bye")
+                    return
+                else:
+                    self.reply("502 Command not implemented")
+        except (ConnectionError, OSError):
+            pass
+
+    def authenticate(self, parts):
+        mechanism = parts[1].upper() if len(parts) > 1 else ""
+        if mechanism == "PLAIN" and len(parts) < 3:
+            self.reply("334 ")
+            self.readline()
+        elif mechanism == "LOGIN":
+            if len(parts) < 3:
+                self.reply("334 VXNlcm5hbWU6")
+                self.readline()
+            self.reply("334 UGFzc3dvcmQ6")
+            self.readline()
+        elif mechanism != "PLAIN":
+            self.reply("504 Unrecognized authentication type")
+            return
+        self.reply("235 Authentication successful")
+
+
+class ThreadingSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--handshake-delay", type=float, default=0.0, help="seconds before the greeting")
+    parser.add_argument("--message-delay", type=float, default=0.0, help="seconds to accept each message")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="fraction of messages that drop the connection")
+    options = parser.parse_args()
+
+    SMTPSinkHandler.options = options
+    server = ThreadingSMTPServer((options.host, options.port), SMTPSinkHandler)
+    print(f"SMTP sink listening on {options.host}:{options.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"connections={stats['connections']} messages={stats['messages']} dropped={stats['dropped']}")
+
+
+if __name__ == "__main__":
+    main()
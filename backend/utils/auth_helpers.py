@@ -1,14 +1,51 @@
-from pymongo import MongoClient
-from bson.objectid import ObjectId
 import os
-from dotenv import load_dotenv
+from bson.objectid import ObjectId
+from flask import g, has_request_context
+from flask_jwt_extended import get_jwt_identity
+from utils import db
+from utils.cache import TTLCache
+
+users_collection = db.users()
+
+# Everything but the password hash
+USER_PROJECTION = {"password": 0}
+
+# Roles change rarely (only via /api/admin/promote), so they are cached per
+# process. Promotions made by this worker invalidate immediately; other
+# workers pick them up within ROLE_CACHE_TTL_SECONDS.
+_role_cache = TTLCache(
+    maxsize=int(os.getenv("ROLE_CACHE_SIZE", 4096)),
+    ttl=float(os.getenv("ROLE_CACHE_TTL_SECONDS", 60)),
+)
+_MISSING = object()
 
-load_dotenv()
 
-client = MongoClient(os.getenv("MONGO_URI"))
-db = client["healthsync"]
-users_collection = db["users"]
+def load_current_user():
+    """
+    Returns the logged-in user's document (without the password), querying
+    MongoDB at most once per request. The result is kept on flask.g.
+    """
+    if "current_user" not in g:
+        user_id = get_jwt_identity()
+        user = users_collection.find_one({"_id": ObjectId(user_id)}, USER_PROJECTION)
+        g.current_user = user
+        _role_cache.set(user_id, user.get("role") if user else None)
+    return g.current_user
+
 
 def get_user_role(user_id):
-    user = users_collection.find_one({"_id": ObjectId(user_id)})
-    return user.get("role") if user else None
+    role = _role_cache.get(user_id, _MISSING)
+    if role is not _MISSING:
+        return role
+
+    if has_request_context() and g.get("current_user") and str(g.current_user["_id"]) == user_id:
+        role = g.current_user.get("role")
+    else:
+        user = users_collection.find_one({"_id": ObjectId(user_id)}, {"role": 1})
+        role = user.get("role") if user else None
+    _role_cache.set(user_id, role)
+    return role
+
+
+def invalidate_user_role(user_id):
+    _role_cache.delete(str(user_id))
@@ -0,0 +1,127 @@
+# utils/cache.py
+"""
+Small thread-safe in-process caches shared by the API helpers.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Bounded LRU cache whose entries also expire after a time-to-live.
+
+    maxsize caps the number of entries; the least recently used entry is
+    evicted first. ttl is the default lifetime in seconds and can be
+    overridden per entry in set(). With maxbytes, sizeof(value) is charged
+    per entry and LRU entries are evicted until the total fits as well.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60.0, clock=time.monotonic, maxbytes=None, sizeof=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self._sizeof = sizeof
+        self._clock = clock
+        self._data = OrderedDict()  # key -> (expires_at, value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _pop(self, key):
+        item = self._data.pop(key, None)
+        if item is not None:
+            self._bytes -= item[2]
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+            expires_at, value, _ = item
+            if expires_at <= self._clock():
+                self._pop(key)
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        size = self._sizeof(value) if self._sizeof else 0
+        if self.maxbytes is not None and size > self.maxbytes:
+            return
+        with self._lock:
+            self._pop(key)
+            self._data[key] = (self._clock() + ttl, value, size)
+            self._bytes += size
+            while len(self._data) > self.maxsize or (self.maxbytes is not None and self._bytes > self.maxbytes):
+                self._pop(next(iter(self._data)))
+
+    def delete(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    @property
+    def bytes(self):
+        return self._bytes
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key: the first caller runs fn,
+    the others wait for and share its result (or exception).
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """
+        Returns (result, shared) where shared is True for callers that waited
+        on another caller's execution.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
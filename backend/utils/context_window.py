@@ -0,0 +1,173 @@
+# utils/context_window.py
+"""
+Token-budgeted context for Ask-AI turns.
+
+Each turn sends Gemini the newest messages verbatim, as many as fit in
+AI_CONTEXT_TOKEN_BUDGET (and at most AI_CONTEXT_MESSAGES), plus a rolling
+summary of everything older as the system instruction. The summary is stored
+on the conversation:
+
+    "summary": {"text": "...", "through_seq": 118, "updated_at": ...}
+
+and only messages with seq > through_seq are ever read back. When those no
+longer fit, the oldest ones are folded into the summary with one extra
+Gemini call and the verbatim window is cut to AI_CONTEXT_KEEP_RATIO of the
+budget, so a fold happens every several turns rather than on every turn and
+the payload stays flat however long the chat gets.
+
+Token counts are estimated (about 4 characters per token); the budget is a
+cost/latency bound, not the model's hard limit.
+"""
+import datetime
+import os
+
+import requests
+
+from utils import conversation_store, db
+from utils.llm_client import LLMError, extract_text, gemini_client
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("AI_CONTEXT_TOKEN_BUDGET", 6000))
+CONTEXT_MESSAGES = int(os.getenv("AI_CONTEXT_MESSAGES", 40))
+KEEP_RATIO = float(os.getenv("AI_CONTEXT_KEEP_RATIO", 0.5))
+SUMMARY_MAX_TOKENS = int(os.getenv("AI_SUMMARY_MAX_TOKENS", 400))
+# Upper bound on messages folded in one summary call (e.g. a long legacy chat)
+FOLD_MAX_MESSAGES = 200
+# Summary calls per turn; a longer backlog is folded over the following turns
+FOLD_MAX_BATCHES = 3
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and a health assistant. "
+    "Update the summary with the new messages below. Keep what the assistant will need later "
+    "(symptoms, conditions, medications, measurements, the user's questions and goals) and "
+    "stay under {words} words. Reply with the summary only.\n\n"
+    "Current summary:\n{summary}\n\n"
+    "New messages:\n{transcript}"
+)
+
+ai_conversations_collection = db.ai_conversations()
+
+
+def estimate_tokens(text):
+    return len(text) // 4 + 4
+
+
+def _fit(messages, budget):
+    """
+    Returns the longest suffix of messages within the token budget, starting
+    with a user message so the window opens on a full turn.
+    """
+    used = 0
+    start = len(messages)
+    for i in range(len(messages) - 1, -1, -1):
+        used += estimate_tokens(messages[i]["text"])
+        if used > budget:
+            break
+        start = i
+    while start < len(messages) and messages[start]["role"] != "user":
+        start += 1
+    return messages[start:]
+
+
+def _fold_batch(conversation, summary, before_seq):
+    """
+    Folds the oldest FOLD_MAX_MESSAGES messages between the current summary
+    and before_seq into the summary. Returns the new summary, or None if
+    there was nothing to fold or Gemini couldn't produce one.
+    """
+    messages = conversation_store.oldest_messages(
+        conversation["_id"], FOLD_MAX_MESSAGES, after_seq=summary.get("through_seq", 0), before_seq=before_seq
+    )
+    if not messages:
+        return None
+
+    transcript = "\n".join(
+        f"{'User' if msg['role'] == 'user' else 'Assistant'}: {msg['text']}" for msg in messages
+    )
+    prompt = SUMMARY_PROMPT.format(
+        words=int(SUMMARY_MAX_TOKENS * 0.75),
+        summary=summary.get("text") or "(none yet)",
+        transcript=transcript
+    )
+    try:
+        result = gemini_client.generate(
+            [{"role": "user", "parts": [{"text": prompt}]}],
+            generationConfig={"maxOutputTokens": SUMMARY_MAX_TOKENS}
+        )
+    except (requests.exceptions.RequestException, LLMError) as e:
+        print(f"Error summarizing conversation {conversation['_id']}: {e}")
+        return None
+    text = extract_text(result).strip()
+    if not text:
+        return None
+
+    new_summary = {
+        "text": text,
+        "through_seq": messages[-1]["seq"],
+        "updated_at": datetime.datetime.utcnow()
+    }
+    # A concurrent turn may already have folded further; never move the summary backwards
+    ai_conversations_collection.update_one(
+        {
+            "_id": conversation["_id"],
+            "$or": [
+                {"summary.through_seq": {"$lt": new_summary["through_seq"]}},
+                {"summary": {"$exists": False}}
+            ]
+        },
+        {"$set": {"summary": new_summary}}
+    )
+    conversation["summary"] = new_summary
+    return new_summary
+
+
+def _fold(conversation, summary, before_seq):
+    """
+    Folds messages between the current summary and before_seq into the
+    summary, oldest first, in up to FOLD_MAX_BATCHES calls. Returns the new
+    summary, or None if nothing was folded (the turn goes ahead with the old
+    summary). Whatever is left over (a long legacy chat) is folded on later
+    turns, which see the gap and fold again.
+    """
+    folded = None
+    for _ in range(FOLD_MAX_BATCHES):
+        new_summary = _fold_batch(conversation, folded or summary, before_seq)
+        if new_summary is None:
+            break
+        folded = new_summary
+        if new_summary["through_seq"] >= before_seq - 1:
+            break
+    return folded
+
+
+def build_context(conversation, user_message):
+    """
+    Returns (contents, options) for gemini_client.generate / stream_generate:
+    the verbatim recent turns plus user_message, and the rolling summary as
+    a systemInstruction when there is one.
+    """
+    summary = conversation.get("summary") or {}
+    through_seq = summary.get("through_seq", 0)
+    window = conversation_store.recent_messages(conversation["_id"], CONTEXT_MESSAGES, after_seq=through_seq)
+
+    budget = (
+        CONTEXT_TOKEN_BUDGET
+        - estimate_tokens(user_message["text"])
+        - estimate_tokens(summary.get("text", ""))
+    )
+    overflowed = window and window[0]["seq"] > through_seq + 1
+    if overflowed or sum(estimate_tokens(msg["text"]) for msg in window) > budget:
+        kept = _fit(window, budget * KEEP_RATIO)
+        before_seq = kept[0]["seq"] if kept else window[-1]["seq"] + 1
+        summary = _fold(conversation, summary, before_seq) or summary
+        window = kept
+
+    contents = [
+        {"role": msg["role"], "parts": [{"text": msg["text"]}]}
+        for msg in window + [user_message]
+    ]
+    options = {}
+    if summary.get("text"):
+        options["systemInstruction"] = {
+            "parts": [{"text": f"Summary of the earlier conversation:\n{summary['text']}"}]
+        }
+    return contents, options
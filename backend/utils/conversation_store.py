@@ -0,0 +1,168 @@
+# utils/conversation_store.py
+"""
+Append-only message storage for AI conversations.
+
+Messages live in the ai_messages collection, one document per message,
+keyed by (conversation_id, seq). Sequence numbers are reserved with an
+atomic $inc on the conversation's message_count, so each turn costs one
+small update plus one insert regardless of conversation length, and two
+concurrent sends on the same conversation can't overwrite each other.
+
+Conversations created before this layout kept an embedded "messages"
+array; migrate_embedded_messages() moves it over and is safe to run
+concurrently or repeatedly.
+"""
+import datetime
+
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+
+from utils import db
+from utils.pagination import paginate
+from utils.rollups import increment
+
+ai_conversations_collection = db.ai_conversations()
+ai_messages_collection = db.ai_messages()
+
+DUPLICATE_KEY = 11000
+
+
+def _insert_ignoring_duplicates(documents):
+    try:
+        ai_messages_collection.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        if any(error["code"] != DUPLICATE_KEY for error in e.details.get("writeErrors", [])):
+            raise
+
+
+def migrate_embedded_messages(conversation_id):
+    """
+    Moves a legacy embedded "messages" array into ai_messages. Returns the
+    conversation's message_count afterwards.
+    """
+    legacy = ai_conversations_collection.find_one({"_id": conversation_id}, {"messages": 1, "message_count": 1})
+    if legacy is None:
+        return 0
+    if "messages" not in legacy:
+        return legacy.get("message_count", 0)
+
+    messages = legacy["messages"]
+    if messages:
+        _insert_ignoring_duplicates([
+            {
+                "conversation_id": conversation_id,
+                "seq": seq,
+                "role": message["role"],
+                "text": message["text"],
+                "timestamp": message.get("timestamp"),
+            }
+            for seq, message in enumerate(messages, start=1)
+        ])
+    updated = ai_conversations_collection.find_one_and_update(
+        {"_id": conversation_id},
+        {"$unset": {"messages": ""}, "$max": {"message_count": len(messages)}},
+        projection={"message_count": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    return updated["message_count"] if updated else 0
+
+
+def migrate_all_conversations():
+    migrated = 0
+    for conversation in ai_conversations_collection.find({"messages": {"$exists": True}}, {"_id": 1}):
+        migrate_embedded_messages(conversation["_id"])
+        migrated += 1
+    return migrated
+
+
+def append_messages(conversation_id, messages):
+    """
+    Appends messages (dicts with role, text, timestamp and optional flags) to a
+    conversation as one contiguous run of sequence numbers. Returns the stored
+    documents.
+
+    Messages carrying a job_id are unique per (job_id, role). If a rerun of
+    the same job gets here second, its insert fails with BulkWriteError and
+    it should read back job_messages() instead.
+    """
+    conversation = ai_conversations_collection.find_one_and_update(
+        {"_id": conversation_id},
+        {"$inc": {"message_count": len(messages)}, "$set": {"updated_at": datetime.datetime.utcnow()}},
+        projection={"message_count": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if conversation is None:
+        raise LookupError("Conversation not found")
+
+    first_seq = conversation["message_count"] - len(messages) + 1
+    documents = [
+        {
+            "timestamp": datetime.datetime.utcnow(),
+            **message,
+            "conversation_id": conversation_id,
+            "seq": first_seq + offset,
+        }
+        for offset, message in enumerate(messages)
+    ]
+    ai_messages_collection.insert_many(documents)
+    increment("ai_messages", len(documents))
+    return documents
+
+
+def job_messages(job_id):
+    """
+    Returns the messages a background job already stored, oldest first (empty
+    if it hasn't stored any).
+    """
+    return list(ai_messages_collection.find({"job_id": job_id}).sort("seq", 1))
+
+
+def recent_messages(conversation_id, limit, after_seq=0, before_seq=None):
+    """
+    Returns the last `limit` messages of a conversation with
+    after_seq < seq < before_seq, oldest first.
+    """
+    seq_range = {"$gt": after_seq}
+    if before_seq is not None:
+        seq_range["$lt"] = before_seq
+    cursor = ai_messages_collection.find(
+        {"conversation_id": conversation_id, "seq": seq_range},
+        {"_id": 0, "role": 1, "text": 1, "timestamp": 1, "seq": 1}
+    ).sort("seq", -1).limit(limit)
+    return list(cursor)[::-1]
+
+
+def oldest_messages(conversation_id, limit, after_seq=0, before_seq=None):
+    """
+    Returns the first `limit` messages of a conversation with
+    after_seq < seq < before_seq, oldest first.
+    """
+    seq_range = {"$gt": after_seq}
+    if before_seq is not None:
+        seq_range["$lt"] = before_seq
+    cursor = ai_messages_collection.find(
+        {"conversation_id": conversation_id, "seq": seq_range},
+        {"_id": 0, "role": 1, "text": 1, "timestamp": 1, "seq": 1}
+    ).sort("seq", 1).limit(limit)
+    return list(cursor)
+
+
+def page_messages(conversation_id, limit, cursor=None):
+    """
+    Returns (messages oldest first, next_cursor). The first page holds the
+    newest messages; next_cursor pages further back in time.
+    """
+    messages, next_cursor = paginate(
+        ai_messages_collection,
+        {"conversation_id": conversation_id},
+        [("seq", -1)],
+        projection={"_id": 0, "role": 1, "text": 1, "timestamp": 1, "seq": 1, "incomplete": 1},
+        limit=limit,
+        cursor=cursor,
+        unique_sort=True
+    )
+    return messages[::-1], next_cursor
+
+
+def delete_conversation_messages(conversation_id):
+    ai_messages_collection.delete_many({"conversation_id": conversation_id})
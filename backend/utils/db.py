@@ -0,0 +1,321 @@
+# utils/db.py
+"""
+Shared MongoDB data-access layer.
+
+Every blueprint and helper gets its collections from here so that each
+process owns exactly one MongoClient (and therefore one connection pool).
+The client is created with connect=False, so importing the app in a
+pre-forking server such as gunicorn opens no sockets until a worker
+issues its first query.
+
+Configuration (all optional except MONGO_URI):
+    MONGO_URI                          connection string
+    MONGO_DB_NAME                      database name (default "healthsync")
+    MONGO_MAX_POOL_SIZE                max sockets per server (default 50)
+    MONGO_MIN_POOL_SIZE                sockets kept warm (default 0)
+    MONGO_MAX_IDLE_TIME_MS             close idle sockets after this long
+    MONGO_CONNECT_TIMEOUT_MS           TCP connect timeout (default 5000)
+    MONGO_SOCKET_TIMEOUT_MS            per-operation socket timeout
+    MONGO_SERVER_SELECTION_TIMEOUT_MS  wait for a usable server (default 5000)
+    MONGO_WAIT_QUEUE_TIMEOUT_MS        wait for a free pooled socket
+    MONGO_WRITE_CONCERN                "w" value, e.g. "majority" or "1"
+    MONGO_WRITE_TIMEOUT_MS             wtimeout for the write concern
+    MONGO_READ_PREFERENCE              e.g. "primary", "secondaryPreferred"
+    MONGO_TLS_CA_FILE                  CA bundle (defaults to certifi's)
+"""
+import os
+import threading
+import time
+
+import certifi
+from dotenv import load_dotenv
+from pymongo import MongoClient, ReadPreference, monitoring
+from pymongo.collection import Collection
+from pymongo.database import Database
+from pymongo.write_concern import WriteConcern
+
+load_dotenv()
+
+# Collection names used across the API
+USERS = "users"
+HEALTH_RECORDS = "health_records"
+HEALTH_METRICS = "health_metrics"
+HEALTH_SNAPSHOTS = "health_snapshots"
+AI_CONVERSATIONS = "ai_conversations"
+AI_MESSAGES = "ai_messages"
+MEDICAL_REPORTS = "medical_reports"
+PREDICTIONS = "predictions"
+OTP = "otp"
+TOKEN_BLACKLIST = "token_blacklist"
+DOCTORS = "doctors"
+DOCTOR_CONSULTATIONS = "doctor_consultations"
+JOBS = "jobs"
+MODEL_VERSIONS = "model_versions"
+MODEL_REGISTRY = "model_registry"
+DAILY_ROLLUPS = "daily_rollups"
+
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primarypreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondarypreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def _int_env(name, default=None):
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return int(value)
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """
+    Collects connection pool counters from the driver's CMAP events so
+    worker counts and pool sizes can be tuned from real numbers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.pools_created = 0
+            self.pools_cleared = 0
+            self.connections_created = 0
+            self.connections_closed = 0
+            self.checked_out = 0
+            self.checkout_failed = 0
+            self.in_use = 0
+            self.max_in_use = 0
+            self.checkout_wait_total = 0.0
+            self.checkout_wait_max = 0.0
+            self._checkout_started = {}
+
+    def _bump(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def pool_created(self, event):
+        self._bump(pools_created=1)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._bump(pools_cleared=1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._bump(connections_created=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._bump(connections_closed=1)
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self._checkout_started[threading.get_ident()] = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self._checkout_started.pop(threading.get_ident(), None)
+            self.checkout_failed += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            started = self._checkout_started.pop(threading.get_ident(), None)
+            if started is not None:
+                waited = time.perf_counter() - started
+                self.checkout_wait_total += waited
+                self.checkout_wait_max = max(self.checkout_wait_max, waited)
+            self.checked_out += 1
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use = max(0, self.in_use - 1)
+
+    def snapshot(self):
+        with self._lock:
+            avg_wait = self.checkout_wait_total / self.checked_out if self.checked_out else 0.0
+            return {
+                "pools_created": self.pools_created,
+                "pools_cleared": self.pools_cleared,
+                "connections_created": self.connections_created,
+                "connections_closed": self.connections_closed,
+                "connections_open": self.connections_created - self.connections_closed,
+                "in_use": self.in_use,
+                "max_in_use": self.max_in_use,
+                "checkouts": self.checked_out,
+                "checkout_failures": self.checkout_failed,
+                "checkout_wait_avg_ms": round(avg_wait * 1000, 3),
+                "checkout_wait_max_ms": round(self.checkout_wait_max * 1000, 3),
+            }
+
+
+pool_stats = PoolStatsListener()
+
+
+def _client_options():
+    options = {
+        "maxPoolSize": _int_env("MONGO_MAX_POOL_SIZE", 50),
+        "minPoolSize": _int_env("MONGO_MIN_POOL_SIZE", 0),
+        "connectTimeoutMS": _int_env("MONGO_CONNECT_TIMEOUT_MS", 5000),
+        "serverSelectionTimeoutMS": _int_env("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000),
+        "tlsCAFile": os.getenv("MONGO_TLS_CA_FILE") or certifi.where(),
+        "event_listeners": [pool_stats],
+        "connect": False,
+        "appname": "healthsync-backend",
+    }
+    optional = {
+        "maxIdleTimeMS": _int_env("MONGO_MAX_IDLE_TIME_MS"),
+        "socketTimeoutMS": _int_env("MONGO_SOCKET_TIMEOUT_MS"),
+        "waitQueueTimeoutMS": _int_env("MONGO_WAIT_QUEUE_TIMEOUT_MS"),
+    }
+    options.update({k: v for k, v in optional.items() if v is not None})
+
+    # tlsCAFile is only valid when TLS is in use (always true for mongodb+srv)
+    uri = (os.getenv("MONGO_URI") or "").lower()
+    if not (uri.startswith("mongodb+srv://") or "tls=true" in uri or "ssl=true" in uri):
+        options.pop("tlsCAFile")
+    return options
+
+
+def create_client(**overrides) -> MongoClient:
+    """
+    Builds a MongoClient from the environment. Only use this directly for
+    short-lived clients (e.g. CLI commands); request code uses get_client().
+    """
+    options = _client_options()
+    options.update(overrides)
+    return MongoClient(os.getenv("MONGO_URI"), **options)
+
+
+def get_client() -> MongoClient:
+    """
+    Returns the process-wide MongoClient, creating it on first use.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = create_client()
+    return _client
+
+
+def get_db(client=None) -> Database:
+    """
+    Returns the application database with the configured write concern
+    and read preference applied.
+    """
+    write_concern = None
+    w = os.getenv("MONGO_WRITE_CONCERN")
+    if w:
+        wtimeout = _int_env("MONGO_WRITE_TIMEOUT_MS")
+        write_concern = WriteConcern(w=int(w) if w.isdigit() else w, wtimeout=wtimeout)
+
+    read_preference = None
+    read_pref_name = os.getenv("MONGO_READ_PREFERENCE")
+    if read_pref_name:
+        read_preference = READ_PREFERENCES[read_pref_name.lower()]
+
+    return (client or get_client()).get_database(
+        os.getenv("MONGO_DB_NAME", "healthsync"),
+        write_concern=write_concern,
+        read_preference=read_preference,
+    )
+
+
+def get_collection(name) -> Collection:
+    return get_db()[name]
+
+
+def users() -> Collection:
+    return get_collection(USERS)
+
+
+def health_records() -> Collection:
+    return get_collection(HEALTH_RECORDS)
+
+
+def health_metrics() -> Collection:
+    return get_collection(HEALTH_METRICS)
+
+
+def health_snapshots() -> Collection:
+    return get_collection(HEALTH_SNAPSHOTS)
+
+
+def ai_conversations() -> Collection:
+    return get_collection(AI_CONVERSATIONS)
+
+
+def ai_messages() -> Collection:
+    return get_collection(AI_MESSAGES)
+
+
+def medical_reports() -> Collection:
+    return get_collection(MEDICAL_REPORTS)
+
+
+def predictions() -> Collection:
+    return get_collection(PREDICTIONS)
+
+
+def otp() -> Collection:
+    return get_collection(OTP)
+
+
+def token_blacklist() -> Collection:
+    return get_collection(TOKEN_BLACKLIST)
+
+
+def doctors() -> Collection:
+    return get_collection(DOCTORS)
+
+
+def doctor_consultations() -> Collection:
+    return get_collection(DOCTOR_CONSULTATIONS)
+
+
+def jobs() -> Collection:
+    return get_collection(JOBS)
+
+
+def model_versions() -> Collection:
+    return get_collection(MODEL_VERSIONS)
+
+
+def model_registry() -> Collection:
+    return get_collection(MODEL_REGISTRY)
+
+
+def daily_rollups() -> Collection:
+    return get_collection(DAILY_ROLLUPS)
+
+
+def get_pool_stats():
+    """
+    Returns connection pool counters plus the effective pool configuration.
+    """
+    options = _client_options()
+    stats = pool_stats.snapshot()
+    stats["pid"] = os.getpid()
+    stats["config"] = {
+        "max_pool_size": options["maxPoolSize"],
+        "min_pool_size": options["minPoolSize"],
+        "wait_queue_timeout_ms": options.get("waitQueueTimeoutMS"),
+    }
+    return stats
@@ -0,0 +1,349 @@
+# utils/doctor_search.py
+"""
+In-memory doctor search for the search-as-you-type box.
+
+Each worker holds an inverted index over the name, specialty and hospital
+of every doctor. Tokens are lowercased words ("dr" is dropped), kept in
+sorted order. Postings live in flat numpy arrays (doctor position and field
+weight) laid out in token order, so every query word, treated as a prefix
+("card" matches "cardiology" and "cardiologist"), maps through two bisects
+to one contiguous slice. Scoring, filtering and top-k selection are
+vectorized over those slices. A word that prefixes nothing is matched
+through a trigram index over the vocabulary, so one or two typos ("cardiolgy")
+still find results.
+
+Results are ranked by the best match of each word: field weight (name >
+specialty > hospital) times match quality (whole word > prefix > fuzzy).
+Ties go to the higher rating. Callers can sort by an allowlisted field
+instead. No user input ever reaches a $regex.
+
+The index is rebuilt in the background when the doctors collection
+changes. A change stream flags a change where the deployment supports it
+(replica sets, Atlas). Otherwise the count and newest _id are polled every
+DOCTOR_SEARCH_POLL_SECONDS. That fallback misses in-place edits until
+invalidate() is called or the worker restarts. A rebuild builds a new
+index and swaps it in with one reference assignment, so searches never
+wait on it.
+
+scripts/bench_doctor_search.py measures query latency on 100k synthetic
+doctors.
+
+Configuration:
+    DOCTOR_SEARCH_POLL_SECONDS  change polling interval without change streams (default 30)
+"""
+import bisect
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from itertools import accumulate
+
+import numpy as np
+from pymongo.errors import PyMongoError
+
+from utils import db
+from utils.indexes import DOCTOR_SORT_KEYS as SORT_FIELDS
+
+# (field, weight) searched, most important first
+SEARCH_FIELDS = (("name", 3.0), ("specialty", 2.0), ("hospital", 1.0))
+EXACT, PREFIX, FUZZY = 1.0, 0.75, 0.5
+FUZZY_MIN_LENGTH = 4
+FUZZY_MIN_SIMILARITY = 0.5
+FUZZY_MAX_TOKENS = 20
+STOP_TOKENS = {"dr"}
+POLL_SECONDS = float(os.getenv("DOCTOR_SEARCH_POLL_SECONDS", 30))
+# Wait for a burst of changes to settle before rebuilding
+REBUILD_DEBOUNCE_SECONDS = 1.0
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+doctors_collection = db.doctors()
+
+
+def tokenize(text):
+    if not isinstance(text, str):
+        return []
+    return [token for token in _WORD.findall(text.lower()) if token not in STOP_TOKENS]
+
+
+def _trigrams(token):
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# Ratings are packed into 16 bits of the relevance key as tenths
+MAX_RATING = (2 ** 16 - 1) / 10
+
+
+def _scalar(value):
+    """
+    value if it can be sorted alongside the other doctors, else None (bad
+    data is treated as missing instead of breaking the build).
+    """
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        return None
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def _rating(value):
+    try:
+        rating = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return min(max(rating, 0.0), MAX_RATING) if not math.isnan(rating) else 0.0
+
+
+def _sort_value(value):
+    # Strings compare case-insensitively, and never against numbers
+    return (isinstance(value, str), value.lower() if isinstance(value, str) else value)
+
+
+def _ordinal_ranks(values):
+    """
+    Unique ranks: present values in sorted order, then missing ones. Returns
+    (ranks, number of present values).
+    """
+    present = sorted((i for i, value in enumerate(values) if value is not None), key=lambda i: _sort_value(values[i]))
+    missing = [i for i, value in enumerate(values) if value is None]
+    ranks = np.empty(len(values), dtype=np.int64)
+    ranks[present + missing] = np.arange(len(values))
+    return ranks, len(present)
+
+
+class DoctorSearchIndex:
+    """
+    Immutable index over a list of doctor documents. Postings are stored
+    CSR-style: one flat array of doctor positions (and field weights) in
+    token order, so a prefix's postings are a single contiguous slice.
+    """
+
+    def __init__(self, doctors):
+        self.ids = []
+        specialties = []
+        ratings = []
+        sort_values = {field: [] for field in SORT_FIELDS}
+        postings = defaultdict(list)
+
+        for position, doctor in enumerate(doctors):
+            self.ids.append(doctor["_id"])
+            specialty = doctor.get("specialty")
+            specialties.append(specialty if isinstance(specialty, str) else None)
+            ratings.append(_rating(doctor.get("rating")))
+            for field in SORT_FIELDS:
+                sort_values[field].append(_scalar(doctor.get(field)))
+            terms = {}
+            for field, weight in SEARCH_FIELDS:
+                for token in tokenize(doctor.get(field)):
+                    terms[token] = max(terms.get(token, 0), weight)
+            for token, weight in terms.items():
+                postings[token].append((position, weight))
+
+        self.tokens = sorted(postings)
+        self._offsets = np.fromiter(
+            accumulate((len(postings[token]) for token in self.tokens), initial=0), dtype=np.int64
+        )
+        flat = [entry for token in self.tokens for entry in postings[token]]
+        self._docs = np.fromiter((position for position, _ in flat), dtype=np.int64, count=len(flat))
+        self._weights = np.fromiter((weight for _, weight in flat), dtype=np.float64, count=len(flat))
+
+        self._specialty_codes = {}
+        self._specialties = np.fromiter(
+            (self._specialty_codes.setdefault(specialty, len(self._specialty_codes)) for specialty in specialties),
+            dtype=np.int64, count=len(specialties)
+        )
+        self._ratings = np.asarray([int(round(rating * 10)) for rating in ratings], dtype=np.int64)
+        self._ranks = {field: _ordinal_ranks(values) for field, values in sort_values.items()}
+
+        self._trigram_tokens = defaultdict(list)
+        for token_id, token in enumerate(self.tokens):
+            if len(token) >= FUZZY_MIN_LENGTH - 1:
+                for trigram in _trigrams(token):
+                    self._trigram_tokens[trigram].append(token_id)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _prefix_range(self, word):
+        return bisect.bisect_left(self.tokens, word), bisect.bisect_left(self.tokens, word + "\uffff")
+
+    def _fuzzy_tokens(self, word):
+        """
+        Vocabulary tokens similar to word (Dice coefficient over trigrams).
+        """
+        if len(word) < FUZZY_MIN_LENGTH:
+            return []
+        grams = _trigrams(word)
+        shared = Counter(token_id for gram in grams for token_id in self._trigram_tokens.get(gram, ()))
+        scored = []
+        for token_id, count in shared.items():
+            similarity = 2 * count / (len(grams) + len(_trigrams(self.tokens[token_id])))
+            if similarity >= FUZZY_MIN_SIMILARITY:
+                scored.append((similarity, token_id))
+        scored.sort(reverse=True)
+        return [token_id for _, token_id in scored[:FUZZY_MAX_TOKENS]]
+
+    def _slices(self, word):
+        """
+        Postings slices matching word as [(start, end, match quality)], or
+        [] if nothing matches even approximately.
+        """
+        low, high = self._prefix_range(word)
+        if low < high:
+            slices = []
+            if self.tokens[low] == word:
+                slices.append((self._offsets[low], self._offsets[low + 1], EXACT))
+                low += 1
+            if low < high:
+                slices.append((self._offsets[low], self._offsets[high], PREFIX))
+            return slices
+        return [(self._offsets[t], self._offsets[t + 1], FUZZY) for t in self._fuzzy_tokens(word)]
+
+    def _word_scores(self, slices):
+        """
+        Per-doctor best match score of one query word (0 where it doesn't match).
+        """
+        scores = np.zeros(len(self.ids))
+        for start, end, quality in slices:
+            np.maximum.at(scores, self._docs[start:end], self._weights[start:end] * quality)
+        return scores
+
+    def search(self, query, specialty=None, sort_by=None, descending=True, offset=0, limit=20):
+        """
+        Returns (total matches, [(doctor _id, score)] for the requested page).
+        sort_by=None ranks by relevance.
+        """
+        words = list(dict.fromkeys(tokenize(query)))
+        if not words or not self.ids:
+            return 0, []
+        total = np.zeros(len(self.ids))
+        matched = np.ones(len(self.ids), dtype=bool)
+        for word in words:
+            slices = self._slices(word)
+            if not slices:
+                return 0, []
+            scores = self._word_scores(slices)
+            matched &= scores > 0
+            total += scores
+
+        matches = np.flatnonzero(matched)
+        if specialty is not None:
+            code = self._specialty_codes.get(specialty)
+            matches = matches[self._specialties[matches] == code] if code is not None else matches[:0]
+        if sort_by is None:
+            # Scores are multiples of 0.25 and ratings have one decimal, so this packs
+            # (score desc, rating desc, position asc) into one exact integer key
+            key = -((np.round(total[matches] * 4).astype(np.int64) << 40) + (self._ratings[matches] << 24)) + matches
+        else:
+            ranks, present = self._ranks[sort_by]
+            key = ranks[matches]
+            if descending:
+                # Reverse the present values only; missing ones stay last
+                key = np.where(key < present, present - 1 - key, key)
+
+        end = offset + limit
+        if end < len(matches):
+            top = np.argpartition(key, end - 1)[:end]
+        else:
+            top = np.arange(len(matches))
+        page = matches[top[np.argsort(key[top], kind="stable")]][offset:end]
+        return len(matches), [(self.ids[position], round(float(total[position]), 2)) for position in page]
+
+
+class DoctorSearch:
+    """
+    Owns the current DoctorSearchIndex for this process and keeps it fresh.
+    """
+
+    def __init__(self, collection=doctors_collection, poll_interval=POLL_SECONDS):
+        self._collection = collection
+        self.poll_interval = poll_interval
+        self._index = None
+        self._dirty = threading.Event()
+        self._pid = None
+        self._lock = threading.Lock()
+        self.stats = {"builds": 0, "build_ms": None, "size": 0, "change_streams": None}
+
+    def build(self):
+        started = time.perf_counter()
+        projection = {field: 1 for field, _ in SEARCH_FIELDS}
+        projection.update({field: 1 for field in SORT_FIELDS})
+        index = DoctorSearchIndex(self._collection.find({}, projection))
+        self._index = index
+        self.stats["builds"] += 1
+        self.stats["build_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        self.stats["size"] = len(index)
+        return index
+
+    def invalidate(self):
+        """
+        Schedules a rebuild (call after writing to doctors from this process).
+        """
+        self._dirty.set()
+
+    def start(self):
+        """
+        Builds the first index and starts the refresh threads, once per
+        process (threads don't survive fork()).
+        """
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self.build()
+            self._pid = os.getpid()
+            threading.Thread(target=self._watch, daemon=True).start()
+            threading.Thread(target=self._rebuild_loop, daemon=True).start()
+
+    def _watch(self):
+        try:
+            with self._collection.watch() as stream:
+                self.stats["change_streams"] = True
+                for _ in stream:
+                    self._dirty.set()
+        except PyMongoError as e:
+            # Standalone servers have no change streams
+            print(f"Doctor search falling back to polling: {e}")
+        self.stats["change_streams"] = False
+        self._poll()
+
+    def _fingerprint(self):
+        newest = self._collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+        return self._collection.estimated_document_count(), newest and newest["_id"]
+
+    def _poll(self):
+        last = None
+        while True:
+            try:
+                fingerprint = self._fingerprint()
+                if last is not None and fingerprint != last:
+                    self._dirty.set()
+                last = fingerprint
+            except PyMongoError as e:
+                print(f"Doctor search poll failed: {e}")
+            time.sleep(self.poll_interval)
+
+    def _rebuild_loop(self):
+        while True:
+            self._dirty.wait()
+            time.sleep(REBUILD_DEBOUNCE_SECONDS)
+            self._dirty.clear()
+            try:
+                self.build()
+            except Exception as e:
+                # Keep serving the previous index; the next change retries
+                print(f"Doctor search rebuild failed: {e}")
+
+    def search(self, query, **options):
+        self.start()
+        return self._index.search(query, **options)
+
+    def snapshot(self):
+        return dict(self.stats)
+
+
+doctor_search = DoctorSearch()
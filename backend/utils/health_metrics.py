@@ -0,0 +1,264 @@
+# utils/health_metrics.py
+"""
+Numeric health measurements as a time series, and their trend aggregation.
+
+Each health check submission is still stored whole in health_records. Its
+numeric values are also written to health_metrics, a MongoDB time-series
+collection (timeField "timestamp", metaField "user_id"). MongoDB buckets
+each user's measurements together on disk, so a year of one user's data is
+a handful of bucket documents read through the (user_id, timestamp) index.
+When the server can't create time-series collections (MongoDB 4.2 to 4.4,
+or some shared tiers), a regular collection with the same index is used and
+queried the same way.
+
+Derived values are computed once at ingest, not per chart request:
+    systolic, diastolic  parsed from blood_pressure ("120/80")
+    height_in            parsed from height ("5'6", "5 ft 6 in", "168 cm", "66")
+    bmi                  703 * weight (lbs) / height_in ** 2
+    ldl_hdl_ratio        ldl_cholesterol / hdl_cholesterol
+
+trend_pipeline() downsamples inside the database (day/week/month buckets
+with mean, min and max per metric), so the API returns at most a few
+hundred points however many records a user has. Buckets are built with
+$dateFromParts rather than $dateTrunc so the same pipeline runs on the
+pre-5.0 servers that get the regular-collection fallback.
+"""
+import datetime
+import re
+
+from pymongo import ASCENDING
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+from utils import db
+
+METRIC_FIELDS = (
+    "total_cholesterol",
+    "hdl_cholesterol",
+    "ldl_cholesterol",
+    "ldl_hdl_ratio",
+    "systolic",
+    "diastolic",
+    "weight",
+    "height_in",
+    "bmi",
+)
+TREND_INTERVALS = ("day", "week", "month")
+# Upper bound on buckets per trend request, per interval
+TREND_MAX_POINTS = 400
+_INTERVAL_DAYS = {"day": 1, "week": 7, "month": 28}
+MIGRATION_BATCH_SIZE = 500
+
+health_metrics_collection = db.health_metrics()
+
+_BLOOD_PRESSURE = re.compile(r"^\s*(\d{2,3}(?:\.\d+)?)\s*/\s*(\d{2,3}(?:\.\d+)?)")
+_FEET_INCHES = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*(?:'|ft|feet)\s*(?:(\d+(?:\.\d+)?)\s*(?:\"|''|in|inches)?)?\s*$")
+_CENTIMETRES = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*cm\s*$")
+_INCHES = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*(?:\"|in|inches)?\s*$")
+
+
+def _number(value):
+    if isinstance(value, bool) or value is None:
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if number > 0 else None
+
+
+def parse_blood_pressure(value):
+    """
+    Returns (systolic, diastolic) from "120/80", or (None, None).
+    """
+    match = _BLOOD_PRESSURE.match(str(value or ""))
+    if not match:
+        return None, None
+    return float(match.group(1)), float(match.group(2))
+
+
+def parse_height_inches(value):
+    """
+    Height in inches from the formats the health check form accepts. A bare
+    number is taken as centimetres from 100 up, as feet below 10, and as
+    inches in between.
+    """
+    if value is None:
+        return None
+    text = str(value).strip().lower()
+    match = _FEET_INCHES.match(text)
+    if match:
+        return float(match.group(1)) * 12 + float(match.group(2) or 0) or None
+    match = _CENTIMETRES.match(text)
+    if match:
+        return _number(float(match.group(1)) / 2.54)
+    match = _INCHES.match(text)
+    if match:
+        number = float(match.group(1))
+        if number >= 100:
+            number /= 2.54
+        elif number < 10:
+            number *= 12
+        return _number(number)
+    return None
+
+
+def derive_metrics(data):
+    """
+    Returns the numeric metrics of one health check submission (fields that
+    are missing or unparseable are left out).
+    """
+    metrics = {
+        "total_cholesterol": _number(data.get("total_cholesterol")),
+        "hdl_cholesterol": _number(data.get("hdl_cholesterol")),
+        "ldl_cholesterol": _number(data.get("ldl_cholesterol")),
+        "weight": _number(data.get("weight")),
+        "height_in": parse_height_inches(data.get("height")),
+    }
+    metrics["systolic"], metrics["diastolic"] = parse_blood_pressure(data.get("blood_pressure"))
+    if metrics["weight"] and metrics["height_in"]:
+        metrics["bmi"] = round(703 * metrics["weight"] / metrics["height_in"] ** 2, 1)
+    if metrics["ldl_cholesterol"] and metrics["hdl_cholesterol"]:
+        metrics["ldl_hdl_ratio"] = round(metrics["ldl_cholesterol"] / metrics["hdl_cholesterol"], 2)
+    return {field: value for field, value in metrics.items() if value is not None}
+
+
+def metrics_document(user_id, timestamp, data, source_id):
+    return {
+        "user_id": user_id,
+        "timestamp": timestamp,
+        "source_id": source_id,
+        **derive_metrics(data),
+    }
+
+
+def record_health_metrics(user_id, timestamp, data, source_id):
+    health_metrics_collection.insert_one(metrics_document(user_id, timestamp, data, source_id))
+
+
+def ensure_health_metrics_collection(database=None):
+    """
+    Creates health_metrics as a time-series collection, or as a regular
+    collection where time series aren't supported. Returns "timeseries",
+    "regular", or "exists". Must run before any index is built on it,
+    because create_index would implicitly create a regular collection.
+    """
+    database = database if database is not None else db.get_db()
+    if db.HEALTH_METRICS in database.list_collection_names(filter={"name": db.HEALTH_METRICS}):
+        return "exists"
+    try:
+        database.create_collection(
+            db.HEALTH_METRICS,
+            timeseries={"timeField": "timestamp", "metaField": "user_id", "granularity": "hours"},
+        )
+        return "timeseries"
+    except CollectionInvalid:
+        return "exists"
+    except OperationFailure as e:
+        print(f"Time-series collections unavailable ({e}); using a regular collection")
+        database.create_collection(db.HEALTH_METRICS)
+        return "regular"
+
+
+def _bucket_start(interval):
+    """
+    Expression for the start (UTC) of the interval containing $timestamp;
+    weeks start on Monday.
+    """
+    if interval == "week":
+        return {"$dateFromParts": {
+            "isoWeekYear": {"$isoWeekYear": "$timestamp"},
+            "isoWeek": {"$isoWeek": "$timestamp"},
+            "isoDayOfWeek": 1,
+        }}
+    parts = {"year": {"$year": "$timestamp"}, "month": {"$month": "$timestamp"}}
+    if interval == "day":
+        parts["day"] = {"$dayOfMonth": "$timestamp"}
+    return {"$dateFromParts": parts}
+
+
+def trend_pipeline(user_id, start, end, interval, metrics):
+    """
+    Aggregation returning one document per interval bucket in [start, end):
+        {"t": bucket start, "count": n, "<metric>": {"avg", "min", "max"}, ...}
+    """
+    group = {"_id": _bucket_start(interval), "count": {"$sum": 1}}
+    project = {"_id": 0, "t": "$_id", "count": 1}
+    for metric in metrics:
+        group[f"{metric}_avg"] = {"$avg": f"${metric}"}
+        group[f"{metric}_min"] = {"$min": f"${metric}"}
+        group[f"{metric}_max"] = {"$max": f"${metric}"}
+        project[metric] = {
+            "avg": {"$round": [f"${metric}_avg", 2]},
+            "min": f"${metric}_min",
+            "max": f"${metric}_max",
+        }
+    return [
+        {"$match": {"user_id": user_id, "timestamp": {"$gte": start, "$lt": end}}},
+        {"$project": {"timestamp": 1, **{metric: 1 for metric in metrics}}},
+        {"$group": group},
+        {"$sort": {"_id": ASCENDING}},
+        {"$project": project},
+    ]
+
+
+def max_range(interval):
+    return datetime.timedelta(days=_INTERVAL_DAYS[interval] * TREND_MAX_POINTS)
+
+
+def health_trends(user_id, start, end, interval, metrics):
+    return list(health_metrics_collection.aggregate(trend_pipeline(user_id, start, end, interval, metrics)))
+
+
+def _migrate_batch(metrics, records):
+    """
+    Writes metrics for the records not migrated yet. Time-series collections
+    can't have unique indexes, so already-migrated records are found by
+    source_id; the timestamp bounds let MongoDB skip buckets outside the
+    batch's time window.
+    """
+    timestamps = [record["timestamp"] for record in records]
+    migrated = {
+        document["source_id"]
+        for document in metrics.find(
+            {
+                "timestamp": {"$gte": min(timestamps), "$lte": max(timestamps)},
+                "source_id": {"$in": [record["_id"] for record in records]},
+            },
+            {"source_id": 1, "_id": 0}
+        )
+    }
+    documents = [
+        metrics_document(record["user_id"], record["timestamp"], record, record["_id"])
+        for record in records
+        if record["_id"] not in migrated
+    ]
+    if documents:
+        metrics.insert_many(documents, ordered=False)
+    return len(documents)
+
+
+def migrate_health_records(database=None):
+    """
+    Backfills health_metrics from existing health_records. Records already
+    migrated (matched on source_id) are skipped, so it is safe to re-run.
+    Returns the number of documents written.
+    """
+    database = database if database is not None else db.get_db()
+    ensure_health_metrics_collection(database)
+    records = database[db.HEALTH_RECORDS]
+    metrics = database[db.HEALTH_METRICS]
+
+    migrated = 0
+    batch = []
+    # _id order is insertion order, so each batch covers a narrow time window
+    cursor = records.find(
+        {"user_id": {"$exists": True}, "timestamp": {"$type": "date"}}
+    ).sort("_id", ASCENDING).batch_size(MIGRATION_BATCH_SIZE)
+    for record in cursor:
+        batch.append(record)
+        if len(batch) >= MIGRATION_BATCH_SIZE:
+            migrated += _migrate_batch(metrics, batch)
+            batch = []
+    if batch:
+        migrated += _migrate_batch(metrics, batch)
+    return migrated
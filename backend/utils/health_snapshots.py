@@ -0,0 +1,91 @@
+# utils/health_snapshots.py
+"""
+Materialized latest health check per user.
+
+health_snapshots holds one document per user, keyed by the user's _id:
+
+    {"_id": user_id, "timestamp": ..., "record": {...latest health_records
+     document...}, "metrics": {...derived values...}, "updated_at": ...}
+
+submit_health_check replaces it right after inserting the record. The
+update is a single upsert that only matches while the stored snapshot is
+older than the incoming record. Two concurrent submissions therefore can't
+leave the older one in place: the loser's upsert hits the duplicate _id
+and is ignored. Dashboard reads become one _id lookup however much history
+a user has, and the record's _id doubles as the ETag.
+
+If the update fails after the record was inserted, the writer deletes the
+snapshot instead of leaving the previous record in place, so the next read
+rebuilds it. Snapshots that are missing (users from before this existed,
+or a failed update) are rebuilt from health_records on read. `flask db
+rebuild-health-snapshots` rebuilds all of them.
+"""
+import datetime
+
+from pymongo import DESCENDING
+from pymongo.errors import DuplicateKeyError
+
+from utils import db
+from utils.health_metrics import derive_metrics
+
+health_snapshots_collection = db.health_snapshots()
+health_records_collection = db.health_records()
+
+
+def update_snapshot(record):
+    """
+    Makes record (a stored health_records document) the user's snapshot
+    unless a newer one is already there. Returns True if it was written.
+    """
+    try:
+        result = health_snapshots_collection.update_one(
+            {"_id": record["user_id"], "timestamp": {"$not": {"$gt": record["timestamp"]}}},
+            {"$set": {
+                "timestamp": record["timestamp"],
+                "record": record,
+                "metrics": derive_metrics(record),
+                "updated_at": datetime.datetime.utcnow(),
+            }},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        # A newer record's snapshot exists, so the filter missed and the upsert collided
+        return False
+    return result.upserted_id is not None or result.matched_count > 0
+
+
+def invalidate_snapshot(user_id):
+    """
+    Drops the user's snapshot so the next get_snapshot() rebuilds it from
+    health_records.
+    """
+    health_snapshots_collection.delete_one({"_id": user_id})
+
+
+def get_snapshot(user_id):
+    """
+    Returns the user's snapshot, rebuilding it from health_records if it
+    is missing, or None if the user has no health records.
+    """
+    snapshot = health_snapshots_collection.find_one({"_id": user_id})
+    if snapshot is not None:
+        return snapshot
+    record = health_records_collection.find_one({"user_id": user_id}, sort=[("timestamp", DESCENDING)])
+    if record is None:
+        return None
+    update_snapshot(record)
+    return health_snapshots_collection.find_one({"_id": user_id})
+
+
+def rebuild_snapshots():
+    """
+    Recomputes every user's snapshot: one aggregation picks each user's
+    latest record, then each snapshot is written through update_snapshot()
+    so derived metrics are filled in. Returns the number written.
+    """
+    latest = health_records_collection.aggregate([
+        {"$match": {"timestamp": {"$type": "date"}}},
+        {"$sort": {"user_id": 1, "timestamp": -1}},
+        {"$group": {"_id": "$user_id", "record": {"$first": "$$ROOT"}}},
+    ], allowDiskUse=True)
+    return sum(update_snapshot(row["record"]) for row in latest)
@@ -0,0 +1,188 @@
+# utils/indexes.py
+"""
+Index bootstrap and audit for every hot query path.
+
+INDEXES lists the indexes each collection needs; ensure_indexes() creates
+them and is safe to run repeatedly (create_index is a no-op when an
+identical index already exists). QUERY_SHAPES mirrors the filters and sorts
+the blueprints issue, and audit_indexes() explains each one and reports any
+that would still scan the whole collection.
+"""
+from datetime import datetime
+
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from utils import db
+from utils.health_metrics import ensure_health_metrics_collection
+
+OTP_TTL_SECONDS = 5 * 60
+
+# List endpoints page with keyset pagination on (sort key, _id), so the
+# compound indexes end in _id to serve every page with a single seek.
+DOCTOR_SORT_KEYS = ("rating", "experience", "name", "consultation_fee")
+
+INDEXES = {
+    db.USERS: [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("role", ASCENDING)], name="role"),
+        IndexModel([("prediction_count", DESCENDING)], name="prediction_count"),
+    ],
+    db.HEALTH_RECORDS: [
+        IndexModel([("user_id", ASCENDING), ("timestamp", DESCENDING)], name="user_timestamp"),
+    ],
+    db.HEALTH_METRICS: [
+        IndexModel([("user_id", ASCENDING), ("timestamp", ASCENDING)], name="user_timestamp"),
+    ],
+    db.AI_CONVERSATIONS: [
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="user_created_at_id"),
+    ],
+    db.AI_MESSAGES: [
+        IndexModel([("conversation_id", ASCENDING), ("seq", DESCENDING)], name="conversation_seq_unique", unique=True),
+        IndexModel([("job_id", ASCENDING), ("role", ASCENDING)], name="job_role_unique", unique=True,
+                   partialFilterExpression={"job_id": {"$exists": True}}),
+    ],
+    db.MEDICAL_REPORTS: [
+        IndexModel([("user_id", ASCENDING), ("report_date", DESCENDING), ("_id", DESCENDING)], name="user_report_date_id"),
+        IndexModel([("file_id", ASCENDING)], name="file_id"),
+        IndexModel([("job_id", ASCENDING)], name="job_id_unique", unique=True,
+                   partialFilterExpression={"job_id": {"$exists": True}}),
+    ],
+    "report_files.files": [
+        IndexModel([("metadata.sha256", ASCENDING)], name="sha256"),
+    ],
+    db.PREDICTIONS: [
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="user_created_at_id"),
+    ],
+    db.OTP: [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("timestamp", ASCENDING)], name="timestamp_ttl", expireAfterSeconds=OTP_TTL_SECONDS),
+        IndexModel([("status_token", ASCENDING)], name="status_token",
+                   partialFilterExpression={"status_token": {"$exists": True}}),
+    ],
+    db.TOKEN_BLACKLIST: [
+        IndexModel([("jti", ASCENDING)], name="jti_unique", unique=True),
+        IndexModel([("blacklisted_at", ASCENDING)], name="blacklisted_at"),
+        # Entries are removed as soon as the revoked token would have expired anyway
+        IndexModel([("expires", ASCENDING)], name="expires_ttl", expireAfterSeconds=0),
+    ],
+    db.DOCTORS: [
+        index
+        for key in DOCTOR_SORT_KEYS
+        for index in (
+            IndexModel([(key, ASCENDING), ("_id", ASCENDING)], name=f"{key}_id"),
+            IndexModel([("specialty", ASCENDING), (key, ASCENDING), ("_id", ASCENDING)], name=f"specialty_{key}_id"),
+        )
+    ],
+    db.DOCTOR_CONSULTATIONS: [
+        IndexModel([("user_id", ASCENDING), ("started_at", DESCENDING)], name="user_started_at"),
+    ],
+    db.JOBS: [
+        IndexModel([("status", ASCENDING), ("run_at", ASCENDING)], name="status_run_at"),
+        IndexModel([("status", ASCENDING), ("locked_until", ASCENDING)], name="status_locked_until"),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="user_created_at_id"),
+        # Finished jobs are kept for JOB_RETENTION_SECONDS, then removed
+        IndexModel([("expires_at", ASCENDING)], name="expires_ttl", expireAfterSeconds=0),
+    ],
+}
+
+# Indexes superseded by the ones above; ensure_indexes() drops them
+RETIRED_INDEXES = {
+    db.AI_CONVERSATIONS: ["user_created_at"],
+    db.MEDICAL_REPORTS: ["user_report_date"],
+    db.PREDICTIONS: ["user_created_at"],
+    db.DOCTORS: ["specialty_rating", "rating"],
+}
+
+_SAMPLE_ID = ObjectId()
+_SAMPLE_TIME = datetime(2000, 1, 1)
+
+# (collection, filter, sort) for every query the blueprints run on a hot path
+QUERY_SHAPES = [
+    (db.USERS, {"email": "audit@example.com"}, None),
+    (db.USERS, {}, [("_id", DESCENDING)]),
+    (db.USERS, {"role": "admin"}, None),
+    (db.USERS, {"prediction_count": {"$gt": 0}}, [("prediction_count", DESCENDING)]),
+    (db.HEALTH_RECORDS, {"user_id": _SAMPLE_ID}, [("timestamp", DESCENDING)]),
+    (db.HEALTH_SNAPSHOTS, {"_id": _SAMPLE_ID}, None),
+    (db.HEALTH_METRICS, {"user_id": _SAMPLE_ID, "timestamp": {"$gte": _SAMPLE_TIME}}, None),
+    (db.AI_CONVERSATIONS, {"user_id": _SAMPLE_ID}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+    (db.AI_CONVERSATIONS, {"_id": _SAMPLE_ID, "user_id": _SAMPLE_ID}, None),
+    (db.AI_MESSAGES, {"conversation_id": _SAMPLE_ID}, [("seq", DESCENDING)]),
+    (db.AI_MESSAGES, {"job_id": str(_SAMPLE_ID)}, [("seq", ASCENDING)]),
+    (db.MEDICAL_REPORTS, {"user_id": _SAMPLE_ID}, [("report_date", DESCENDING), ("_id", DESCENDING)]),
+    (db.MEDICAL_REPORTS, {"_id": _SAMPLE_ID, "user_id": _SAMPLE_ID}, None),
+    (db.MEDICAL_REPORTS, {"file_id": _SAMPLE_ID}, None),
+    (db.MEDICAL_REPORTS, {"job_id": str(_SAMPLE_ID)}, None),
+    ("report_files.files", {"metadata.sha256": "audit-sha256", "metadata.refs": {"$gt": 0}}, None),
+    (db.PREDICTIONS, {"user_id": str(_SAMPLE_ID)}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+    (db.OTP, {"email": "audit@example.com"}, None),
+    (db.OTP, {"status_token": "audit-token"}, None),
+    (db.TOKEN_BLACKLIST, {"jti": "audit-jti"}, None),
+    (db.TOKEN_BLACKLIST, {"blacklisted_at": {"$gte": _SAMPLE_TIME}}, None),
+    (db.DOCTORS, {"specialty": "Cardiology"}, [("rating", DESCENDING), ("_id", DESCENDING)]),
+    (db.DOCTORS, {}, [("rating", DESCENDING), ("_id", DESCENDING)]),
+    (db.DOCTORS, {}, [("name", ASCENDING), ("_id", ASCENDING)]),
+    (db.DOCTOR_CONSULTATIONS, {"_id": _SAMPLE_ID, "user_id": _SAMPLE_ID}, None),
+    (db.JOBS, {"status": "queued", "run_at": {"$lte": _SAMPLE_TIME}}, [("run_at", ASCENDING)]),
+    (db.JOBS, {"status": "running", "locked_until": {"$lt": _SAMPLE_TIME}}, None),
+    (db.JOBS, {"user_id": str(_SAMPLE_ID)}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+]
+
+
+def ensure_indexes(database=None):
+    """
+    Creates every index in INDEXES. Returns {collection: [index names]}.
+    """
+    database = database if database is not None else db.get_db()
+    # Has to exist before create_indexes, which would make it a regular collection
+    ensure_health_metrics_collection(database)
+    for collection_name, names in RETIRED_INDEXES.items():
+        existing = database[collection_name].index_information()
+        for name in names:
+            if name in existing:
+                database[collection_name].drop_index(name)
+
+    created = {}
+    for collection_name, models in INDEXES.items():
+        created[collection_name] = database[collection_name].create_indexes(models)
+    return created
+
+
+def _plan_stages(plan):
+    """
+    Yields every stage name in an explain() plan tree.
+    """
+    if not isinstance(plan, dict):
+        return
+    if "stage" in plan:
+        yield plan["stage"]
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+
+def audit_indexes(database=None):
+    """
+    Explains every query in QUERY_SHAPES. Returns a list of result dicts;
+    an entry with ok=False means the query would scan the collection.
+    """
+    database = database if database is not None else db.get_db()
+    results = []
+    for collection_name, query, sort in QUERY_SHAPES:
+        cursor = database[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = cursor.explain()
+        winning_plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+        stages = list(_plan_stages(winning_plan))
+        results.append({
+            "collection": collection_name,
+            "filter": sorted(query.keys()),
+            "sort": [key for key, _ in sort] if sort else [],
+            "stages": stages,
+            "ok": "COLLSCAN" not in stages,
+        })
+    return results
@@ -0,0 +1,136 @@
+# utils/inference_scheduler.py
+"""
+Dynamic micro-batching for single predictions.
+
+Concurrent requests each enqueue one feature vector and wait on a Future. A
+scheduler thread takes the first waiting vector, keeps collecting until it
+has max_batch_size of them or max_wait_ms has passed since the first one
+arrived, runs one vectorized prediction over the batch on the registry's
+active model, and resolves every caller's Future with its own row and the
+model version that produced it. Under load, many requests share one
+predict_proba call. When traffic is light, a request waits at most
+max_wait_ms (and nothing at all if it is alone and max_wait_ms is 0).
+
+Configuration:
+    INFERENCE_MAX_BATCH_SIZE  rows per model call (default 32)
+    INFERENCE_MAX_WAIT_MS     batching window after the first request (default 2)
+    INFERENCE_QUEUE_SIZE      pending requests before submit() fails (default 10000)
+
+scripts/bench_inference.py measures throughput against p99 latency for
+different windows.
+"""
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+import numpy as np
+
+from utils.model_registry import registry
+
+
+class InferenceScheduler:
+    def __init__(self, predict_fn, max_batch_size=32, max_wait_ms=2.0, queue_size=10000):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = deque(maxlen=1000)
+        self.stats = {
+            "requests": 0,
+            "batches": 0,
+            "max_queue_depth": 0,
+            "errors": 0,
+        }
+
+    def start(self):
+        """
+        Starts the scheduler thread once per process (threads don't survive fork()).
+        """
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, features):
+        """
+        Queues one feature vector. Returns a Future resolving to (label,
+        confidence, model version). Raises queue.Full when the backlog is at
+        capacity.
+        """
+        self.start()
+        future = Future()
+        self._queue.put_nowait((features, future))
+        depth = self._queue.qsize()
+        with self._stats_lock:
+            self.stats["requests"] += 1
+            if depth > self.stats["max_queue_depth"]:
+                self.stats["max_queue_depth"] = depth
+        return future
+
+    def predict(self, features, timeout=10.0):
+        future = self.submit(features)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # Callers that gave up (timed out and cancelled) are dropped from the batch
+            batch = [(features, future) for features, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                labels, confidences, version = self.predict_fn(np.asarray([features for features, _ in batch]))
+            except Exception as e:
+                with self._stats_lock:
+                    self.stats["errors"] += 1
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), label, confidence in zip(batch, labels, confidences):
+                future.set_result((label, round(float(confidence), 2), version))
+            with self._stats_lock:
+                self.stats["batches"] += 1
+                self._batch_sizes.append(len(batch))
+
+    def snapshot(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+            sizes = list(self._batch_sizes)
+        stats["queue_depth"] = self._queue.qsize()
+        stats["avg_batch_size"] = round(sum(sizes) / len(sizes), 2) if sizes else None
+        stats["max_batch_size_seen"] = max(sizes) if sizes else None
+        stats["max_batch_size"] = self.max_batch_size
+        stats["max_wait_ms"] = self.max_wait * 1000
+        return stats
+
+
+scheduler = InferenceScheduler(
+    registry.predict,
+    max_batch_size=int(os.getenv("INFERENCE_MAX_BATCH_SIZE", 32)),
+    max_wait_ms=float(os.getenv("INFERENCE_MAX_WAIT_MS", 2)),
+    queue_size=int(os.getenv("INFERENCE_QUEUE_SIZE", 10000)),
+)
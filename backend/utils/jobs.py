@@ -0,0 +1,278 @@
+# utils/jobs.py
+"""
+Persistent background jobs for slow external work (Gemini calls, PDF
+rendering, OTP mail), so web workers hand the work off and return 202
+instead of blocking on an upstream.
+
+Jobs are documents in the jobs collection:
+
+    {"type": "ai_reply", "payload": {...}, "user_id": "...",
+     "status": "queued" | "running" | "succeeded" | "failed",
+     "attempts": 1, "max_attempts": 3, "run_at": ..., "locked_until": ...,
+     "result": {...}, "error": "..."}
+
+A JobWorkerPool claims queued jobs with an atomic find_one_and_update, so any
+number of pools (one per web worker, or a dedicated `flask jobs work`
+process) can share the queue. A claimed job holds a lease that a heartbeat
+thread renews while the handler runs; if its worker dies the lease runs out
+and the job is queued again. A job can therefore still run more than once
+(a worker that stalls past its lease, or dies after the work but before
+recording the result), so handlers key their side effects on the job id. Failed attempts are retried
+with jittered exponential backoff until max_attempts. Finished jobs expire
+after JOB_RETENTION_SECONDS via a TTL index.
+
+Handlers are registered by type next to the code they belong to:
+
+    @job_handler("render_health_report")
+    def render_health_report_job(payload, job_id):
+        ...
+        return {"report_id": ...}   # stored as the job's result
+"""
+import datetime
+import os
+import random
+import socket
+import threading
+import uuid
+
+from pymongo import ReturnDocument
+
+from utils import db
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", 1.0))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", 120))
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", 24 * 3600))
+JOB_RETRY_BASE_SECONDS = 2.0
+JOB_RETRY_MAX_SECONDS = 300.0
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+jobs_collection = db.jobs()
+
+HANDLERS = {}
+
+# Wakes local workers as soon as a job is enqueued instead of at the next poll
+_wakeup = threading.Event()
+
+
+class PermanentJobError(Exception):
+    """
+    Raised by a handler when retrying can't help (e.g. the input is invalid).
+    """
+
+
+def job_handler(job_type):
+    def decorator(func):
+        HANDLERS[job_type] = func
+        return func
+    return decorator
+
+
+def enqueue(job_type, payload, user_id=None, max_attempts=3):
+    """
+    Queues a job and returns its id (str).
+    """
+    if job_type not in HANDLERS:
+        raise ValueError(f"Unknown job type: {job_type}")
+    now = datetime.datetime.utcnow()
+    result = jobs_collection.insert_one({
+        "type": job_type,
+        "payload": payload,
+        "user_id": user_id,
+        "status": QUEUED,
+        "attempts": 0,
+        "max_attempts": max_attempts,
+        "created_at": now,
+        "run_at": now,
+    })
+    _wakeup.set()
+    return str(result.inserted_id)
+
+
+def serialize_job(job):
+    serialized = {
+        "job_id": str(job["_id"]),
+        "type": job["type"],
+        "status": job["status"],
+        "attempts": job.get("attempts", 0),
+        "created_at": job["created_at"].isoformat(),
+    }
+    for key in ("started_at", "finished_at"):
+        if job.get(key):
+            serialized[key] = job[key].isoformat()
+    if job["status"] == SUCCEEDED:
+        serialized["result"] = job.get("result")
+    if job.get("error"):
+        serialized["error"] = job["error"]
+    return serialized
+
+
+def claim(worker_id):
+    """
+    Atomically takes the next due job and leases it to worker_id.
+    """
+    now = datetime.datetime.utcnow()
+    return jobs_collection.find_one_and_update(
+        {"status": QUEUED, "run_at": {"$lte": now}},
+        {
+            "$set": {
+                "status": RUNNING,
+                "worker": worker_id,
+                "started_at": now,
+                "locked_until": now + datetime.timedelta(seconds=JOB_LEASE_SECONDS),
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("run_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def renew_lease(job):
+    """
+    Extends the lease of a job this worker is still running. Returns False if
+    the lease was lost.
+    """
+    result = jobs_collection.update_one(
+        {"_id": job["_id"], "worker": job["worker"], "status": RUNNING},
+        {"$set": {"locked_until": datetime.datetime.utcnow() + datetime.timedelta(seconds=JOB_LEASE_SECONDS)}}
+    )
+    return result.matched_count == 1
+
+
+def _heartbeat(job, done):
+    while not done.wait(JOB_LEASE_SECONDS / 3):
+        try:
+            if not renew_lease(job):
+                print(f"Job {job['_id']} lost its lease")
+                return
+        except Exception as e:
+            print(f"Job {job['_id']} lease renewal failed: {e}")
+
+
+def requeue_expired_leases():
+    """
+    Puts jobs whose worker stopped renewing its lease back on the queue.
+    """
+    now = datetime.datetime.utcnow()
+    result = jobs_collection.update_many(
+        {"status": RUNNING, "locked_until": {"$lt": now}},
+        {"$set": {"status": QUEUED, "run_at": now}, "$unset": {"worker": "", "locked_until": ""}}
+    )
+    return result.modified_count
+
+
+def _finish(job, status, result=None, error=None):
+    now = datetime.datetime.utcnow()
+    update = {
+        "status": status,
+        "finished_at": now,
+        "expires_at": now + datetime.timedelta(seconds=JOB_RETENTION_SECONDS),
+    }
+    if result is not None:
+        update["result"] = result
+    if error is not None:
+        update["error"] = error
+    # The worker check keeps a worker whose lease was taken over from overwriting the new run
+    jobs_collection.update_one(
+        {"_id": job["_id"], "worker": job["worker"]},
+        {"$set": update, "$unset": {"locked_until": ""}}
+    )
+
+
+def _retry_later(job, error):
+    delay = random.uniform(0, min(JOB_RETRY_MAX_SECONDS, JOB_RETRY_BASE_SECONDS * 2 ** job["attempts"]))
+    jobs_collection.update_one(
+        {"_id": job["_id"], "worker": job["worker"]},
+        {
+            "$set": {
+                "status": QUEUED,
+                "error": error,
+                "run_at": datetime.datetime.utcnow() + datetime.timedelta(seconds=delay),
+            },
+            "$unset": {"worker": "", "locked_until": ""},
+        }
+    )
+
+
+def run_job(job):
+    handler = HANDLERS.get(job["type"])
+    if handler is None:
+        _finish(job, FAILED, error=f"No handler for job type {job['type']}")
+        return
+    done = threading.Event()
+    threading.Thread(target=_heartbeat, args=(job, done), daemon=True).start()
+    try:
+        result = handler(job["payload"], str(job["_id"]))
+    except PermanentJobError as e:
+        _finish(job, FAILED, error=str(e))
+    except Exception as e:
+        print(f"Job {job['_id']} ({job['type']}) attempt {job['attempts']} failed: {e}")
+        if job["attempts"] >= job["max_attempts"]:
+            _finish(job, FAILED, error=str(e))
+        else:
+            _retry_later(job, str(e))
+    else:
+        _finish(job, SUCCEEDED, result=result if result is not None else {})
+    finally:
+        done.set()
+
+
+class JobWorkerPool:
+    """
+    A few daemon threads that claim and run jobs until stop() is called.
+    """
+
+    def __init__(self, size=JOB_WORKERS, poll_interval=JOB_POLL_SECONDS):
+        self.size = size
+        self.poll_interval = poll_interval
+        self._threads = []
+        self._pid = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Starts the threads once per process; cheap to call on every request.
+        Threads don't survive fork(), so a forked worker starts its own.
+        """
+        if self._pid == os.getpid() or self.size <= 0:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._threads = []
+            prefix = f"{socket.gethostname()}:{self._pid}:{uuid.uuid4().hex[:6]}"
+            for i in range(self.size):
+                thread = threading.Thread(target=self._work, args=(f"{prefix}:{i}",), daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        _wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _work(self, worker_id):
+        reap_every = max(1, int(JOB_LEASE_SECONDS / 4 / self.poll_interval))
+        idle_polls = 0
+        while not self._stopping.is_set():
+            try:
+                if idle_polls % reap_every == 0:
+                    requeue_expired_leases()
+                job = claim(worker_id)
+                if job is not None:
+                    idle_polls = 0
+                    run_job(job)
+                    continue
+            except Exception as e:
+                print(f"Job worker {worker_id} error: {e}")
+            idle_polls += 1
+            if _wakeup.wait(self.poll_interval):
+                _wakeup.clear()
+
+
+worker_pool = JobWorkerPool()
@@ -1,36 +1,49 @@
 # utils/jwt_blacklist.py
-from pymongo import MongoClient
 import os
 from datetime import datetime, timedelta
-from dotenv import load_dotenv
+from utils import db
+from utils.revocation_cache import RevocationCache
 
-load_dotenv()
+blacklist_collection = db.token_blacklist()
 
-client = MongoClient(os.getenv("MONGO_URI"))
-db = client["healthsync"]
-blacklist_collection = db["token_blacklist"]
+revocation_cache = RevocationCache(
+    blacklist_collection,
+    capacity=int(os.getenv("JWT_REVOCATION_CACHE_SIZE", 10000)),
+    poll_interval=float(os.getenv("JWT_REVOCATION_POLL_SECONDS", 5)),
+    resync_interval=float(os.getenv("JWT_REVOCATION_RESYNC_SECONDS", 900)),
+)
 
-def add_token_to_blacklist(jti, user_id):
-    # Now datetime refers to the module, so datetime.datetime.utcnow() is correct
-    # And timedelta is imported directly
-    expires = datetime.utcnow() + timedelta(hours=1)
-    blacklist_collection.insert_one({"jti": jti, "user_id": user_id, "expires": expires})
+# Matches JWT_ACCESS_TOKEN_EXPIRES in app.py
+ACCESS_TOKEN_LIFETIME = timedelta(days=1)
 
-def is_token_blacklisted(jti):
-    token = blacklist_collection.find_one({"jti": jti})
-    # Now datetime refers to the module, so datetime.datetime.utcnow() is correct
-    if token and token["expires"] > datetime.utcnow():
-        return True
-    return False
+def add_token_to_blacklist(jti, user_id, expires_at=None):
+    """
+    Revokes a token. expires_at is the token's own expiry (naive UTC); the
+    TTL index on "expires" deletes the entry once the token is dead anyway.
+    """
+    now = datetime.utcnow()
+    expires = expires_at or now + ACCESS_TOKEN_LIFETIME
+    blacklist_collection.update_one(
+        {"jti": jti},
+        {"$setOnInsert": {"jti": jti, "user_id": user_id, "blacklisted_at": now, "expires": expires}},
+        upsert=True
+    )
+    revocation_cache.add(jti, expires)
 
-def add_token_to_blacklist(jti, user_id):
-    blacklist_collection.insert_one({
-        "jti": jti,
-        "user_id": user_id,
-        "blacklisted_at": datetime.utcnow()
-    })
+def backfill_blacklist_expiry(lifetime=ACCESS_TOKEN_LIFETIME):
+    """
+    Gives entries written before "expires" existed the expiry of the token
+    they revoked (blacklisted_at + lifetime, the latest it could have had), so
+    the TTL index removes them. Returns the number of entries updated.
+    """
+    result = blacklist_collection.update_many(
+        {"expires": {"$exists": False}},
+        [{"$set": {"expires": {"$add": [
+            {"$ifNull": ["$blacklisted_at", datetime.utcnow()]},
+            int(lifetime.total_seconds() * 1000),
+        ]}}}]
+    )
+    return result.modified_count
 
 def is_token_revoked(jwt_payload):
-    jti = jwt_payload["jti"]
-    token = blacklist_collection.find_one({"jti": jti})
-    return token is not None  # ✅ If token found in blacklist, it's revoked
+    return revocation_cache.is_revoked(jwt_payload["jti"])
@@ -0,0 +1,345 @@
+# utils/llm_client.py
+"""
+Pooled, time-bounded HTTP client for the Gemini API.
+
+One GeminiClient per process keeps a requests.Session with keep-alive
+connections, so chat turns don't pay a fresh TCP + TLS handshake. Every call
+has connect and read timeouts, retryable failures (connection errors,
+timeouts, 429 and 5xx) are retried with jittered exponential backoff, and a
+circuit breaker fails fast with LLMUnavailableError while the upstream is
+unhealthy instead of tying up web workers. Per-call latency and token
+counts are recorded for /api/metrics/llm.
+
+Configuration:
+    GEMINI_API_KEY, GEMINI_API_BASE, GEMINI_MODEL
+    GEMINI_CONNECT_TIMEOUT        seconds (default 3)
+    GEMINI_READ_TIMEOUT           seconds between bytes (default 30)
+    GEMINI_MAX_RETRIES            extra attempts (default 2)
+    GEMINI_POOL_SIZE              keep-alive connections (default 10)
+    GEMINI_BREAKER_THRESHOLD      consecutive failures that open the breaker (default 5)
+    GEMINI_BREAKER_RESET_SECONDS  how long it stays open (default 30)
+"""
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+load_dotenv()
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    pass
+
+
+class LLMUnavailableError(LLMError):
+    """
+    Raised without calling upstream while the circuit breaker is open.
+    """
+
+    def __init__(self, retry_after):
+        super().__init__("AI service is temporarily unavailable")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for
+    `reset_timeout` seconds. Then one trial call is let through (half-open):
+    success closes the breaker, failure opens it again.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def before_call(self):
+        """
+        Raises LLMUnavailableError if the call must not go upstream.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            elapsed = self._clock() - self.opened_at
+            if self.state == self.OPEN and elapsed >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return
+            raise LLMUnavailableError(max(1, int(self.reset_timeout - elapsed)))
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_abandoned(self):
+        """
+        A call that ended without a verdict (e.g. a stream the caller closed
+        early). A half-open trial goes back to open so a later call can try
+        again, instead of the breaker waiting forever for its result.
+        """
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+                self.opened_at = self._clock()
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = self._clock()
+
+
+class LLMMetrics:
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self.counters = {
+            "calls": 0,
+            "successes": 0,
+            "failures": 0,
+            "retries": 0,
+            "breaker_rejections": 0,
+            "prompt_tokens": 0,
+            "reply_tokens": 0,
+        }
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def record_call(self, seconds, usage=None):
+        with self._lock:
+            self._latencies.append(seconds)
+            if usage:
+                self.counters["prompt_tokens"] += usage.get("promptTokenCount", 0)
+                self.counters["reply_tokens"] += usage.get("candidatesTokenCount", 0)
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = dict(self.counters)
+        if latencies:
+            stats["latency_p50_ms"] = round(latencies[len(latencies) // 2] * 1000, 1)
+            stats["latency_p95_ms"] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 1)
+        return stats
+
+
+def extract_text(result):
+    """
+    Returns the text of the first candidate in a (full or streamed) Gemini response, or "".
+    """
+    candidates = result.get("candidates") or []
+    if not candidates:
+        return ""
+    parts = (candidates[0].get("content") or {}).get("parts") or []
+    return "".join(part.get("text", "") for part in parts)
+
+
+class GeminiStream:
+    """
+    Iterates the JSON events of a streamGenerateContent (alt=sse) response.
+    Always close() it (or use it as a context manager) so the pooled
+    connection is released, including when the downstream client disconnects.
+    """
+
+    def __init__(self, client, response, started):
+        self._client = client
+        self._response = response
+        self._started = started
+        self._finished = False
+        self.usage = None
+
+    def __iter__(self):
+        data_lines = []
+        try:
+            for line in self._response.iter_lines(chunk_size=None, decode_unicode=True):
+                if line:
+                    if line.startswith("data:"):
+                        data_lines.append(line[5:].lstrip())
+                    continue
+                if data_lines:
+                    yield self._parse(data_lines)
+                    data_lines = []
+            if data_lines:
+                yield self._parse(data_lines)
+        except requests.exceptions.RequestException:
+            self._finish(ok=False)
+            raise
+        except ValueError as e:
+            self._finish(ok=False)
+            raise LLMError(f"Invalid JSON from Gemini stream: {e}")
+        self._finish(ok=True)
+
+    def _parse(self, data_lines):
+        event = json.loads("\n".join(data_lines))
+        if event.get("usageMetadata"):
+            self.usage = event["usageMetadata"]
+        return event
+
+    def _finish(self, ok):
+        if self._finished:
+            return
+        self._finished = True
+        self._client._record(self._started, ok, self.usage)
+
+    def close(self):
+        # Safe to call more than once
+        self._response.close()
+        # A stream abandoned by the caller isn't an upstream failure
+        if not self._finished:
+            self._finished = True
+            self._client.metrics.record_call(time.perf_counter() - self._started, self.usage)
+            self._client.breaker.record_abandoned()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class GeminiClient:
+    def __init__(self, api_key, base_url, model, connect_timeout=3.0, read_timeout=30.0,
+                 max_retries=2, backoff_base=0.25, backoff_max=4.0, pool_size=10, breaker=None):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.metrics = LLMMetrics()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["Content-Type"] = "application/json"
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            api_key=os.getenv("GEMINI_API_KEY", ""),
+            base_url=os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta"),
+            model=os.getenv("GEMINI_MODEL", "gemini-2.0-flash"),
+            connect_timeout=float(os.getenv("GEMINI_CONNECT_TIMEOUT", 3)),
+            read_timeout=float(os.getenv("GEMINI_READ_TIMEOUT", 30)),
+            max_retries=int(os.getenv("GEMINI_MAX_RETRIES", 2)),
+            pool_size=int(os.getenv("GEMINI_POOL_SIZE", 10)),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv("GEMINI_BREAKER_THRESHOLD", 5)),
+                reset_timeout=float(os.getenv("GEMINI_BREAKER_RESET_SECONDS", 30)),
+            ),
+        )
+
+    def _url(self, method):
+        return f"{self.base_url}/models/{self.model}:{method}"
+
+    def _backoff(self, attempt, response=None):
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(self.backoff_max, int(retry_after)))
+        time.sleep(delay)
+
+    def _record(self, started, ok, usage=None):
+        self.metrics.record_call(time.perf_counter() - started, usage)
+        if ok:
+            self.metrics.incr("successes")
+            self.breaker.record_success()
+        else:
+            self.metrics.incr("failures")
+            self.breaker.record_failure()
+
+    def _post(self, method, payload, params, stream):
+        """
+        POSTs with retries. Returns (response, started); raises LLMError or a
+        requests exception once retries are exhausted.
+        """
+        try:
+            self.breaker.before_call()
+        except LLMUnavailableError:
+            self.metrics.incr("breaker_rejections")
+            raise
+
+        self.metrics.incr("calls")
+        started = time.perf_counter()
+        params = {**params, "key": self.api_key}
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            try:
+                response = self.session.post(
+                    self._url(method), params=params, json=payload, timeout=self.timeout, stream=stream
+                )
+            except requests.exceptions.RequestException as e:
+                # Only connection errors and timeouts are worth retrying; every
+                # failure is recorded so a half-open trial always gets a verdict
+                retryable = isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+                if last_attempt or not retryable:
+                    self._record(started, ok=False)
+                    raise
+                self.metrics.incr("retries")
+                self._backoff(attempt)
+                continue
+
+            if response.status_code in RETRYABLE_STATUSES and not last_attempt:
+                response.close()
+                self.metrics.incr("retries")
+                self._backoff(attempt, response)
+                continue
+            if response.status_code >= 400:
+                response.close()
+                # Client errors (bad key, bad payload) don't mean the upstream is unhealthy
+                self._record(started, ok=response.status_code < 500 and response.status_code != 429)
+                response.raise_for_status()
+            return response, started
+
+    def generate(self, contents, **options):
+        """
+        Calls generateContent and returns the parsed JSON response.
+        """
+        response, started = self._post("generateContent", {"contents": contents, **options}, {}, stream=False)
+        try:
+            result = response.json()
+        except requests.exceptions.RequestException:
+            # The body failed mid-read (e.g. ChunkedEncodingError)
+            self._record(started, ok=False)
+            raise
+        except ValueError as e:
+            self._record(started, ok=False)
+            raise LLMError(f"Invalid JSON from Gemini: {e}")
+        self._record(started, ok=True, usage=result.get("usageMetadata"))
+        return result
+
+    def stream_generate(self, contents, **options):
+        """
+        Calls streamGenerateContent and returns a GeminiStream of JSON events.
+        """
+        response, started = self._post(
+            "streamGenerateContent", {"contents": contents, **options}, {"alt": "sse"}, stream=True
+        )
+        return GeminiStream(self, response, started)
+
+    def stats(self):
+        stats = self.metrics.snapshot()
+        stats["breaker_state"] = self.breaker.state
+        return stats
+
+
+gemini_client = GeminiClient.from_env()
@@ -0,0 +1,245 @@
+# utils/mailer.py
+"""
+Asynchronous mail dispatcher with persistent SMTP connections.
+
+submit() puts a message on an in-process queue and returns immediately;
+send() does the same and waits for the outcome, for callers (background
+jobs) that must know a message went out before reporting success. A
+few sender threads each keep one authenticated SMTP connection open (one
+handshake, STARTTLS and login per connection, not per message). They drain
+the queue in batches over that connection, reconnect and retry when the
+relay drops them, and close the connection after EMAIL_IDLE_SECONDS without
+mail. Each message's outcome is reported to its on_result callback as
+"sent" or "failed".
+
+Configuration:
+    EMAIL_HOST, EMAIL_PORT, EMAIL_ADDRESS, EMAIL_PASSWORD
+    EMAIL_STARTTLS      upgrade with STARTTLS (default true; false for a local sink)
+    EMAIL_POOL_SIZE     sender threads / open connections (default 2)
+    EMAIL_BATCH_SIZE    messages sent per connection checkout (default 20)
+    EMAIL_IDLE_SECONDS  close an idle connection after this long (default 30)
+
+scripts/smtp_sink.py is a local relay for testing; scripts/bench_mail.py
+compares the dispatcher with a connection per message.
+"""
+import itertools
+import os
+import queue
+import smtplib
+import ssl
+import threading
+from email.message import EmailMessage
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Errors after which the connection is discarded and the message retried on a new one
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, smtplib.SMTPHeloError, OSError)
+
+
+class MailDeliveryError(Exception):
+    pass
+
+
+class OutgoingMail:
+    def __init__(self, mail_id, message, on_result):
+        self.id = mail_id
+        self.message = message
+        self.on_result = on_result
+        self.attempts = 0
+
+
+class MailDispatcher:
+    def __init__(self, host, port, username=None, password=None, sender=None, starttls=True,
+                 pool_size=2, batch_size=20, idle_timeout=30.0, max_attempts=3, timeout=10.0,
+                 queue_size=10000):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.sender = sender or username
+        self.starttls = starttls
+        self.pool_size = pool_size
+        self.batch_size = batch_size
+        self.idle_timeout = idle_timeout
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._ids = itertools.count(1)
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "queued": 0,
+            "sent": 0,
+            "failed": 0,
+            "retries": 0,
+            "connections_opened": 0,
+            "batches": 0,
+        }
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            host=os.getenv("EMAIL_HOST"),
+            port=int(os.getenv("EMAIL_PORT") or 587),
+            username=os.getenv("EMAIL_ADDRESS"),
+            password=os.getenv("EMAIL_PASSWORD"),
+            starttls=os.getenv("EMAIL_STARTTLS", "true").lower() == "true",
+            pool_size=int(os.getenv("EMAIL_POOL_SIZE", 2)),
+            batch_size=int(os.getenv("EMAIL_BATCH_SIZE", 20)),
+            idle_timeout=float(os.getenv("EMAIL_IDLE_SECONDS", 30)),
+        )
+
+    def _incr(self, name, amount=1):
+        with self._stats_lock:
+            self.stats[name] += amount
+
+    def start(self):
+        """
+        Starts the sender threads once per process (threads don't survive fork()).
+        """
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            for _ in range(self.pool_size):
+                threading.Thread(target=self._work, daemon=True).start()
+
+    def submit(self, to, subject, body, on_result=None):
+        """
+        Queues a plain-text message. Returns its id; on_result(mail_id,
+        status, error) is called from a sender thread once it is sent or
+        has failed. Raises queue.Full if the backlog is at capacity.
+        """
+        self.start()
+        message = EmailMessage()
+        message["From"] = self.sender
+        message["To"] = to
+        message["Subject"] = subject
+        message.set_content(body)
+
+        mail = OutgoingMail(next(self._ids), message, on_result)
+        self._queue.put_nowait(mail)
+        self._incr("queued")
+        return mail.id
+
+    def send(self, to, subject, body, timeout=None):
+        """
+        Queues a message and waits until it is sent. Raises MailDeliveryError
+        if it failed or wasn't sent within timeout seconds (default: long
+        enough for every connection attempt), and queue.Full like submit().
+        """
+        done = threading.Event()
+        outcome = {}
+
+        def on_result(mail_id, status, error):
+            outcome.update(status=status, error=error)
+            done.set()
+
+        self.submit(to, subject, body, on_result=on_result)
+        if not done.wait(timeout if timeout is not None else self.timeout * self.max_attempts * 2):
+            raise MailDeliveryError(f"Timed out sending mail to {to}")
+        if outcome["status"] != "sent":
+            raise MailDeliveryError(outcome["error"] or f"Failed to send mail to {to}")
+
+    def join(self):
+        """
+        Blocks until every queued message has been sent or has failed.
+        """
+        self._queue.join()
+
+    def _connect(self):
+        connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                connection.starttls(context=ssl.create_default_context())
+            if self.username and self.password:
+                connection.login(self.username, self.password)
+        except Exception:
+            connection.close()
+            raise
+        self._incr("connections_opened")
+        return connection
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.quit()
+        except Exception:
+            connection.close()
+
+    def _report(self, mail, status, error=None):
+        self._incr(status)
+        if mail.on_result is None:
+            return
+        try:
+            mail.on_result(mail.id, status, error)
+        except Exception as e:
+            print(f"Mail result callback failed for message {mail.id}: {e}")
+
+    def _send(self, connection, mail):
+        """
+        Sends one message, reconnecting and retrying on connection errors.
+        Returns the connection to keep using (None if it was dropped).
+        """
+        while True:
+            mail.attempts += 1
+            try:
+                if connection is None:
+                    connection = self._connect()
+                connection.send_message(mail.message)
+                self._report(mail, "sent")
+                return connection
+            except CONNECTION_ERRORS as e:
+                if connection is not None:
+                    connection.close()
+                    connection = None
+                if mail.attempts >= self.max_attempts:
+                    self._report(mail, "failed", str(e))
+                    return None
+                self._incr("retries")
+            except smtplib.SMTPException as e:
+                # Rejected recipient or content: retrying won't help, and the connection is still usable
+                self._report(mail, "failed", str(e))
+                return connection
+
+    def _work(self):
+        connection = None
+        while True:
+            try:
+                mail = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                if connection is not None:
+                    self._close(connection)
+                    connection = None
+                continue
+
+            batch = [mail]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._incr("batches")
+
+            for mail in batch:
+                try:
+                    connection = self._send(connection, mail)
+                except Exception as e:
+                    print(f"Unexpected error sending message {mail.id}: {e}")
+                    self._report(mail, "failed", str(e))
+                finally:
+                    self._queue.task_done()
+
+    def snapshot(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["backlog"] = self._queue.qsize()
+        return stats
+
+
+mail_dispatcher = MailDispatcher.from_env()
@@ -1,8 +1,110 @@
+# utils/model_loader.py
+"""
+Lazy access to the disease prediction model.
+
+Nothing is loaded at import time. The model is loaded on first use, or
+eagerly by preload() (app.py calls it when MODEL_PRELOAD=true, so a
+pre-forking server that loads the app before forking, e.g. gunicorn
+--preload, loads it once in the master). It is loaded with joblib's
+mmap_mode, so the numpy arrays inside an uncompressed joblib dump are
+memory-mapped from the file and shared between worker processes through
+the page cache instead of each worker holding a private copy. Compressed
+dumps can't be mapped and are loaded normally.
+
+Configuration:
+    MODEL_PATH        model file (default backend/models/final_model.pkl,
+                      independent of the working directory)
+    MODEL_MMAP_MODE   joblib mmap_mode (default "r"; "none" disables)
+    MODEL_PRELOAD     load and warm up at app start (default false)
+"""
+import os
+import threading
+import time
+
 import joblib
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_PATH = os.getenv("MODEL_PATH") or os.path.join(BACKEND_DIR, "models", "final_model.pkl")
+MODEL_MMAP_MODE = os.getenv("MODEL_MMAP_MODE", "r")
+
+
+class LazyModel:
+    def __init__(self, path, mmap_mode="r"):
+        self.path = path
+        self.mmap_mode = None if not mmap_mode or mmap_mode.lower() == "none" else mmap_mode
+        self._model = None
+        self._lock = threading.Lock()
+        self.stats = {
+            "loaded": False,
+            "load_ms": None,
+            "warm_up_ms": None,
+            "predict_calls": 0,
+            "predicted_rows": 0,
+            "predict_ms_total": 0.0,
+        }
+
+    def get(self):
+        """
+        Returns the model, loading it on first use.
+        """
+        model = self._model
+        if model is not None:
+            return model
+        with self._lock:
+            if self._model is None:
+                started = time.perf_counter()
+                self._model = joblib.load(self.path, mmap_mode=self.mmap_mode)
+                self.stats["load_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                self.stats["loaded"] = True
+            return self._model
+
+    def warm_up(self):
+        """
+        Runs one throwaway prediction so lazy initialisation inside the model
+        (and first-touch page faults on mapped arrays) don't land on a request.
+        """
+        model = self.get()
+        n_features = getattr(model, "n_features_in_", None)
+        if n_features is None:
+            return
+        started = time.perf_counter()
+        model.predict_proba(np.zeros((1, n_features)))
+        self.stats["warm_up_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    def preload(self, warm_up=True):
+        self.get()
+        if warm_up:
+            self.warm_up()
+
+    def predict(self, rows):
+        """
+        Returns (labels, confidences in percent) for a 2-D array of feature
+        rows, from a single predict_proba pass: the label is the class with
+        the highest probability, which is what predict() returns for the
+        classifiers we ship.
+        """
+        model = self.get()
+        started = time.perf_counter()
+        probabilities = model.predict_proba(np.asarray(rows))
+        best = probabilities.argmax(axis=1)
+        labels = model.classes_[best].tolist()  # numpy scalars -> str/int for Mongo and JSON
+        confidences = probabilities[np.arange(len(best)), best] * 100
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.stats["predict_calls"] += 1
+            self.stats["predicted_rows"] += len(best)
+            self.stats["predict_ms_total"] += elapsed_ms
+        return labels, confidences
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        total_ms = stats.pop("predict_ms_total")
+        stats["predict_ms_avg"] = round(total_ms / stats["predict_calls"], 3) if stats["predict_calls"] else None
+        stats["path"] = self.path
+        stats["mmap_mode"] = self.mmap_mode
+        return stats
 
-model = joblib.load("models/final_model.pkl")
 
-def predict_disease(features):
-    prediction = model.predict([features])[0]
-    confidence = max(model.predict_proba([features])[0]) * 100
-    return prediction, round(confidence, 2)
+model = LazyModel(MODEL_PATH, MODEL_MMAP_MODE)
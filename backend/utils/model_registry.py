@@ -0,0 +1,272 @@
+# utils/model_registry.py
+"""
+Versioned prediction models with hot swap and shadow evaluation.
+
+Versions are registered in model_versions ({"_id": "2024-06-rf", "path": ...,
+"sha256": ..., "description": ...}). A single pointer document in
+model_registry names the active version, plus an optional shadow version
+and the fraction of live rows it scores:
+
+    {"_id": "disease", "active": "2024-06-rf", "shadow": "2024-07-gb", "shadow_rate": 0.1}
+
+Each worker polls the pointer every MODEL_REGISTRY_POLL_SECONDS from a
+background thread. When it changes, the new version is loaded and warmed up
+off the request path, and then swapped in with a single reference
+assignment. Requests already running finish on the old model, new ones use
+the new model, and none of them pays the cold start. With no pointer
+document the registry serves the default model from utils/model_loader
+(MODEL_PATH) as version MODEL_VERSION.
+
+Shadow scoring runs on a one-thread executor after the live prediction has
+been returned. When that executor is busy, samples are dropped rather than
+queued. Agreement with the live model is $inc'ed onto the candidate's
+model_versions document, so stats add up across workers.
+
+Configuration:
+    MODEL_VERSION                version name of the MODEL_PATH fallback (default "default")
+    MODEL_REGISTRY_POLL_SECONDS  pointer poll interval (default 5)
+
+Manage versions with `flask model register|activate|shadow|list`.
+"""
+import datetime
+import hashlib
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import db
+from utils.model_loader import BACKEND_DIR, MODEL_MMAP_MODE, LazyModel, model as default_model
+
+REGISTRY_ID = "disease"
+DEFAULT_VERSION = os.getenv("MODEL_VERSION", "default")
+POLL_SECONDS = float(os.getenv("MODEL_REGISTRY_POLL_SECONDS", 5))
+# Shadow rows waiting to be scored before new samples are dropped
+SHADOW_BACKLOG = 64
+
+model_versions_collection = db.model_versions()
+model_registry_collection = db.model_registry()
+
+
+def resolve_model_path(path):
+    return path if os.path.isabs(path) else os.path.join(BACKEND_DIR, path)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    def __init__(self, poll_interval=POLL_SECONDS):
+        self.poll_interval = poll_interval
+        self._active = (DEFAULT_VERSION, default_model)
+        self._shadow = None  # (version, LazyModel, rate)
+        self._pointer = None
+        self._loaded = {}  # version -> LazyModel, for the versions currently in use
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._shadow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-shadow")
+        self._shadow_pending = 0
+        self._stats_lock = threading.Lock()
+        self.stats = {"swaps": 0, "load_errors": 0, "shadow_samples": 0, "shadow_dropped": 0}
+
+    def _incr(self, name, amount=1):
+        with self._stats_lock:
+            self.stats[name] += amount
+
+    def _load(self, version, versions):
+        """
+        Loads and warms up a registered version (reusing it if already loaded).
+        """
+        if version in self._loaded:
+            return self._loaded[version]
+        document = versions.find_one({"_id": version}, {"path": 1})
+        if document is None:
+            raise LookupError(f"Model version {version!r} is not registered")
+        model = LazyModel(resolve_model_path(document["path"]), MODEL_MMAP_MODE)
+        model.preload(warm_up=True)
+        return model
+
+    def refresh(self, database=None):
+        """
+        Reads the pointer and swaps in changed active/shadow versions. Loading
+        happens before the swap, so predictions never wait on it. database
+        overrides the shared client's database (see preload()).
+        """
+        registry_collection, versions = model_registry_collection, model_versions_collection
+        if database is not None:
+            registry_collection, versions = database[db.MODEL_REGISTRY], database[db.MODEL_VERSIONS]
+        with self._refresh_lock:
+            try:
+                pointer = registry_collection.find_one({"_id": REGISTRY_ID})
+                if pointer == self._pointer:
+                    return
+                if pointer and pointer.get("active"):
+                    active = (pointer["active"], self._load(pointer["active"], versions))
+                else:
+                    active = (DEFAULT_VERSION, default_model)
+
+                shadow = None
+                if pointer and pointer.get("shadow") and pointer.get("shadow_rate", 0) > 0:
+                    shadow_version = pointer["shadow"]
+                    if shadow_version != active[0]:
+                        shadow = (shadow_version, self._load(shadow_version, versions), pointer["shadow_rate"])
+            except Exception as e:
+                # Keep serving the current model; the next poll retries
+                self._incr("load_errors")
+                print(f"Model registry refresh failed: {e}")
+                return
+
+            if active[0] != self._active[0]:
+                self._incr("swaps")
+            self._active = active
+            self._shadow = shadow
+            self._loaded = {version: model for version, model, *_ in filter(None, [active, shadow])}
+            self._pointer = pointer
+
+    def start(self):
+        """
+        Loads the current pointer and starts polling it, once per process
+        (threads don't survive fork()).
+        """
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self.refresh()
+            self._pid = os.getpid()
+            threading.Thread(target=self._poll, daemon=True).start()
+
+    def _poll(self):
+        while True:
+            time.sleep(self.poll_interval)
+            self.refresh()
+
+    def preload(self):
+        """
+        Loads and warms up the active version at app start. The pointer is
+        read on a short-lived client so the shared pool isn't opened before a
+        pre-forking server forks; workers then find the pointer unchanged and
+        keep the preloaded model.
+        """
+        client = db.create_client(event_listeners=[])
+        try:
+            self.refresh(db.get_db(client))
+        finally:
+            client.close()
+        self._active[1].preload(warm_up=True)
+
+    def active(self):
+        """
+        Returns (version, LazyModel) of the model serving live traffic.
+        """
+        self.start()
+        return self._active
+
+    def predict(self, rows):
+        """
+        Returns (labels, confidences, version) from the active model, and
+        samples rows for the shadow model if one is configured.
+        """
+        version, model = self.active()
+        labels, confidences = model.predict(rows)
+        shadow = self._shadow
+        if shadow is not None:
+            self._sample_for_shadow(shadow, rows, labels, confidences)
+        return labels, confidences, version
+
+    def _sample_for_shadow(self, shadow, rows, labels, confidences):
+        picked = [i for i in range(len(labels)) if random.random() < shadow[2]]
+        if not picked:
+            return
+        with self._stats_lock:
+            if self._shadow_pending + len(picked) > SHADOW_BACKLOG:
+                self.stats["shadow_dropped"] += len(picked)
+                return
+            self._shadow_pending += len(picked)
+        sample = (
+            [rows[i] for i in picked],
+            [labels[i] for i in picked],
+            [float(confidences[i]) for i in picked],
+        )
+        self._shadow_executor.submit(self._score_shadow, shadow, *sample)
+
+    def _score_shadow(self, shadow, rows, live_labels, live_confidences):
+        version, model, _ = shadow
+        started = time.perf_counter()
+        update = {"shadow.samples": len(rows)}
+        try:
+            labels, confidences = model.predict(rows)
+            update["shadow.agreements"] = sum(a == b for a, b in zip(labels, live_labels))
+            update["shadow.confidence_delta_total"] = float(sum(confidences) - sum(live_confidences))
+        except Exception as e:
+            print(f"Shadow model {version} failed: {e}")
+            update["shadow.errors"] = len(rows)
+        update["shadow.latency_ms_total"] = (time.perf_counter() - started) * 1000
+        try:
+            model_versions_collection.update_one({"_id": version}, {"$inc": update})
+        except Exception as e:
+            print(f"Error recording shadow stats for {version}: {e}")
+        with self._stats_lock:
+            self._shadow_pending -= len(rows)
+            self.stats["shadow_samples"] += len(rows)
+
+    def snapshot(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["active_version"] = self._active[0]
+        shadow = self._shadow
+        stats["shadow_version"] = shadow[0] if shadow else None
+        stats["shadow_rate"] = shadow[2] if shadow else 0
+        return stats
+
+
+def register_version(version, path, description=""):
+    """
+    Records a model file as a new version. The path is stored as given
+    (relative paths resolve against backend/).
+    """
+    full_path = resolve_model_path(path)
+    if not os.path.exists(full_path):
+        raise FileNotFoundError(full_path)
+    model_versions_collection.insert_one({
+        "_id": version,
+        "path": path,
+        "sha256": file_sha256(full_path),
+        "size": os.path.getsize(full_path),
+        "description": description,
+        "created_at": datetime.datetime.utcnow(),
+    })
+
+
+def _update_pointer(update):
+    update["updated_at"] = datetime.datetime.utcnow()
+    model_registry_collection.update_one({"_id": REGISTRY_ID}, {"$set": update}, upsert=True)
+
+
+def activate_version(version):
+    if not model_versions_collection.count_documents({"_id": version}, limit=1):
+        raise LookupError(f"Model version {version!r} is not registered")
+    _update_pointer({"active": version})
+
+
+def set_shadow(version, rate):
+    if version is not None and not model_versions_collection.count_documents({"_id": version}, limit=1):
+        raise LookupError(f"Model version {version!r} is not registered")
+    _update_pointer({"shadow": version, "shadow_rate": rate if version else 0})
+
+
+def list_versions():
+    pointer = model_registry_collection.find_one({"_id": REGISTRY_ID}) or {}
+    versions = list(model_versions_collection.find().sort("created_at", -1))
+    return pointer, versions
+
+
+registry = ModelRegistry()
@@ -0,0 +1,126 @@
+# utils/pagination.py
+"""
+Keyset (cursor) pagination shared by every list endpoint.
+
+Pages are fetched with a range condition on the sort key plus _id as a
+tie-breaker, so page N costs one index seek just like page 1, instead of
+skipping over N * limit documents. The "next" token handed to clients is an
+opaque base64 encoding of the last document's sort values.
+
+List responses keep their existing items key and add a "page" object:
+
+    {"reports": [...], "page": {"limit": 50, "next": "eyJ2Ijog..."}}
+
+"next" is null on the last page; clients pass it back as ?cursor=<token>.
+"""
+import base64
+import binascii
+import datetime
+import json
+
+from bson import json_util
+from bson.objectid import ObjectId
+from flask import request
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+
+# Sort values a cursor may carry (None for a missing field)
+CURSOR_VALUE_TYPES = (type(None), bool, int, float, str, ObjectId, datetime.datetime)
+
+
+class PaginationError(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    raw = json_util.dumps(values).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json_util.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (binascii.Error, ValueError, UnicodeError, json.JSONDecodeError):
+        raise PaginationError("Invalid cursor")
+    # Only plain values we could have encoded; json_util also decodes
+    # {"$regex": ...} and friends, and dicts would pass operators into the query
+    if not isinstance(values, list) or not all(isinstance(value, CURSOR_VALUE_TYPES) for value in values):
+        raise PaginationError("Invalid cursor")
+    return values
+
+
+def page_args(default_limit=DEFAULT_PAGE_SIZE, max_limit=MAX_PAGE_SIZE):
+    """
+    Reads ?limit= and ?cursor= from the request. The limit is clamped to
+    max_limit. Returns (limit, cursor_token_or_None).
+    """
+    raw_limit = request.args.get("limit")
+    if raw_limit is None:
+        limit = default_limit
+    else:
+        try:
+            limit = int(raw_limit)
+        except ValueError:
+            raise PaginationError("limit must be an integer")
+        if limit < 1:
+            raise PaginationError("limit must be positive")
+    return min(limit, max_limit), request.args.get("cursor") or None
+
+
+def _keyset_clause(sort, values):
+    """
+    Builds the "strictly after the cursor" condition for a compound sort:
+    (k0 > v0) OR (k0 == v0 AND k1 > v1) OR ...
+    """
+    branches = []
+    for i, (field, direction) in enumerate(sort):
+        after = _after(field, direction, values[i])
+        if after is not None:
+            branches.append({**{sort[j][0]: values[j] for j in range(i)}, **after})
+    return {"$or": branches}
+
+
+def _after(field, direction, value):
+    """
+    Condition for field sorting strictly after value. MongoDB sorts null and
+    missing values before everything else, and $gt/$lt never match null,
+    so both ends need spelling out. Returns None if nothing can follow.
+    """
+    if direction > 0:
+        return {field: {"$ne": None}} if value is None else {field: {"$gt": value}}
+    if value is None:
+        # Descending: only other nulls sort after null, and the next sort field orders those
+        return None
+    return {"$or": [{field: {"$lt": value}}, {field: None}]}
+
+
+def paginate(collection, query, sort, projection=None, limit=DEFAULT_PAGE_SIZE, cursor=None, unique_sort=False):
+    """
+    Returns (documents, next_cursor) for one page. sort is a list of
+    (field, direction); _id is appended as a tie-breaker when missing unless
+    unique_sort says the sort fields are already unique. The projection must
+    keep the sort fields (and _id when it is the tie-breaker).
+    """
+    sort = list(sort)
+    if not unique_sort and sort[-1][0] != "_id":
+        sort.append(("_id", sort[-1][1]))
+
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(sort):
+            raise PaginationError("Invalid cursor")
+        query = {"$and": [query, _keyset_clause(sort, values)]} if query else _keyset_clause(sort, values)
+
+    documents = list(collection.find(query, projection).sort(sort).limit(limit + 1))
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = encode_cursor([documents[-1].get(field) for field, _ in sort])
+    return documents, next_cursor
+
+
+def page_info(limit, next_cursor):
+    return {"limit": limit, "next": next_cursor}
@@ -1,7 +1,7 @@
 from fpdf import FPDF
 import os
 
-def generate_report(data, filename):
+def _build_pdf(data):
     pdf = FPDF()
     pdf.add_page()
     pdf.set_font("Arial", size=12)
@@ -11,8 +11,19 @@ def generate_report(data, filename):
 
     for key, value in data.items():
         pdf.cell(200, 10, txt=f"{key}: {value}", ln=True)
+    return pdf
 
+def generate_report(data, filename):
+    pdf = _build_pdf(data)
     path = f"reports/{filename}.pdf"
     os.makedirs("reports", exist_ok=True)
     pdf.output(path)
     return path
+
+def render_report(data):
+    """
+    Renders the report in memory and returns the PDF bytes.
+    """
+    output = _build_pdf(data).output(dest="S")
+    # PyFPDF returns a latin-1 str, fpdf2 a bytearray
+    return output.encode("latin-1") if isinstance(output, str) else bytes(output)
@@ -0,0 +1,237 @@
+# utils/prediction_cache.py
+"""
+Memoized disease predictions.
+
+Symptom inputs encode to short 0/1 vectors over a fixed vocabulary, so the
+same combinations come up over and over. Results are cached under the model
+version plus a compact key for the feature vector: the bit-packed vector
+when it is binary (exact, a few bytes), otherwise a 16-byte blake2b digest
+of its float32 bytes.
+
+The first level is a per-process LRU (utils/cache.TTLCache). When
+PREDICTION_CACHE_PATH is set, a SQLite file in WAL mode sits behind it as a
+second level shared by every worker on the host. A worker that misses in
+memory but finds the row on disk promotes it to its own LRU. The disk store
+is bounded by PREDICTION_CACHE_DISK_MAX_ROWS and drops its oldest rows
+first. Cache errors are counted and treated as misses; they never fail a
+prediction.
+
+Every key includes the model version, so entries from an older model can
+never be served. The first lookup after the registry swaps versions also
+clears this worker's LRU and deletes the other versions' rows from disk.
+Cache hits skip the model entirely, so only misses are shadow-scored.
+
+Configuration:
+    PREDICTION_CACHE_SIZE           in-memory entries per worker (default 10000, 0 disables)
+    PREDICTION_CACHE_TTL_SECONDS    in-memory entry lifetime (default 24 hours)
+    PREDICTION_CACHE_PATH           SQLite file shared by workers (default unset: memory only)
+    PREDICTION_CACHE_DISK_MAX_ROWS  rows kept in the SQLite file (default 100000)
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+from utils.cache import TTLCache
+from utils.inference_scheduler import scheduler
+from utils.model_registry import registry
+
+# Writes between prunes of the disk store
+DISK_PRUNE_EVERY = 1000
+
+
+def feature_key(row):
+    row = np.asarray(row, dtype=np.float32).ravel()
+    if ((row == 0) | (row == 1)).all():
+        return len(row).to_bytes(2, "big") + np.packbits(row.astype(np.uint8)).tobytes()
+    return b"h" + hashlib.blake2b(row.tobytes(), digest_size=16).digest()
+
+
+class DiskStore:
+    """
+    SQLite-backed second level shared between worker processes. Connections
+    are per thread and per process (sqlite connections can't cross fork()).
+    """
+
+    def __init__(self, path, max_rows=100000):
+        self.path = path
+        self.max_rows = max_rows
+        self._local = threading.local()
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and self._local.pid == os.getpid():
+            return connection
+        connection = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS prediction_cache ("
+            " version TEXT NOT NULL, key BLOB NOT NULL, label TEXT NOT NULL, confidence REAL NOT NULL,"
+            " PRIMARY KEY (version, key))"
+        )
+        self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    def get(self, version, key):
+        row = self._connection().execute(
+            "SELECT label, confidence FROM prediction_cache WHERE version = ? AND key = ?", (version, key)
+        ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def put_many(self, version, items):
+        """
+        Stores [(key, label, confidence), ...] for version.
+        """
+        connection = self._connection()
+        connection.executemany(
+            "INSERT OR REPLACE INTO prediction_cache (version, key, label, confidence) VALUES (?, ?, ?, ?)",
+            [(version, key, json.dumps(label), confidence) for key, label, confidence in items],
+        )
+        with self._lock:
+            self._writes += len(items)
+            prune = self._writes >= DISK_PRUNE_EVERY
+            if prune:
+                self._writes = 0
+        if prune:
+            connection.execute(
+                "DELETE FROM prediction_cache WHERE rowid <= (SELECT MAX(rowid) FROM prediction_cache) - ?",
+                (self.max_rows,),
+            )
+
+    def purge_other_versions(self, version):
+        self._connection().execute("DELETE FROM prediction_cache WHERE version != ?", (version,))
+
+
+class PredictionCache:
+    def __init__(self, maxsize=10000, ttl=24 * 3600.0, disk=None):
+        self.enabled = maxsize > 0
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._disk = disk
+        self._version = None
+        self._lock = threading.Lock()
+        self.stats = {
+            "hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "invalidations": 0,
+            "disk_errors": 0,
+        }
+
+    def _incr(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def _current_version(self):
+        """
+        Returns the active model version, dropping cached results of any
+        other version the first time a swap is seen.
+        """
+        version, _ = registry.active()
+        if version == self._version:
+            return version
+        with self._lock:
+            if version == self._version:
+                return version
+            changed = self._version is not None
+            self._version = version
+        if changed:
+            self._cache.clear()
+            self._incr("invalidations")
+            if self._disk is not None:
+                try:
+                    self._disk.purge_other_versions(version)
+                except sqlite3.Error as e:
+                    self._incr("disk_errors")
+                    print(f"Error purging prediction cache: {e}")
+        return version
+
+    def _lookup(self, version, key):
+        result = self._cache.get((version, key))
+        if result is not None:
+            self._incr("hits")
+            return result
+        if self._disk is not None:
+            try:
+                result = self._disk.get(version, key)
+            except sqlite3.Error as e:
+                self._incr("disk_errors")
+                print(f"Error reading prediction cache: {e}")
+            if result is not None:
+                self._cache.set((version, key), result)
+                self._incr("disk_hits")
+                return result
+        self._incr("misses")
+        return None
+
+    def _store(self, version, items):
+        for key, label, confidence in items:
+            self._cache.set((version, key), (label, confidence))
+        if self._disk is not None and items:
+            try:
+                self._disk.put_many(version, items)
+            except sqlite3.Error as e:
+                self._incr("disk_errors")
+                print(f"Error writing prediction cache: {e}")
+
+    def predict(self, features):
+        """
+        Returns (label, confidence, model version, cache status) for one
+        feature vector. Misses go through the micro-batching scheduler.
+        """
+        if not self.enabled:
+            return (*scheduler.predict(features), "bypass")
+        version = self._current_version()
+        key = feature_key(features)
+        result = self._lookup(version, key)
+        if result is not None:
+            return (*result, version, "hit")
+        label, confidence, version = scheduler.predict(features)
+        self._store(version, [(key, label, confidence)])
+        return label, confidence, version, "miss"
+
+    def predict_rows(self, rows):
+        """
+        Batch form: returns (labels, confidences, model version) for a 2-D
+        array, running the model once over just the rows that missed.
+        """
+        if not self.enabled:
+            return registry.predict(rows)
+        version = self._current_version()
+        keys = [feature_key(row) for row in rows]
+        results = [self._lookup(version, key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            labels, confidences, predicted_version = registry.predict(np.asarray(rows)[missing])
+            if predicted_version != version:
+                # The model was swapped between lookup and predict; don't mix versions
+                return registry.predict(rows)
+            items = []
+            for i, label, confidence in zip(missing, labels, confidences):
+                results[i] = (label, round(float(confidence), 2))
+                items.append((keys[i], *results[i]))
+            self._store(version, items)
+        return [label for label, _ in results], [confidence for _, confidence in results], version
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits"] + stats["disk_hits"]) / lookups, 4) if lookups else None
+        stats["entries"] = len(self._cache)
+        stats["version"] = self._version
+        stats["disk_path"] = self._disk.path if self._disk is not None else None
+        return stats
+
+
+_disk_path = os.getenv("PREDICTION_CACHE_PATH")
+prediction_cache = PredictionCache(
+    maxsize=int(os.getenv("PREDICTION_CACHE_SIZE", 10000)),
+    ttl=float(os.getenv("PREDICTION_CACHE_TTL_SECONDS", 24 * 3600)),
+    disk=DiskStore(_disk_path, int(os.getenv("PREDICTION_CACHE_DISK_MAX_ROWS", 100000))) if _disk_path else None,
+)
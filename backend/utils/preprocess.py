@@ -1,5 +1,32 @@
+import numpy as np
+
+from utils.symptom_vocabulary import vocabulary
+
+# Model feature columns, in order (from data/symptom_vocabulary.json)
+all_symptoms = vocabulary.columns
+
 def preprocess_symptoms(symptoms: list[str]) -> list[float]:
-    # Example: Convert symptoms to one-hot or use your encoder
-    # Replace this with real logic
-    all_symptoms = ["fever", "cough", "headache", "fatigue"]
-    return [1 if s in symptoms else 0 for s in all_symptoms]
+    # Terms are normalized and resolved through the vocabulary index, so
+    # "Fever ", "feverish" and "fevr" all set the fever column
+    row = [0] * len(all_symptoms)
+    for column in vocabulary.encode_indices(symptoms):
+        row[column] = 1
+    return row
+
+def encode_symptom_batch(symptom_lists: list[list[str]], sparse: bool = False):
+    """
+    Encodes many symptom lists into one (rows x symptoms) 0/1 matrix, with
+    the same columns as preprocess_symptoms. Each term is a dict lookup, and
+    the matrix is filled with a single vectorized assignment. sparse=True
+    returns a scipy CSR matrix instead, for models that accept one.
+    """
+    if sparse:
+        return vocabulary.encode_sparse(symptom_lists)
+    rows, columns = [], []
+    for row, symptoms in enumerate(symptom_lists):
+        for column in vocabulary.encode_indices(symptoms):
+            rows.append(row)
+            columns.append(column)
+    matrix = np.zeros((len(symptom_lists), len(all_symptoms)), dtype=np.float32)
+    matrix[rows, columns] = 1
+    return matrix
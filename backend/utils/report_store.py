@@ -0,0 +1,258 @@
+# utils/report_store.py
+"""
+Binary storage for uploaded medical reports.
+
+Report files live in a GridFS bucket as fixed-size binary chunks instead of
+base64 strings inside medical_reports documents. Files are deduplicated by
+SHA-256: uploading the same bytes twice stores them once. Each file counts
+the reports using it in metadata.refs. A reused file gets an atomic $inc
+that only matches while refs > 0, and a file is deleted once its count is
+decremented to 0. A file at 0 can't gain new references, so a concurrent
+upload of the same bytes stores a fresh copy instead of pointing at a file
+that is about to go. Files stored before the count existed have no refs:
+they are never reused, and are deleted once no report references them.
+
+Uploads can arrive either as a base64 data URI in JSON (store_report_file)
+or as multipart/form-data streamed straight into GridFS through a
+StreamingReportWriter, which hashes, size-checks and type-sniffs the bytes
+as they arrive so only one chunk is ever held in memory.
+"""
+import base64
+import binascii
+import hashlib
+import os
+
+import gridfs
+from gridfs.errors import NoFile
+from pymongo import ReturnDocument
+
+from utils import db
+
+REPORT_BUCKET = "report_files"
+CHUNK_SIZE = 255 * 1024
+
+MAX_REPORT_BYTES = int(os.getenv("REPORT_MAX_BYTES", 20 * 1024 * 1024))
+
+# Leading bytes of each accepted file type; the declared MIME type is never trusted
+FILE_SIGNATURES = [
+    (b"%PDF-", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+]
+SNIFF_BYTES = 16
+MIME_ALIASES = {"image/jpg": "image/jpeg", "image/pjpeg": "image/jpeg"}
+
+report_files = gridfs.GridFSBucket(db.get_db(), bucket_name=REPORT_BUCKET, chunk_size_bytes=CHUNK_SIZE)
+report_files_collection = db.get_collection(f"{REPORT_BUCKET}.files")
+medical_reports_collection = db.medical_reports()
+
+
+def decode_data_uri(data_uri, mime_type):
+    """
+    Decodes "data:<mime>;base64,<payload>" into bytes. Returns None if the
+    prefix doesn't match mime_type or the payload isn't valid base64.
+    """
+    prefix = f"data:{mime_type};base64,"
+    if not data_uri.startswith(prefix):
+        return None
+    try:
+        return base64.b64decode(data_uri[len(prefix):], validate=True)
+    except (binascii.Error, ValueError):
+        return None
+
+
+class ReportUploadError(Exception):
+    """
+    Raised when an upload is rejected; status is the HTTP code to return.
+    """
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def sniff_mime_type(head):
+    """
+    Detects the file type from its first bytes. Returns None if unsupported.
+    """
+    for signature, mime_type in FILE_SIGNATURES:
+        if head.startswith(signature):
+            return mime_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:8] == b"ftyp" and head[8:12] in (b"heic", b"heix", b"mif1", b"heif"):
+        return "image/heic"
+    return None
+
+
+def normalize_mime_type(mime_type):
+    mime_type = (mime_type or "").split(";")[0].strip().lower()
+    return MIME_ALIASES.get(mime_type, mime_type)
+
+
+def acquire_file_by_hash(sha256):
+    """
+    Takes a reference to a live stored file with this content. Returns the
+    file document (_id, length), or None if there is none.
+    """
+    return report_files_collection.find_one_and_update(
+        {"metadata.sha256": sha256, "metadata.refs": {"$gt": 0}},
+        {"$inc": {"metadata.refs": 1}},
+        projection={"_id": 1, "length": 1}
+    )
+
+
+def store_report_file(data, mime_type, filename="report"):
+    """
+    Stores report bytes, reusing an existing file with the same content.
+    Returns (file_id, sha256, length); the caller owns one reference and
+    must release_report_file() it if no report ends up using the file.
+    """
+    sha256 = hashlib.sha256(data).hexdigest()
+    existing = acquire_file_by_hash(sha256)
+    if existing:
+        return existing["_id"], sha256, existing["length"]
+
+    file_id = report_files.upload_from_stream(
+        filename,
+        data,
+        metadata={"sha256": sha256, "content_type": mime_type, "refs": 1},
+    )
+    return file_id, sha256, len(data)
+
+
+class StreamingReportWriter:
+    """
+    Write-only file object handed to werkzeug's multipart parser as the
+    destination of an uploaded part. Bytes go straight into a GridFS upload
+    stream, which flushes every CHUNK_SIZE bytes, while the SHA-256, size
+    limit and content type are checked on the fly.
+    """
+
+    def __init__(self, filename, max_bytes=MAX_REPORT_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.mime_type = None
+        self._head = b""
+        self._sha256 = hashlib.sha256()
+        self._upload = report_files.open_upload_stream(filename or "report")
+        self._done = False
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise ReportUploadError(f"File exceeds the {self.max_bytes} byte limit", 413)
+        if self.mime_type is None and len(self._head) < SNIFF_BYTES:
+            self._head += data[:SNIFF_BYTES - len(self._head)]
+            if len(self._head) >= SNIFF_BYTES:
+                self._check_type()
+        self._sha256.update(data)
+        self._upload.write(data)
+        return len(data)
+
+    def seek(self, offset, whence=0):
+        # The parser rewinds the part once it is complete; nothing to do here
+        return 0
+
+    def _check_type(self):
+        self.mime_type = sniff_mime_type(self._head)
+        if self.mime_type is None:
+            raise ReportUploadError("Unsupported file type", 415)
+
+    def finish(self):
+        """
+        Completes the upload. If identical content is already stored the new
+        copy is discarded. Returns (file_id, sha256, length, mime_type), with
+        one reference owned by the caller as for store_report_file().
+        """
+        if self.mime_type is None:
+            self._check_type()
+        sha256 = self._sha256.hexdigest()
+        existing = acquire_file_by_hash(sha256)
+        self._done = True
+        if existing:
+            self._upload.abort()
+            return existing["_id"], sha256, existing["length"], self.mime_type
+
+        self._upload.close()
+        report_files_collection.update_one(
+            {"_id": self._upload._id},
+            {"$set": {"metadata": {"sha256": sha256, "content_type": self.mime_type, "refs": 1}}}
+        )
+        return self._upload._id, sha256, self.size, self.mime_type
+
+    def abort(self):
+        if not self._done:
+            self._done = True
+            self._upload.abort()
+
+
+def open_report_file(file_id):
+    """
+    Returns a seekable GridOut for the file, or None if it doesn't exist.
+    """
+    try:
+        return report_files.open_download_stream(file_id)
+    except NoFile:
+        return None
+
+
+def release_report_file(file_id):
+    """
+    Drops one reference to a stored file and deletes it once the last one
+    is gone.
+    """
+    if file_id is None:
+        return
+    counted = report_files_collection.find_one_and_update(
+        {"_id": file_id, "metadata.refs": {"$exists": True}},
+        {"$inc": {"metadata.refs": -1}},
+        projection={"metadata.refs": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if counted is not None:
+        if counted["metadata"]["refs"] > 0:
+            return
+    elif medical_reports_collection.count_documents({"file_id": file_id}, limit=1):
+        # Uncounted (older) files are never reused, so this check can't race with an upload
+        return
+    try:
+        report_files.delete(file_id)
+    except NoFile:
+        pass
+
+
+def migrate_base64_reports(batch_size=50):
+    """
+    Moves legacy base64_file_content payloads into GridFS. Safe to re-run;
+    returns the number of reports migrated.
+    """
+    migrated = 0
+    legacy_query = {"base64_file_content": {"$exists": True}, "file_id": {"$exists": False}}
+    while True:
+        batch = list(medical_reports_collection.find(legacy_query).limit(batch_size))
+        if not batch:
+            return migrated
+        for report in batch:
+            data = decode_data_uri(report["base64_file_content"], report.get("file_mime_type", ""))
+            if data is None:
+                # Leave undecodable payloads in place but stop retrying them
+                medical_reports_collection.update_one(
+                    {"_id": report["_id"]},
+                    {"$set": {"file_id": None, "migration_error": "invalid base64 payload"}}
+                )
+                continue
+            file_id, sha256, length = store_report_file(data, report["file_mime_type"], report.get("report_name", "report"))
+            medical_reports_collection.update_one(
+                {"_id": report["_id"]},
+                {
+                    "$set": {"file_id": file_id, "file_sha256": sha256, "file_size": length},
+                    "$unset": {"base64_file_content": ""},
+                }
+            )
+            migrated += 1
@@ -0,0 +1,148 @@
+# utils/response_cache.py
+"""
+Response cache for Gemini generateContent calls.
+
+Entries are keyed on the normalized last user prompt (case, whitespace and
+trailing punctuation folded) plus a fingerprint of everything else sent to
+the model: earlier turns, system instruction and model name. So "What are
+symptoms of diabetes?" and "what are  symptoms of diabetes" share an entry,
+but the same question inside a different conversation history does not.
+
+Only requests without personal context are cached by default: first turns
+with no earlier messages or summary. A conversation created with
+"cache_responses": true opts into caching every turn. Concurrent identical
+misses are coalesced so only one of them goes upstream.
+
+Configuration:
+    AI_RESPONSE_CACHE_SIZE         max entries (default 1024)
+    AI_RESPONSE_CACHE_MAX_BYTES    max total size of cached replies (default 16 MB)
+    AI_RESPONSE_CACHE_TTL_SECONDS  entry lifetime (default 6 hours)
+    AI_RESPONSE_CACHE_FIRST_TURNS  cache context-free first turns (default true)
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from utils.cache import SingleFlight, TTLCache
+from utils.llm_client import gemini_client
+
+FIRST_TURNS = os.getenv("AI_RESPONSE_CACHE_FIRST_TURNS", "true").lower() == "true"
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s?!.]+$")
+
+
+def normalize_prompt(text):
+    return _TRAILING_PUNCTUATION.sub("", _WHITESPACE.sub(" ", text).strip().lower())
+
+
+def _entry_size(entry):
+    return len(json.dumps(entry["result"]))
+
+
+class ResponseCache:
+    def __init__(self, maxsize=1024, maxbytes=16 * 1024 * 1024, ttl=6 * 3600.0, client=gemini_client):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl, maxbytes=maxbytes, sizeof=_entry_size)
+        self._flight = SingleFlight()
+        self._client = client
+        self._lock = threading.Lock()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "bypassed": 0,
+            "saved_ms": 0.0,
+            "saved_tokens": 0,
+        }
+
+    def _incr(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def key(self, contents, options):
+        """
+        Returns the cache key for a generateContent request.
+        """
+        last = contents[-1]
+        prompt = normalize_prompt(" ".join(part.get("text", "") for part in last["parts"]))
+        context = json.dumps([self._client.model, contents[:-1], options], sort_keys=True)
+        fingerprint = hashlib.sha256(context.encode("utf-8")).hexdigest()
+        return hashlib.sha256(f"{prompt}\0{fingerprint}".encode("utf-8")).hexdigest()
+
+    def should_cache(self, conversation, contents, options):
+        if conversation.get("cache_responses"):
+            return True
+        # A first turn carries no history or summary, so its reply isn't personal
+        return FIRST_TURNS and len(contents) == 1 and not options
+
+    def _record_hit(self, entry, status):
+        self._incr(status)
+        self._incr("saved_ms", entry["latency_ms"])
+        self._incr("saved_tokens", entry["tokens"])
+
+    def lookup(self, key):
+        """
+        Returns a cached result or None, counting the hit.
+        """
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        self._record_hit(entry, "hits")
+        return entry["result"]
+
+    def store(self, key, result, latency_ms=0.0):
+        usage = result.get("usageMetadata") or {}
+        self._cache.set(key, {
+            "result": result,
+            "latency_ms": latency_ms,
+            "tokens": usage.get("totalTokenCount", 0),
+        })
+
+    def generate(self, contents, options, cacheable):
+        """
+        gemini_client.generate with caching. Returns (result, status) where
+        status is "hit", "coalesced", "miss" or "bypass".
+        """
+        if not cacheable:
+            self._incr("bypassed")
+            return self._client.generate(contents, **options), "bypass"
+
+        key = self.key(contents, options)
+        result = self.lookup(key)
+        if result is not None:
+            return result, "hit"
+
+        def call():
+            started = time.perf_counter()
+            result = self._client.generate(contents, **options)
+            entry = {"result": result, "latency_ms": (time.perf_counter() - started) * 1000}
+            self.store(key, result, entry["latency_ms"])
+            return entry
+
+        entry, shared = self._flight.do(key, call)
+        if shared:
+            usage = entry["result"].get("usageMetadata") or {}
+            self._record_hit({**entry, "tokens": usage.get("totalTokenCount", 0)}, "coalesced")
+            return entry["result"], "coalesced"
+        self._incr("misses")
+        return entry["result"], "miss"
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["coalesced"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits"] + stats["coalesced"]) / lookups, 4) if lookups else 0.0
+        stats["saved_ms"] = round(stats["saved_ms"], 1)
+        stats["entries"] = len(self._cache)
+        stats["bytes"] = self._cache.bytes
+        return stats
+
+
+response_cache = ResponseCache(
+    maxsize=int(os.getenv("AI_RESPONSE_CACHE_SIZE", 1024)),
+    maxbytes=int(os.getenv("AI_RESPONSE_CACHE_MAX_BYTES", 16 * 1024 * 1024)),
+    ttl=float(os.getenv("AI_RESPONSE_CACHE_TTL_SECONDS", 6 * 3600)),
+)
@@ -0,0 +1,158 @@
+# utils/revocation_cache.py
+"""
+Per-process cache of revoked JWT ids.
+
+Revocations are rare, so almost every authenticated request is checking a
+token that was never revoked. A Bloom filter answers that "definitely not
+revoked" case without touching MongoDB; a bounded TTL cache holds the exact
+revoked jtis with their expiry. Only a Bloom hit that the TTL cache can't
+confirm (an evicted entry or a false positive) falls back to a find_one.
+
+The cache is kept in sync by polling the blacklist for entries newer than a
+high-water mark at most once every poll_interval seconds, and rebuilt from
+scratch every resync_interval seconds so expired jtis drop out of the Bloom
+filter. A token revoked by another worker is therefore honoured here after
+at most poll_interval seconds; revocations made by this worker apply at once.
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+
+from utils.cache import TTLCache
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings using double hashing.
+    """
+
+    def __init__(self, capacity=10000, error_rate=0.001):
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class RevocationCache:
+    """
+    Answers "is this jti revoked?" from memory, refreshing from the
+    token_blacklist collection incrementally.
+    """
+
+    # Entries written by other workers may carry slightly older timestamps
+    # than ones we've already seen, so each poll looks back this far.
+    CLOCK_SKEW = timedelta(seconds=5)
+
+    def __init__(self, collection, capacity=10000, poll_interval=5.0, resync_interval=900.0):
+        self.collection = collection
+        self.capacity = capacity
+        self.poll_interval = poll_interval
+        self.resync_interval = resync_interval
+        self._entries = TTLCache(maxsize=capacity)
+        self._bloom = BloomFilter(capacity)
+        self._high_water = None
+        self._last_poll = 0.0
+        self._last_resync = 0.0
+        self._refresh_lock = threading.Lock()
+        self.stats = {"lookups": 0, "bloom_negative": 0, "cache_hits": 0, "db_fallbacks": 0, "refreshes": 0}
+
+    def _remember(self, jti, expires, bloom=None, entries=None):
+        bloom = bloom if bloom is not None else self._bloom
+        entries = entries if entries is not None else self._entries
+        ttl = (expires - datetime.utcnow()).total_seconds() if expires else self.resync_interval
+        if ttl > 0:
+            bloom.add(jti)
+            entries.set(jti, expires, ttl=ttl)
+
+    def _load(self, query, bloom=None, entries=None):
+        newest = self._high_water if entries is None else None
+        projection = {"jti": 1, "expires": 1, "blacklisted_at": 1, "_id": 0}
+        for entry in self.collection.find(query, projection):
+            self._remember(entry["jti"], entry.get("expires"), bloom, entries)
+            blacklisted_at = entry.get("blacklisted_at")
+            if blacklisted_at and (newest is None or blacklisted_at > newest):
+                newest = blacklisted_at
+        return newest
+
+    def _resync(self):
+        # Build the new state off to the side so a failed load leaves the old one intact
+        now = datetime.utcnow()
+        # Entries written before "expires" existed never expire here; `flask db
+        # backfill-token-expiry` dates them so the TTL index can drop them
+        live = {"$or": [{"expires": {"$gt": now}}, {"expires": {"$exists": False}}]}
+        active = self.collection.count_documents(live)
+        bloom = BloomFilter(max(self.capacity, active * 2))
+        entries = TTLCache(maxsize=self.capacity)
+        high_water = self._load(live, bloom, entries) or now
+        self._bloom, self._entries, self._high_water = bloom, entries, high_water
+
+    def refresh(self, force=False):
+        """
+        Pulls new blacklist entries if the poll interval has elapsed. Only one
+        thread refreshes at a time; others keep answering from the old state,
+        except before the first load, when they wait for it.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_poll < self.poll_interval:
+            return
+        loaded = self._last_resync != 0.0
+        if not self._refresh_lock.acquire(blocking=force or not loaded):
+            return
+        try:
+            if not force and now - self._last_poll < self.poll_interval:
+                return
+            if not self._last_resync or now - self._last_resync >= self.resync_interval:
+                self._resync()
+                self._last_resync = now
+            else:
+                since = self._high_water - self.CLOCK_SKEW
+                self._high_water = self._load({"blacklisted_at": {"$gte": since}})
+            self._last_poll = now
+            self.stats["refreshes"] += 1
+        except Exception as e:
+            if not self._last_resync:
+                # Nothing loaded yet: never answer from an empty cache
+                raise
+            # Keep serving from the previous state; the next poll retries.
+            print(f"Revocation cache refresh failed: {e}")
+            self._last_poll = now
+        finally:
+            self._refresh_lock.release()
+
+    def add(self, jti, expires):
+        """
+        Records a revocation made by this process so it applies immediately.
+        """
+        self._remember(jti, expires)
+
+    def is_revoked(self, jti):
+        self.refresh()
+        self.stats["lookups"] += 1
+        if jti not in self._bloom:
+            self.stats["bloom_negative"] += 1
+            return False
+        if jti in self._entries:
+            self.stats["cache_hits"] += 1
+            return True
+        # Bloom false positive, or an entry evicted from the bounded cache
+        self.stats["db_fallbacks"] += 1
+        entry = self.collection.find_one({"jti": jti}, {"expires": 1, "_id": 0})
+        if entry is None:
+            return False
+        self._remember(jti, entry.get("expires"))
+        return True
@@ -1,13 +1,14 @@
 from functools import wraps
 from flask_jwt_extended import get_jwt_identity
 from flask import jsonify
+from utils.auth_helpers import get_user_role
 
 def role_required(required_role):
     def wrapper(fn):
         @wraps(fn)
         def decorator(*args, **kwargs):
-            user = get_jwt_identity()
-            if user.get("role") != required_role:
+            # The JWT identity is the user's id string; the role lives in the users collection
+            if get_user_role(get_jwt_identity()) != required_role:
                 return jsonify({"error": "Forbidden: Insufficient permissions"}), 403
             return fn(*args, **kwargs)
         return decorator
@@ -0,0 +1,146 @@
+# utils/rollups.py
+"""
+Incrementally maintained counters for the admin analytics page.
+
+daily_rollups holds one document per UTC day:
+
+    {"_id": "2024-06-01", "date": 2024-06-01T00:00, "registrations": 3,
+     "predictions": 120, "ai_messages": 48}
+
+Each counted write $incs its day (one small upsert). users.prediction_count
+is also $inc'ed so the top users come from an index instead of grouping
+every prediction. Counter updates are best effort: a failure is logged and
+never fails the request.
+
+Rollups count events. Predictions (or users, or messages) deleted later
+are still counted on the day they were made; only the user's
+prediction_count follows deletions, since it ranks current history.
+`flask db rebuild-rollups` recounts each day from the source collections
+with server-side aggregations ending in $merge, and raises a day's counter
+to the recount if it is lower. That repairs the only drift the counters can
+have (a lost $inc) and backfills days from before the counters existed,
+without erasing events whose rows were deleted since.
+"""
+import datetime
+
+from bson.objectid import ObjectId
+
+from utils import db
+
+ROLLUP_FIELDS = ("registrations", "predictions", "ai_messages")
+DAY_FORMAT = "%Y-%m-%d"
+
+daily_rollups_collection = db.daily_rollups()
+users_collection = db.users()
+
+
+def _day(at=None):
+    at = at or datetime.datetime.utcnow()
+    return at.strftime(DAY_FORMAT), datetime.datetime(at.year, at.month, at.day)
+
+
+def increment(field, amount=1, at=None):
+    day, date = _day(at)
+    try:
+        daily_rollups_collection.update_one(
+            {"_id": day},
+            {"$inc": {field: amount}, "$setOnInsert": {"date": date}},
+            upsert=True
+        )
+    except Exception as e:
+        print(f"Error updating {field} rollup: {e}")
+
+
+def record_predictions(user_id, amount=1):
+    increment("predictions", amount)
+    try:
+        users_collection.update_one({"_id": ObjectId(user_id)}, {"$inc": {"prediction_count": amount}})
+    except Exception as e:
+        print(f"Error updating prediction count: {e}")
+
+
+def reset_prediction_count(user_id):
+    users_collection.update_one({"_id": ObjectId(user_id)}, {"$set": {"prediction_count": 0}})
+
+
+def _daily_counts_pipeline(date_field, counter):
+    # Existing days keep the larger of their counter and the recount (see the module docstring)
+    return [
+        {"$match": {date_field: {"$type": "date"}}},
+        {"$group": {
+            "_id": {"$dateToString": {"format": DAY_FORMAT, "date": f"${date_field}"}},
+            counter: {"$sum": 1},
+        }},
+        {"$set": {"date": {"$dateFromString": {"dateString": "$_id", "format": DAY_FORMAT}}}},
+        {"$merge": {
+            "into": db.DAILY_ROLLUPS,
+            "on": "_id",
+            "whenMatched": [{"$set": {counter: {"$max": [{"$ifNull": [f"${counter}", 0]}, f"$$new.{counter}"]}}}],
+            "whenNotMatched": "insert",
+        }},
+    ]
+
+
+def rebuild_rollups(database=None):
+    """
+    Raises daily_rollups counters that are below a recount of users,
+    predictions and ai_messages, and recomputes users.prediction_count.
+    Returns the number of days rolled up.
+    """
+    database = database if database is not None else db.get_db()
+    # Zero the per-user counts first so users with no predictions left don't keep stale numbers
+    database[db.USERS].update_many({"prediction_count": {"$exists": True}}, {"$set": {"prediction_count": 0}})
+
+    database[db.USERS].aggregate(_daily_counts_pipeline("created_at", "registrations"))
+    database[db.PREDICTIONS].aggregate(_daily_counts_pipeline("created_at", "predictions"))
+    database[db.AI_MESSAGES].aggregate(_daily_counts_pipeline("timestamp", "ai_messages"))
+
+    # predictions.user_id is a string; users._id is an ObjectId
+    database[db.PREDICTIONS].aggregate([
+        {"$group": {"_id": "$user_id", "prediction_count": {"$sum": 1}}},
+        {"$project": {"_id": {"$convert": {"input": "$_id", "to": "objectId", "onError": None}}, "prediction_count": 1}},
+        {"$match": {"_id": {"$ne": None}}},
+        {"$merge": {"into": db.USERS, "on": "_id", "whenMatched": "merge", "whenNotMatched": "discard"}},
+    ])
+    return database[db.DAILY_ROLLUPS].count_documents({})
+
+
+def analytics_pipeline(since, top_users=5):
+    """
+    One aggregation over daily_rollups (O(days)) for the admin page:
+    all-time totals and per-day counts since `since` from a $facet, then
+    the top users and the admin count from users through index-backed
+    $lookups. Always returns exactly one document.
+    """
+    return [
+        {"$facet": {
+            "totals": [
+                {"$group": {"_id": None, **{field: {"$sum": f"${field}"} for field in ROLLUP_FIELDS}}},
+                {"$project": {"_id": 0}},
+            ],
+            "daily": [
+                {"$match": {"date": {"$gte": since}}},
+                {"$sort": {"date": 1}},
+                {"$project": {
+                    "_id": 0,
+                    "date": {"$dateToString": {"format": DAY_FORMAT, "date": "$date"}},
+                    **{field: {"$ifNull": [f"${field}", 0]} for field in ROLLUP_FIELDS},
+                }},
+            ],
+        }},
+        {"$lookup": {
+            "from": db.USERS,
+            "pipeline": [
+                {"$match": {"prediction_count": {"$gt": 0}}},
+                {"$sort": {"prediction_count": -1}},
+                {"$limit": top_users},
+                {"$project": {"_id": 0, "name": 1, "email": 1, "predictions": "$prediction_count"}},
+            ],
+            "as": "top_users",
+        }},
+        {"$lookup": {
+            "from": db.USERS,
+            "pipeline": [{"$match": {"role": "admin"}}, {"$count": "count"}],
+            "as": "admins",
+        }},
+    ]
@@ -0,0 +1,165 @@
+# utils/symptom_vocabulary.py
+"""
+Symptom vocabulary shared by the feature encoder and the autocomplete API.
+
+The vocabulary lives in data/symptom_vocabulary.json (SYMPTOM_VOCABULARY_PATH
+overrides it): the model's feature columns in order, and every known symptom
+with its aliases and common misspellings. Symptoms with a "column" are
+model features. The others are recognised for autocomplete but not used by
+the current model yet.
+
+Input terms are normalized (lowercase, punctuation and repeated whitespace
+folded) and resolved with one dict lookup. Anything still unknown and at
+least FUZZY_MIN_LENGTH characters long gets a one-edit typo match through a
+deletion index, which costs O(term length) rather than a vocabulary scan.
+Prefix lookups for autocomplete bisect a sorted list of terms, and every
+word of a multi-word term is a valid prefix: "thro" finds "sore throat".
+"""
+import bisect
+import json
+import os
+import re
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VOCABULARY_PATH = os.getenv("SYMPTOM_VOCABULARY_PATH") or os.path.join(BACKEND_DIR, "data", "symptom_vocabulary.json")
+FUZZY_MIN_LENGTH = 5
+# Upper bound on index entries examined per autocomplete request
+SUGGEST_SCAN_LIMIT = 500
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+_AMBIGUOUS = -1
+
+
+def normalize_term(text):
+    return _NON_WORD.sub(" ", text.lower()).strip()
+
+
+def _deletions(term):
+    return [term[:i] + term[i + 1:] for i in range(len(term))]
+
+
+class SymptomVocabulary:
+    def __init__(self, columns, symptoms):
+        self.columns = list(columns)
+        column_index = {column: i for i, column in enumerate(self.columns)}
+
+        self.names = []            # symptom id -> display name
+        self.symptom_columns = []  # symptom id -> model column index, or None
+        self._terms = {}           # normalized name/alias -> symptom id
+        self._typos = {}           # term or one-deletion variant -> symptom id
+        prefixes = set()           # (word-start suffix of a term, term, symptom id)
+
+        for symptom_id, entry in enumerate(symptoms):
+            self.names.append(entry["name"])
+            column = entry.get("column")
+            if column is not None and column not in column_index:
+                raise ValueError(f"Symptom {entry['name']!r} maps to unknown column {column!r}")
+            self.symptom_columns.append(column_index.get(column))
+
+            for raw in [entry["name"], *entry.get("aliases", [])]:
+                term = normalize_term(raw)
+                if not term:
+                    continue
+                if self._terms.get(term, symptom_id) != symptom_id:
+                    raise ValueError(f"Term {term!r} is listed under more than one symptom")
+                self._terms[term] = symptom_id
+                starts = [0] + [match.end() for match in re.finditer(" ", term)]
+                prefixes.update((term[start:], term, symptom_id) for start in starts)
+
+        for term, symptom_id in self._terms.items():
+            if len(term) < FUZZY_MIN_LENGTH:
+                continue
+            for variant in {term, *_deletions(term)}:
+                if self._typos.get(variant, symptom_id) != symptom_id:
+                    self._typos[variant] = _AMBIGUOUS
+                else:
+                    self._typos[variant] = symptom_id
+
+        self._prefixes = sorted(prefixes)
+        self._prefix_keys = [key for key, _, _ in self._prefixes]
+
+    @classmethod
+    def load(cls, path=VOCABULARY_PATH):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["columns"], data["symptoms"])
+
+    def __len__(self):
+        return len(self._terms)
+
+    def resolve(self, text):
+        """
+        Returns the symptom id for an input term, or None if it isn't recognised.
+        """
+        term = normalize_term(text)
+        symptom_id = self._terms.get(term)
+        if symptom_id is not None or len(term) < FUZZY_MIN_LENGTH:
+            return symptom_id
+        for variant in [term, *_deletions(term)]:
+            symptom_id = self._typos.get(variant)
+            if symptom_id is not None and symptom_id != _AMBIGUOUS:
+                return symptom_id
+        return None
+
+    def encode_indices(self, symptoms):
+        """
+        Sparse encoding of one input: the sorted model column indices present.
+        """
+        columns = set()
+        for text in symptoms:
+            symptom_id = self.resolve(text)
+            if symptom_id is not None and self.symptom_columns[symptom_id] is not None:
+                columns.add(self.symptom_columns[symptom_id])
+        return sorted(columns)
+
+    def encode_sparse(self, symptom_lists):
+        """
+        Encodes many inputs into a CSR matrix (rows x model columns).
+        """
+        indptr, indices = [0], []
+        for symptoms in symptom_lists:
+            indices.extend(self.encode_indices(symptoms))
+            indptr.append(len(indices))
+        data = np.ones(len(indices), dtype=np.float32)
+        return csr_matrix((data, indices, indptr), shape=(len(symptom_lists), len(self.columns)))
+
+    def unrecognized(self, symptoms):
+        return [text for text in symptoms if self.resolve(text) is None]
+
+    def suggest(self, prefix, limit=10):
+        """
+        Autocomplete: one suggestion per symptom whose name, alias, or a word
+        in either starts with prefix. Symptom names rank before aliases, and
+        matches at the start of a term before matches on a later word.
+        """
+        key = normalize_term(prefix)
+        if not key:
+            return []
+        best = {}
+        start = bisect.bisect_left(self._prefix_keys, key)
+        for suffix, term, symptom_id in self._prefixes[start:start + SUGGEST_SCAN_LIMIT]:
+            if not suffix.startswith(key):
+                break
+            rank = (
+                term != normalize_term(self.names[symptom_id]),
+                suffix != term,
+                len(term),
+            )
+            if symptom_id not in best or rank < best[symptom_id][0]:
+                best[symptom_id] = (rank, term)
+
+        ranked = sorted(best.items(), key=lambda item: (item[1][0], self.names[item[0]]))[:limit]
+        return [
+            {
+                "name": self.names[symptom_id],
+                "matched": term,
+                "model_feature": self.symptom_columns[symptom_id] is not None,
+            }
+            for symptom_id, (_, term) in ranked
+        ]
+
+
+vocabulary = SymptomVocabulary.load()
@@ -262,8 +262,9 @@ export default function AskAIPage() {
     }
 
     try {
+      // Stream the reply as server-sent events so text appears as it is generated
       const res = await fetch(
-        `http://localhost:5000/api/ai/conversations/${currentConversation._id}/messages`,
+        `http://localhost:5000/api/ai/conversations/${currentConversation._id}/messages/stream`,
         {
           method: "POST",
           headers: {
@@ -274,11 +275,8 @@ export default function AskAIPage() {
         }
       );
 
-      if (res.ok) {
-        const result = await res.json();
-        setCurrentConversation(result.conversation); // Update with the full conversation from backend
-      } else {
-        const errorData = await res.json();
+      if (!res.ok || !res.body) {
+        const errorData = await res.json().catch(() => ({}));
         setError(
           `Failed to get AI response: ${errorData.error || "Unknown error"}`
         );
@@ -286,6 +284,50 @@ export default function AskAIPage() {
         setCurrentConversation((prev) =>
           prev ? { ...prev, messages: prev.messages.slice(0, -1) } : null
         );
+        return;
+      }
+
+      // Placeholder model message that grows with each delta event
+      setCurrentConversation((prev) =>
+        prev
+          ? { ...prev, messages: [...prev.messages, { role: "model", text: "" }] }
+          : null
+      );
+      const appendToReply = (text: string) =>
+        setCurrentConversation((prev) => {
+          if (!prev) return null;
+          const messages = [...prev.messages];
+          const last = messages[messages.length - 1];
+          messages[messages.length - 1] = { ...last, text: last.text + text };
+          return { ...prev, messages };
+        });
+
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+          const rawEvent = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+          let eventName = "message";
+          let data = "";
+          for (const line of rawEvent.split("\n")) {
+            if (line.startsWith("event:")) eventName = line.slice(6).trim();
+            else if (line.startsWith("data:")) data += line.slice(5).trim();
+          }
+          if (!data) continue;
+          const payload = JSON.parse(data);
+          if (eventName === "delta") {
+            appendToReply(payload.text);
+          } else if (eventName === "error") {
+            setError(`AI response was interrupted: ${payload.error}`);
+          }
+        }
       }
     } catch (err: any) {
       console.error("Error communicating with backend/Gemini API:", err);
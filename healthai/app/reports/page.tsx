@@ -8,13 +8,17 @@ import DashboardLayout from "@/components/DashboardLayout";
 interface ReportForm {
   report_name: string;
   report_date: string;
-  base64_file_content: string; // This must strictly be a string
   file_mime_type: string;
 }
 
-interface FetchedReport extends ReportForm {
+interface FetchedReport {
   _id: string;
   user_id: string;
+  report_name: string;
+  report_date: string;
+  file_mime_type: string;
+  file_size?: number;
+  download_url: string;
   uploaded_at: string;
 }
 
@@ -25,7 +29,6 @@ export default function MedicalReportsPage() {
   const [uploadFormData, setUploadFormData] = useState<ReportForm>({
     report_name: "",
     report_date: "",
-    base64_file_content: "", // Initialize new field
     file_mime_type: "", // Initialize new field
   });
   const [selectedFile, setSelectedFile] = useState<File | null>(null); // State to hold the selected file
@@ -90,33 +93,14 @@ export default function MedicalReportsPage() {
       const file = e.target.files[0];
       setSelectedFile(file); // Store the file object
 
-      // Read the file as Base64
-      const reader = new FileReader();
-      reader.onloadend = () => {
-        const result = reader.result;
-
-        if (typeof result === "string") {
-          setUploadFormData((prev) => ({
-            ...prev,
-            base64_file_content: result,
-            file_mime_type: file.type,
-          }));
-        } else {
-          console.error("FileReader result is not a string:", result);
-          setUploadFormData((prev) => ({
-            ...prev,
-            base64_file_content: "", // fallback to empty string
-            file_mime_type: "",
-          }));
-        }
-      };
-
-      reader.readAsDataURL(file); // Read file as data URL
+      setUploadFormData((prev) => ({
+        ...prev,
+        file_mime_type: file.type,
+      }));
     } else {
       setSelectedFile(null);
       setUploadFormData((prev) => ({
         ...prev,
-        base64_file_content: "",
         file_mime_type: "",
       }));
     }
@@ -142,14 +126,19 @@ export default function MedicalReportsPage() {
       return;
     }
 
+    // Send the file as multipart/form-data so the backend can stream it to storage
+    const formData = new FormData();
+    formData.append("report_name", uploadFormData.report_name);
+    formData.append("report_date", uploadFormData.report_date);
+    formData.append("file", selectedFile);
+
     try {
       const res = await fetch("http://localhost:5000/api/history/reports", {
         method: "POST",
         headers: {
-          "Content-Type": "application/json",
           Authorization: `Bearer ${token}`,
         },
-        body: JSON.stringify(uploadFormData),
+        body: formData,
       });
 
       if (res.ok) {
@@ -158,7 +147,6 @@ export default function MedicalReportsPage() {
         setUploadFormData({
           report_name: "",
           report_date: "",
-          base64_file_content: "",
           file_mime_type: "",
         });
         setSelectedFile(null);
@@ -176,6 +164,36 @@ export default function MedicalReportsPage() {
     }
   };
 
+  // Fetch a report's file with the auth header and open it in a new tab
+  const handleViewReport = async (report: FetchedReport) => {
+    const token = Cookies.get("token");
+    if (!token) {
+      setError("User not authenticated. Please log in.");
+      return;
+    }
+
+    // Open the tab synchronously so popup blockers allow it
+    const viewer = window.open("", "_blank");
+    try {
+      const res = await fetch(`http://localhost:5000${report.download_url}`, {
+        headers: { Authorization: `Bearer ${token}` },
+      });
+      if (!res.ok) {
+        viewer?.close();
+        setError(`Failed to open report: ${await res.text()}`);
+        return;
+      }
+      const blobUrl = URL.createObjectURL(await res.blob());
+      if (viewer) {
+        viewer.location.href = blobUrl;
+      }
+    } catch (err) {
+      viewer?.close();
+      console.error("Error opening report:", err);
+      setError("Network error or server unreachable while opening report.");
+    }
+  };
+
   // Handle report deletion
   const handleDeleteReport = async (reportId: string) => {
     if (!window.confirm("Are you sure you want to delete this report?")) {
@@ -305,15 +323,13 @@ export default function MedicalReportsPage() {
                       </p>
                     </div>
                     <div className="flex items-center gap-2 py-3">
-                      {/* Use data URL for viewing PDF */}
-                      <a
-                        href={report.base64_file_content}
-                        target="_blank"
-                        rel="noopener noreferrer"
+                      {/* Streams the file from the download endpoint */}
+                      <button
+                        onClick={() => handleViewReport(report)}
                         className="flex min-w-[84px] cursor-pointer items-center justify-center overflow-hidden rounded-full h-8 px-4 bg-[#f1f4f0] text-[#131811] text-sm font-bold leading-normal tracking-[0.015em] hover:bg-gray-200 transition-colors"
                       >
                         <span className="truncate">View</span>
-                      </a>
+                      </button>
                       <button
                         onClick={() => handleDeleteReport(report._id)}
                         className="flex min-w-[84px] cursor-pointer items-center justify-center overflow-hidden rounded-full h-8 px-4 bg-red-500 text-white text-sm font-bold leading-normal tracking-[0.015em] hover:bg-red-600 transition-colors"
@@ -457,14 +473,12 @@ export default function MedicalReportsPage() {
                           })}
                         </p>
                       </div>
-                      <a
-                        href={latestReport.base64_file_content}
-                        target="_blank"
-                        rel="noopener noreferrer"
+                      <button
+                        onClick={() => handleViewReport(latestReport)}
                         className="flex min-w-[84px] max-w-[480px] cursor-pointer items-center justify-center overflow-hidden rounded-full h-8 px-4 bg-[#42e311] text-[#131811] text-sm font-medium leading-normal hover:bg-green-600 hover:text-white transition-colors"
                       >
                         <span className="truncate">View Report</span>
-                      </a>
+                      </button>
                     </div>
                   </div>
                 </div>